@@ -0,0 +1,167 @@
+#!/usr/bin/python
+
+import threading, Queue, ConfigParser, collections
+import api, ratelimit
+
+class Account:
+    """
+    This class holds the credentials of a DotRoll account. ratelimit is the
+    maximum number of queries per second sent for the account, or None.
+    """
+    def __init__(self, name, apikey, username, password, ratelimit=None):
+        """
+        Initialize the account.
+        """
+        self.name = name
+        self.apikey = apikey
+        self.username = username
+        self.password = password
+        self.ratelimit = ratelimit
+
+
+def load_accounts(path):
+    """
+    Load the accounts from a credentials file holding a section per account
+    named after it, with apikey, username, password and an optional
+    ratelimit:
+
+    [reseller1]
+    apikey = ...
+    username = ...
+    password = ...
+    ratelimit = 5
+    """
+    parser = ConfigParser.RawConfigParser()
+    if not parser.read(path):
+        raise IOError('Cannot read the credentials file ' + path)
+    accounts = []
+    for name in parser.sections():
+        try:
+            rate = None
+            if parser.has_option(name, 'ratelimit'):
+                rate = parser.getfloat(name, 'ratelimit')
+            accounts.append(Account(name, parser.get(name, 'apikey'),
+                                    parser.get(name, 'username'),
+                                    parser.get(name, 'password'), rate))
+        except (ConfigParser.Error, ValueError) as error:
+            raise ValueError('Invalid account ' + name + ': ' + str(error))
+    return accounts
+
+
+class MultiAccountResult:
+    """
+    This class holds the results of a call made for several accounts:
+    results maps the names of the accounts succeeding to their results,
+    errors maps the names of the accounts failing to the exceptions.
+    """
+    def __init__(self):
+        """
+        Initialize an empty result.
+        """
+        self.results = {}
+        self.errors = {}
+
+    def merged(self, key):
+        """
+        Yield the records of the list stored under key in the results of
+        every account, tagged with the account name under 'account'.
+        """
+        for name in sorted(self.results):
+            for record in self.results[name][key]:
+                record = dict(record)
+                record['account'] = name
+                yield record
+
+
+class MultiAccountClient:
+    """
+    This class makes the same call for many accounts in parallel. The query
+    handlers of the accounts share one ConnectionPool to the endpoint, and
+    each has its own rate limit.
+    """
+    def __init__(self, accounts, endpoint, apiversion, concurrency=10,
+                 rate=None, pool=None, build=None):
+        """
+        Initialize the client. At most concurrency calls run at the same
+        time. rate is the rate limit of accounts without their own. If pool
+        is not given, a pool keeping concurrency idle connections is
+        created. If build is given, it is called with an account and the
+        pool to build the ActionHandler of the account instead.
+        """
+        if pool is None:
+            pool = api.ConnectionPool(poolsize=concurrency)
+        self.pool = pool
+        self.concurrency = concurrency
+        self.handlers = collections.OrderedDict()
+        for account in accounts:
+            if build is not None:
+                self.handlers[account.name] = build(account, pool)
+                continue
+            qh = api.PooledHTTPQueryHandler(endpoint, apiversion,
+                                            account.apikey, account.username,
+                                            account.password, pool=pool)
+            accountrate = account.ratelimit or rate
+            if accountrate:
+                bucket = ratelimit.TokenBucket(accountrate)
+                qh = ratelimit.RateLimitedQueryHandler(qh,
+                                                       {'default': bucket})
+            self.handlers[account.name] = api.ActionHandler(qh)
+
+    def run(self, func):
+        """
+        Call func with the ActionHandler of every account. Yields a tuple
+        (account name, result, error) for every account as soon as its call
+        has finished, where error is the exception raised or None.
+        """
+        names = Queue.Queue()
+        results = Queue.Queue()
+        for name in self.handlers:
+            names.put(name)
+        workers = min(self.concurrency, len(self.handlers))
+        for i in range(workers):
+            names.put(None)
+            thread = threading.Thread(target=self.work,
+                                      args=(func, names, results))
+            thread.daemon = True
+            thread.start()
+        while workers:
+            item = results.get()
+            if item is None:
+                workers -= 1
+                continue
+            yield item
+
+    def work(self, func, names, results):
+        """
+        Make calls for the accounts from the work queue until the end marker
+        arrives.
+        """
+        while True:
+            name = names.get()
+            if name is None:
+                results.put(None)
+                return
+            try:
+                results.put((name, func(self.handlers[name]), None))
+            except Exception as error:
+                results.put((name, None, error))
+
+    def call(self, method, *args):
+        """
+        Call an ActionHandler method with arguments for every account and
+        return a MultiAccountResult.
+        """
+        result = MultiAccountResult()
+        for (name, value, error) in self.run(
+            lambda actionhandler: getattr(actionhandler, method)(*args)):
+            if error is None:
+                result.results[name] = value
+            else:
+                result.errors[name] = error
+        return result
+
+    def close(self):
+        """
+        Close the idle connections of the pool.
+        """
+        self.pool.clear()
@@ -1,6 +1,8 @@
 #!/usr/bin/python
 
-import unittest, json, httplib, urllib, httplib, base64
+import json, httplib, urllib, base64, socket, threading
+import time, email.utils, zlib, collections
+import jsonstream, paging
 
 class QueryHandler:
     """
@@ -20,6 +22,28 @@ class QueryHandler:
         self.apikey = apikey
         self.username = username
         self.password = password
+        self.prepare()
+
+    def prepare(self):
+        """
+        Precompute the parts of the request URLs and the authentication
+        header, which are the same for every request. Call it again after
+        changing the endpoint or the credentials.
+        """
+        self.baseurl = self.endpoint + '/' + self.apiversion + '/'
+        parts = self.baseurl.split('/', 3)
+        if len(parts) == 4:
+            self.scheme = parts[0][:-1]
+            self.host = parts[2]
+            self.basepath = '/' + parts[3]
+        else:
+            (self.scheme, self.host, self.basepath) = (None, None,
+                                                       self.baseurl)
+        self.querysuffix = ('?api_key=' + self.encode(self.apikey) +
+                            '&fmt=json')
+        self.authorization = ('Basic ' +
+                              base64.b64encode(self.username + ':' +
+                                               self.password))
 
     def get(self, url):
         """
@@ -45,23 +69,53 @@ class QueryHandler:
         """
         raise NotImplementedError('Use a subclass of QueryHandler')
 
+    def stream(self, url, key):
+        """
+        Perform a HTTP GET query and iterate over the array stored under key
+        in the resulting JSON object. Subclasses may yield the elements
+        as they arrive.
+        """
+        return iter(self.get(url)[key])
+
     def encode(self, rawstring):
         """
         Encode a string to make it usable in an URL
         """
         return urllib.quote(str(rawstring))
 
+    def build_url(self, url):
+        """
+        Build the full request URL for an API path.
+        """
+        return self.baseurl + url + self.querysuffix
+
+    def build_path(self, url):
+        """
+        Build the path of the request URL for an API path, which is sent to
+        the host of the endpoint.
+        """
+        return self.basepath + url + self.querysuffix
+
+    def build_headers(self):
+        """
+        Build the authentication headers sent with every request.
+        """
+        return {'Authorization': self.authorization}
+
 
 class QueryFailed(Exception):
     """
     This exception indicates, that a given query has somehow failed, containing
-    details in the description.
+    details in the description. If the server has answered, the response code
+    and body are available as code and body.
     """
-    def __init__(self, description):
+    def __init__(self, description, code=None, body=None):
         """
         Initialize exception with a description.
         """
         self.description = description
+        self.code = code
+        self.body = body
         super(QueryFailed, self).__init__()
     def __str__(self):
         """
@@ -70,41 +124,402 @@ class QueryFailed(Exception):
         return 'Query failed: ' + self.description
 
 
+class ConnectionFailed(QueryFailed):
+    """
+    This exception indicates, that the server could not be reached or the
+    connection broke down before a response has been received.
+    """
+
+
+class ServerError(QueryFailed):
+    """
+    This exception indicates, that the server has answered with a 5xx error.
+    """
+
+
+class RateLimited(QueryFailed):
+    """
+    This exception indicates, that the server has refused the query with
+    429 Too Many Requests. retryafter is the number of seconds the server
+    asked to wait, or None.
+    """
+    def __init__(self, description, code=None, body=None, retryafter=None):
+        """
+        Initialize exception with a description and the time to wait.
+        """
+        self.retryafter = retryafter
+        super(RateLimited, self).__init__(description, code, body)
+
+
+def response_error(result):
+    """
+    Return the exception matching an unsuccessful {'code', 'body', 'headers'}
+    response.
+    """
+    code = result['code']
+    body = result['body']
+    description = 'HTTP ' + str(code) + ': ' + str(body)
+    if code == 429:
+        return RateLimited(description, code, body,
+                           parse_retry_after(result.get('headers', {})))
+    if 500 <= code < 600:
+        return ServerError(description, code, body)
+    return QueryFailed(description, code, body)
+
+
+def parse_retry_after(headers):
+    """
+    Return the number of seconds from a Retry-After header, which holds
+    either a number of seconds or a HTTP date. Returns None, if the header is
+    missing or invalid.
+    """
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    date = email.utils.parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0, email.utils.mktime_tz(date) - time.time())
+
+
+class RequestInfo:
+    """
+    This class describes a HTTP request to request hooks. timings maps the
+    phases of the request to the seconds spent in them: connect (including
+    name resolution), tls, ttfb (from sending the request to receiving the
+    response headers), read, decompress and decode. Phases a request did not
+    go through are missing, e.g. connect on a reused connection. received
+    is the number of body bytes received, which is not counted for streamed
+    responses.
+    """
+    def __init__(self, method, url, body):
+        """
+        Initialize the description of a request about to be sent.
+        """
+        self.method = method
+        self.url = url
+        self.started = time.time()
+        self.duration = None
+        self.timings = {}
+        self.status = None
+        self.sent = len(body or '')
+        self.received = 0
+        self.error = None
+
+
+class RequestHook:
+    """
+    This class is the base of request hooks, which HTTPQueryHandler calls
+    around every request.
+    """
+    def before_request(self, request):
+        """
+        This function is called with a RequestInfo before a request is sent.
+        """
+
+    def after_request(self, request):
+        """
+        This function is called with a RequestInfo after a request has
+        completed or failed, with its status, timings, sizes and error filled
+        in.
+        """
+
+
+class TimedHTTPConnection(httplib.HTTPConnection):
+    """
+    This HTTP connection records the time taken to connect in timings.
+    """
+    timings = {}
+
+    def connect(self):
+        """
+        Connect to the host, timing the connection.
+        """
+        start = time.time()
+        httplib.HTTPConnection.connect(self)
+        self.timings = {'connect': time.time() - start}
+
+
+class TimedHTTPSConnection(httplib.HTTPSConnection):
+    """
+    This HTTPS connection records the time taken to connect and to complete
+    the TLS handshake in timings.
+    """
+    timings = {}
+
+    def connect(self):
+        """
+        Connect to the host and wrap the socket in TLS, timing both.
+        """
+        start = time.time()
+        httplib.HTTPConnection.connect(self)
+        connected = time.time()
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=self._tunnel_host or self.host)
+        self.timings = {'connect': connected - start,
+                        'tls': time.time() - connected}
+
+
+def connect(scheme, host):
+    """
+    Open a new connection to a given host.
+    """
+    if scheme == 'http':
+        return TimedHTTPConnection(host)
+    return TimedHTTPSConnection(host)
+
+
 class HTTPQueryHandler(QueryHandler):
     """
     This is the HTTP query handler used for real HTTP connections.
+    Responses are requested gzip compressed, and GET results carrying an ETag
+    or Last-Modified validator are remembered, so that polling the same URL
+    again only transfers the data if it has changed. Every request is passed
+    to the RequestHook objects in hooks.
     """
-    def do_request(self, method, url, body):
+    def __init__(self, endpoint, apiversion, apikey, username, password,
+                 compress=True, conditional=True, maxvalidators=256,
+                 hooks=None):
+        """
+        Initialize the query handler with authentication information.
+        compress enables gzip transfer and conditional enables conditional
+        GET queries for up to maxvalidators URLs.
+        """
+        QueryHandler.__init__(self, endpoint, apiversion, apikey, username,
+                              password)
+        self.compress = compress
+        self.conditional = conditional
+        self.maxvalidators = maxvalidators
+        self.validators = collections.OrderedDict()
+        self.validatorlock = threading.Lock()
+        self.hooks = list(hooks or [])
+
+    def do_request(self, method, url, body, extraheaders=None):
+        """
+        This function performs the actual HTTP request. The RequestInfo of
+        the request is returned under 'request' and must be completed with
+        parse(), failure() or finish_request().
+        """
+        request = self.start_request(method, url, body)
+        try:
+            headers = self.build_headers()
+            if self.compress:
+                headers['Accept-Encoding'] = 'gzip'
+            if extraheaders:
+                headers.update(extraheaders)
+            (response, data) = self.perform(self.scheme, self.host, method,
+                                            self.build_path(url), body,
+                                            headers, request)
+            request.status = response.status
+            request.received = len(data)
+            if response.getheader('content-encoding', '') == 'gzip':
+                start = time.time()
+                data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+                request.timings['decompress'] = time.time() - start
+            return {'code': response.status, 'body': data,
+                    'headers': dict(response.getheaders()),
+                    'request': request}
+        except (httplib.HTTPException, socket.error, zlib.error) as error:
+            request.error = ConnectionFailed(str(error) or
+                                             error.__class__.__name__)
+            self.finish_request(request)
+            raise request.error
+
+    def start_request(self, method, url, body):
+        """
+        Create the RequestInfo of a request and pass it to the hooks.
+        """
+        request = RequestInfo(method, url, body)
+        for hook in self.hooks:
+            hook.before_request(request)
+        return request
+
+    def finish_request(self, request):
+        """
+        Complete a RequestInfo and pass it to the hooks.
+        """
+        request.duration = time.time() - request.started
+        for hook in self.hooks:
+            hook.after_request(request)
+
+    def parse(self, result):
+        """
+        Parse the body of a successful result as a JSON string and complete
+        its request.
+        """
+        start = time.time()
+        try:
+            return json.loads(result['body'])
+        finally:
+            result['request'].timings['decode'] = time.time() - start
+            self.finish_request(result['request'])
+
+    def failure(self, result):
         """
-        This function performs the actual HTTP request.
+        Complete the request of an unsuccessful result and return the
+        exception to raise.
         """
+        error = response_error(result)
+        result['request'].error = error
+        self.finish_request(result['request'])
+        return error
+
+    def send(self, conn, method, path, body, headers, request):
+        """
+        Send a request over a connection and return the response, recording
+        the connect, tls and ttfb timings.
+        """
+        if conn.sock is None:
+            conn.connect()
+            request.timings.update(conn.timings)
+        start = time.time()
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        request.timings['ttfb'] = time.time() - start
+        return response
+
+    def exchange(self, conn, method, path, body, headers, request):
+        """
+        Send a request over a connection and return the response together
+        with its body, recording the timings.
+        """
+        response = self.send(conn, method, path, body, headers, request)
+        start = time.time()
+        data = response.read()
+        request.timings['read'] = time.time() - start
+        return (response, data)
+
+    def perform(self, scheme, host, method, path, body, headers, request):
+        """
+        This function sends a request over a fresh connection and returns the
+        response together with its body.
+        """
+        conn = connect(scheme, host)
         try:
-            url = (self.endpoint + '/' + self.apiversion + '/' + url +
-               '?api_key=' + self.encode(self.apikey) + '&fmt=json')
-            headers = {'Authorization': 'Basic ' +
-                       base64.b64encode(self.username + ':' +
-                                        self.password)}
-            url = url.split('/', 3)
-            if url[0] == 'http:':
-                conn = httplib.HTTPConnection(url[2])
-            else:
-                conn = httplib.HTTPSConnection(url[2])
-            conn.request(method, '/' + url[3], body, headers)
-            response = conn.getresponse()
-            body = response.read()
+            return self.exchange(conn, method, path, body, headers, request)
+        finally:
+            conn.close()
+
+    def open_stream(self, scheme, host, path, headers, request):
+        """
+        This function sends a streaming GET request over a fresh connection.
+        It returns the response and a function, which must be called with
+        True if the response has been read completely or False otherwise,
+        once the caller is done with the connection.
+        """
+        conn = connect(scheme, host)
+        try:
+            response = self.send(conn, 'GET', path, None, headers, request)
+        except (httplib.HTTPException, socket.error):
             conn.close()
-            return {'code': response.status, 'body': body}
-        except:
-            raise QueryFailed()
+            raise
+        return (response, lambda complete: conn.close())
 
     def get(self, url):
         """
         Perform a HTTP GET query and parse the results as a JSON string.
         """
+        if not self.conditional:
+            result = self.do_request('GET', url, None)
+            if result['code'] != 200:
+                raise self.failure(result)
+            return self.parse(result)
+        with self.validatorlock:
+            validator = self.validators.get(url)
+        extraheaders = {}
+        if validator is not None:
+            if validator['etag']:
+                extraheaders['If-None-Match'] = validator['etag']
+            if validator['lastmodified']:
+                extraheaders['If-Modified-Since'] = validator['lastmodified']
+        result = self.do_request('GET', url, None, extraheaders)
+        if result['code'] == 304 and validator is not None:
+            self.finish_request(result['request'])
+            return validator['value']
+        if result['code'] != 200:
+            raise self.failure(result)
+        value = self.parse(result)
+        self.remember(url, result['headers'], value)
+        return value
+
+    def get_raw(self, url):
+        """
+        Perform a HTTP GET query and return the body of the response without
+        parsing it, so that it can be parsed elsewhere.
+        """
         result = self.do_request('GET', url, None)
         if result['code'] != 200:
-            raise QueryFailed(result['body'])
-        return json.loads(result['body'])
+            raise self.failure(result)
+        self.finish_request(result['request'])
+        return result['body']
+
+    def stream(self, url, key):
+        """
+        Perform a HTTP GET query and yield the elements of the array stored
+        under key in the resulting JSON object as they arrive, without
+        reading the whole response into memory.
+        """
+        request = self.start_request('GET', url, None)
+        headers = self.build_headers()
+        if self.compress:
+            headers['Accept-Encoding'] = 'gzip'
+        done = None
+        complete = False
+        try:
+            try:
+                (response, done) = self.open_stream(self.scheme, self.host,
+                                                    self.build_path(url),
+                                                    headers, request)
+                request.status = response.status
+                if response.status != 200:
+                    data = response.read()
+                    complete = True
+                    if response.getheader('content-encoding', '') == 'gzip':
+                        data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+                    raise response_error({'code': response.status,
+                                          'body': data,
+                                          'headers':
+                                              dict(response.getheaders())})
+                body = response
+                if response.getheader('content-encoding', '') == 'gzip':
+                    body = jsonstream.GzipStreamReader(response)
+                start = time.time()
+                for item in jsonstream.iter_json_array(body, key):
+                    yield item
+                # Consume the rest of the object, so that the connection is
+                # left at the end of the response.
+                response.read()
+                complete = True
+                request.timings['read'] = time.time() - start
+            except (httplib.HTTPException, socket.error, zlib.error) as error:
+                raise ConnectionFailed(str(error) or
+                                       error.__class__.__name__)
+        except QueryFailed as error:
+            request.error = error
+            raise
+        finally:
+            if done is not None:
+                done(complete)
+            self.finish_request(request)
+
+    def remember(self, url, headers, value):
+        """
+        Remember the validators and the parsed result of a GET query, if the
+        response carried any.
+        """
+        etag = headers.get('etag')
+        lastmodified = headers.get('last-modified')
+        with self.validatorlock:
+            self.validators.pop(url, None)
+            if not etag and not lastmodified:
+                return
+            self.validators[url] = {'etag': etag,
+                                    'lastmodified': lastmodified,
+                                    'value': value}
+            while len(self.validators) > self.maxvalidators:
+                self.validators.popitem(last=False)
 
     def delete(self, url):
         """
@@ -113,8 +528,8 @@ class HTTPQueryHandler(QueryHandler):
         """
         result = self.do_request('DELETE', url, None)
         if result['code'] != 200:
-            raise QueryFailed(result['body'])
-        return json.loads(result.body)
+            raise self.failure(result)
+        return self.parse(result)
 
     def post(self, url, data):
         """
@@ -123,8 +538,8 @@ class HTTPQueryHandler(QueryHandler):
         """
         result = self.do_request('POST', url, data)
         if result['code'] != 201:
-            raise QueryFailed(result['body'])
-        return json.loads(result['body'])
+            raise self.failure(result)
+        return self.parse(result)
 
     def put(self, url, data):
         """
@@ -134,207 +549,259 @@ class HTTPQueryHandler(QueryHandler):
         result = self.do_request('PUT', url, data)
         if (result['code'] != 200 and result['code'] != 201 and
             result['code'] != 204):
-            raise QueryFailed(result['body'])
-        return json.loads(result['body'])
+            raise self.failure(result)
+        return self.parse(result)
 
 
-class ActionHandler:
+class ConnectionPool:
     """
-    This class calls the QueryHandler with appropriate parameters and
-    transforms the data that comes back.
+    This class keeps idle keep-alive connections per endpoint host, so that
+    subsequent requests can skip the TCP and TLS handshake. A pool may be
+    shared between several query handlers.
     """
-    def __init__(self, queryhandler):
-        """
-        This function initializes the backend query handler.
-        """
-        self.queryhandler = queryhandler
+    def __init__(self, poolsize=4, idletimeout=60, maxrequests=100):
+        """
+        Initialize the pool. poolsize is the number of idle connections kept
+        per host, idletimeout is the number of seconds after which an idle
+        connection is discarded and maxrequests is the number of requests
+        after which a connection is retired.
+        """
+        self.poolsize = poolsize
+        self.idletimeout = idletimeout
+        self.maxrequests = maxrequests
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme, host):
+        """
+        Fetch an idle connection to a given host or open a new one.
+        Returns a tuple (connection, requests served, reused).
+        """
+        now = time.time()
+        stale = []
+        result = None
+        with self.lock:
+            idle = self.idle.get((scheme, host), [])
+            while idle:
+                (conn, lastused, count) = idle.pop()
+                if now - lastused < self.idletimeout:
+                    result = (conn, count, True)
+                    break
+                stale.append(conn)
+        for conn in stale:
+            conn.close()
+        if result is None:
+            result = (connect(scheme, host), 0, False)
+        return result
 
-    def get_domain_prices(self, currency):
+    def release(self, scheme, host, conn, count):
         """
-        This function downloads the domain pricelist in a given currency.
+        Return a connection to the pool after it has served count requests.
         """
-        return self.queryhandler.get('domain/prices/' + currency)
+        if count < self.maxrequests:
+            with self.lock:
+                idle = self.idle.setdefault((scheme, host), [])
+                if len(idle) < self.poolsize:
+                    idle.append((conn, time.time(), count))
+                    return
+        conn.close()
 
-    def get_hosting_prices(self, currency):
+    def clear(self):
         """
-        This function downloads the hosting pricelist in a given currency.
+        Close all idle connections.
         """
-        return self.queryhandler.get('hosting/prices/' + currency)
+        with self.lock:
+            idle = self.idle
+            self.idle = {}
+        for connections in idle.values():
+            for (conn, lastused, count) in connections:
+                conn.close()
 
-    def get_vps_prices(self, currency):
-        """
-        This function downloads the VPS pricelist in a given currency.
-        """
-        return self.queryhandler.get('vps/prices/' + currency)
 
-    def get_domain_availability(self, domainname):
-        """
-        This function checks, if a domain is available for registration.
-        """
-        return self.queryhandler.get('domain/search/' +
-                                     self.queryhandler.encode(domainname))
+class PooledHTTPQueryHandler(HTTPQueryHandler):
+    """
+    This is the HTTP query handler that reuses keep-alive connections from a
+    ConnectionPool instead of connecting for every request. GET queries
+    failing on a connection that went stale while idle are sent again over a
+    new one. Other queries fail with ConnectionFailed instead, as the server
+    may have processed them before the connection broke.
+    """
+    def __init__(self, endpoint, apiversion, apikey, username, password,
+                 poolsize=4, idletimeout=60, maxrequests=100, pool=None,
+                 compress=True, conditional=True, hooks=None):
+        """
+        Initialize the query handler with authentication information and
+        pool settings. If pool is given, the settings are ignored and the
+        pool is shared.
+        """
+        HTTPQueryHandler.__init__(self, endpoint, apiversion, apikey,
+                                  username, password, compress, conditional,
+                                  hooks=hooks)
+        if pool is None:
+            pool = ConnectionPool(poolsize, idletimeout, maxrequests)
+        self.pool = pool
+
+    def perform(self, scheme, host, method, path, body, headers, request):
+        """
+        This function sends a request over a pooled connection and returns
+        the response together with its body.
+        """
+        while True:
+            (conn, count, reused) = self.pool.acquire(scheme, host)
+            try:
+                (response, data) = self.exchange(conn, method, path, body,
+                                                 headers, request)
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused and method == 'GET':
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.pool.release(scheme, host, conn, count + 1)
+            return (response, data)
 
-    def get_domain_list(self):
+    def open_stream(self, scheme, host, path, headers, request):
         """
-        This function downloads a list of all domains registered under the
-        current user.
+        This function sends a streaming GET request over a pooled
+        connection. The connection is returned to the pool only if the
+        response has been read completely, and discarded otherwise.
         """
-        return self.queryhandler.get('domain/list')
+        while True:
+            (conn, count, reused) = self.pool.acquire(scheme, host)
+            try:
+                response = self.send(conn, 'GET', path, None, headers,
+                                     request)
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    continue
+                raise
 
+            def done(complete):
+                if complete and not response.will_close:
+                    self.pool.release(scheme, host, conn, count + 1)
+                else:
+                    conn.close()
+            return (response, done)
 
-###############################################################################
-# Unit testing code                                                           #
-###############################################################################
+    def close(self):
+        """
+        Close all idle connections of the pool.
+        """
+        self.pool.clear()
 
 
-class MockQueryHandler(QueryHandler):
+class WrappingQueryHandler(QueryHandler):
     """
-    This is the mock query handler used for unit testing.
-    To make it work, you have to feed it "expectations". The queries
-    are then matched against these expectations. The result attached to
-    them is returned as a result.
+    This class is the base of query handlers, which add behaviour to another
+    query handler. All queries are passed on to the wrapped handler.
     """
-    expectations = []
-    def add_expectation(self, expected_url, expected_query_type,
-                        expected_body, response_code, response_body):
+    def __init__(self, queryhandler):
         """
-        Queue an expectation.
+        Initialize the handler with the query handler to wrap.
         """
-        self.expectations.append({'expected_url':expected_url,
-                                  'expected_query_type':expected_query_type,
-                                  'expected_body':expected_body,
-                                  'response_code':response_code,
-                                  'response_body':response_body})
+        self.queryhandler = queryhandler
+        QueryHandler.__init__(self, queryhandler.endpoint,
+                              queryhandler.apiversion, queryhandler.apikey,
+                              queryhandler.username, queryhandler.password)
 
-    def get_expectation(self):
+    def get(self, url):
         """
-        Fetch one expectation off the beginning of the expectations list.
+        Pass a HTTP GET query on to the wrapped handler.
         """
-        return self.expectations.pop(0)
+        return self.queryhandler.get(url)
 
-    def check_expectation(self, url, query_type, body):
+    def delete(self, url):
         """
-        Check a given request against the next expectation in the list.
+        Pass a HTTP DELETE query on to the wrapped handler.
         """
-        exp = self.get_expectation()
-        if exp['expected_url'] != url:
-            raise ExpectationFailed('Expected URL ' + exp['expected_url'] +
-                                    ' , got ' + url)
-        if exp['expected_query_type'] != query_type:
-            raise ExpectationFailed('Expected ' + exp['expected_query_type'] +
-                                    ' query, got ' + query_type + ' query')
-        if exp['expected_body'] != body:
-            raise ExpectationFailed('Expectation body mismatch. Expected '
-                                    'body: ' . exp['expected_body'] + ' '
-                                    'actual body: ' + str(body))
-        return {'code': exp['response_code'], 'body': exp['response_body']}
+        return self.queryhandler.delete(url)
 
-    def get(self, url):
+    def post(self, url, data):
         """
-        Perform a mock HTTP GET query and parse the results as a JSON string.
+        Pass a HTTP POST query on to the wrapped handler.
         """
-        result = self.check_expectation(url, 'get', '')
-        if result['code'] != 200:
-            raise QueryFailed()
-        return json.loads(result['body'])
+        return self.queryhandler.post(url, data)
 
-    def delete(self, url):
+    def put(self, url, data):
         """
-        Perform a mock HTTP DELETE query and parse the results as a JSON
-        string.
+        Pass a HTTP PUT query on to the wrapped handler.
         """
-        result = self.check_expectation(url, 'delete', '')
-        if result['code'] != 200:
-            raise QueryFailed()
-        return json.loads(result.body)
+        return self.queryhandler.put(url, data)
 
-    def post(self, url, data):
+    def stream(self, url, key):
         """
-        Perform a mock HTTP POST query and parse the results as a JSON
-        string.
+        Pass a streaming HTTP GET query on to the wrapped handler.
         """
-        result = self.check_expectation(url, 'post', 'data')
-        if result['code'] != 201:
-            raise QueryFailed()
-        return json.loads(result['body'])
+        return self.queryhandler.stream(url, key)
 
-    def put(self, url, data):
+    def encode(self, rawstring):
         """
-        Perform a mock HTTP PUT query and parse the results as a JSON
-        string.
+        Encode a string the way the wrapped handler does.
         """
-        result = self.check_expectation(url, 'put', 'data')
-        if (result['code'] != 200 and result['code'] != 201 and
-            result['code'] != 204):
-            raise QueryFailed()
-        return json.loads(result['body'])
+        return self.queryhandler.encode(rawstring)
 
 
-class ExpectationFailed(Exception):
+class ActionHandler:
     """
-    This exception is used to indicate, that an expectation in MockQueryHandler
-    has not been matched.
+    This class calls the QueryHandler with appropriate parameters and
+    transforms the data that comes back.
     """
-    def __init__(self, description):
+    def __init__(self, queryhandler):
         """
-        Initialize exception with a description.
+        This function initializes the backend query handler.
         """
-        self.description = description
-        super(ExpectationFailed, self).__init__()
-    def __str__(self):
+        self.queryhandler = queryhandler
+
+    def get_domain_prices(self, currency):
         """
-        Return a meaningfull string representation of th exception.
+        This function downloads the domain pricelist in a given currency.
         """
-        return 'Expectation failed: ' + self.description
+        return self.queryhandler.get('domain/prices/' + currency)
 
+    def get_hosting_prices(self, currency):
+        """
+        This function downloads the hosting pricelist in a given currency.
+        """
+        return self.queryhandler.get('hosting/prices/' + currency)
 
-class ActionHandlerTest(unittest.TestCase):
-    def test_get_prices(self):
+    def get_vps_prices(self, currency):
         """
-        Test querying the service price lists.
-        This test uses mock testing, it does not actually perform
-        HTTP queries.
+        This function downloads the VPS pricelist in a given currency.
         """
-        qh = MockQueryHandler('', '', '', '', '')
-        ah = ActionHandler(qh)
-        qh.add_expectation('domain/prices/HUF', 'get', '', 200, '{"new": 1}')
-        qh.add_expectation('domain/prices/EUR', 'get', '', 200, '{"new": 2}')
-        qh.add_expectation('hosting/prices/HUF', 'get', '', 200, '{"new": 3}')
-        qh.add_expectation('hosting/prices/EUR', 'get', '', 200, '{"new": 4}')
-        qh.add_expectation('vps/prices/HUF', 'get', '', 200, '{"new": 5}')
-        qh.add_expectation('vps/prices/EUR', 'get', '', 200, '{"new": 6}')
-        self.assertEqual(ah.get_domain_prices('HUF'), {'new': 1})
-        self.assertEqual(ah.get_domain_prices('EUR'), {'new': 2})
-        self.assertEqual(ah.get_hosting_prices('HUF'), {'new': 3})
-        self.assertEqual(ah.get_hosting_prices('EUR'), {'new': 4})
-        self.assertEqual(ah.get_vps_prices('HUF'), {'new': 5})
-        self.assertEqual(ah.get_vps_prices('EUR'), {'new': 6})
+        return self.queryhandler.get('vps/prices/' + currency)
 
-    def test_get_domain_availability(self):
+    def get_domain_availability(self, domainname):
         """
-        Test querying the domain availability.
-        This test uses mock testing, it does not actually perform
-        HTTP queries.
+        This function checks, if a domain is available for registration.
         """
-        qh = MockQueryHandler('', '', '', '', '')
-        ah = ActionHandler(qh)
-        qh.add_expectation('domain/search/janoszen.hu', 'get', '', 200,
-                           '{"status": "available"}');
-        self.assertEqual(ah.get_domain_availability('janoszen.hu'),
-                         {'status': 'available'})
+        return self.queryhandler.get('domain/search/' +
+                                     self.queryhandler.encode(domainname))
 
-    def test_get_domain_list(self):
+    def get_domain_list(self):
         """
-        Test querying the domain list of the current user.
-        This test uses mock testing, it does not actually perform
-        HTTP queries.
+        This function downloads a list of all domains registered under the
+        current user.
         """
-        qh = MockQueryHandler('', '', '', '', '')
-        ah = ActionHandler(qh)
-        qh.add_expectation('domain/list', 'get', '', 200,
-                           '["janoszen.hu"]');
-        self.assertEqual(ah.get_domain_list(), ['janoszen.hu'])
+        return self.queryhandler.get('domain/list')
 
+    def stream_domain_list(self):
+        """
+        This function iterates over the domains registered under the current
+        user, yielding the domain records as they are downloaded.
+        """
+        return self.queryhandler.stream('domain/list', 'domains')
 
-if __name__ == '__main__':
-    unittest.main()
+    def iter_domain_list(self, pagesize=100, offset=0, prefetch=2):
+        """
+        This function iterates over the domains registered under the current
+        user in pages of pagesize domain records, downloading up to prefetch
+        pages ahead in the background. Iteration starts at the offset-th
+        domain; see paging.PageIterator for resuming after a failure. Use
+        the iterator in a with statement, so that the download is stopped
+        if the iteration ends early.
+        """
+        return paging.PageIterator(self.stream_domain_list, pagesize, offset,
+                                   prefetch)
@@ -0,0 +1,618 @@
+#!/usr/bin/python
+
+import asyncore, socket, ssl, errno, json, time, sys, collections
+import api
+
+class ResponseParser:
+    """
+    This class incrementally parses the HTTP/1.x responses arriving on a
+    connection. Completed responses are queued in the responses deque as
+    (status, headers, body) tuples.
+    """
+    def __init__(self):
+        """
+        Initialize the parser with an empty buffer.
+        """
+        self.buffer = ''
+        self.responses = collections.deque()
+        self.reset()
+
+    def reset(self):
+        """
+        Prepare the parser for the next response on the connection.
+        """
+        self.status = None
+        self.headers = {}
+        self.remaining = 0
+        self.body = []
+        self.state = 'head'
+
+    def feed(self, data):
+        """
+        Feed data received from the connection to the parser.
+        """
+        self.buffer += data
+        while self.step():
+            pass
+
+    def finish(self):
+        """
+        Signal, that the server has closed the connection. This completes a
+        response delimited by the end of the connection.
+        """
+        if self.state == 'close':
+            self.body.append(self.buffer)
+            self.buffer = ''
+            self.complete()
+
+    def complete(self):
+        """
+        Queue the response parsed so far and reset the parser.
+        """
+        if not 100 <= self.status < 200:
+            self.responses.append((self.status, self.headers,
+                                   ''.join(self.body)))
+        self.reset()
+
+    def read_body(self, state):
+        """
+        Move up to self.remaining bytes from the buffer to the body.
+        Returns True, if the body part is complete.
+        """
+        if not self.buffer:
+            return False
+        data = self.buffer[:self.remaining]
+        self.buffer = self.buffer[len(data):]
+        self.body.append(data)
+        self.remaining -= len(data)
+        if self.remaining:
+            return False
+        self.state = state
+        return True
+
+    def read_line(self):
+        """
+        Remove a line from the beginning of the buffer. Returns None, if
+        no complete line has been received yet.
+        """
+        end = self.buffer.find('\r\n')
+        if end < 0:
+            return None
+        line = self.buffer[:end]
+        self.buffer = self.buffer[end + 2:]
+        return line
+
+    def step(self):
+        """
+        Consume as much of the buffer as the current state allows. Returns
+        True, if another step can make progress.
+        """
+        if self.state == 'head':
+            end = self.buffer.find('\r\n\r\n')
+            if end < 0:
+                return False
+            lines = self.buffer[:end].split('\r\n')
+            self.buffer = self.buffer[end + 4:]
+            self.status = int(lines[0].split(' ', 2)[1])
+            for line in lines[1:]:
+                (name, value) = line.split(':', 1)
+                self.headers[name.strip().lower()] = value.strip()
+            if (self.headers.get('transfer-encoding', '').lower() ==
+                'chunked'):
+                self.state = 'chunksize'
+            elif 'content-length' in self.headers:
+                self.remaining = int(self.headers['content-length'])
+                self.state = 'body'
+            elif self.status in (204, 304) or self.status < 200:
+                self.state = 'body'
+            else:
+                self.state = 'close'
+            return True
+        if self.state == 'body':
+            if self.remaining and not self.read_body('done'):
+                return False
+            self.complete()
+            return True
+        if self.state == 'chunksize':
+            line = self.read_line()
+            if line is None:
+                return False
+            self.remaining = int(line.split(';')[0], 16)
+            self.state = 'chunk' if self.remaining else 'trailer'
+            return True
+        if self.state == 'chunk':
+            return self.read_body('chunkend')
+        if self.state == 'chunkend':
+            if self.read_line() is None:
+                return False
+            self.state = 'chunksize'
+            return True
+        if self.state == 'trailer':
+            line = self.read_line()
+            if line is None:
+                return False
+            if not line:
+                self.complete()
+            return True
+        return False
+
+
+class AsyncResult:
+    """
+    This class represents the outcome of a query that may not have completed
+    yet.
+    """
+    def __init__(self, queryhandler):
+        """
+        Initialize the result with the query handler driving the query.
+        """
+        self.queryhandler = queryhandler
+        self.finished = False
+        self.value = None
+        self.error = None
+        self.callbacks = []
+
+    def done(self):
+        """
+        Return True, if the query has completed.
+        """
+        return self.finished
+
+    def add_callback(self, callback):
+        """
+        Register a function to be called with this result on completion. If
+        the query has already completed, the function is called immediately.
+        """
+        if self.finished:
+            callback(self)
+        else:
+            self.callbacks.append(callback)
+
+    def set(self, value=None, error=None):
+        """
+        Complete the result with a value or an error.
+        """
+        self.value = value
+        self.error = error
+        self.finished = True
+        callbacks = self.callbacks
+        self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def result(self):
+        """
+        Drive the event loop of the query handler until the query has
+        completed, then return its value or raise its error.
+        """
+        self.queryhandler.run(self.done)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class AsyncConnection(asyncore.dispatcher):
+    """
+    This class is a non-blocking HTTP keep-alive connection driven by the
+    event loop of an AsyncQueryHandler. Requests sent over it are answered in
+    order.
+    """
+    def __init__(self, queryhandler, scheme, host, address):
+        """
+        Start connecting to a resolved (family, sockaddr) address.
+        """
+        asyncore.dispatcher.__init__(self, map=queryhandler.map)
+        self.queryhandler = queryhandler
+        self.scheme = scheme
+        self.key = (scheme, host)
+        self.hostname = host.split(':')[0]
+        self.reusable = True
+        self.outbuffer = ''
+        self.outstanding = collections.deque()
+        self.parser = ResponseParser()
+        self.handshaking = False
+        self.wantwrite = False
+        self.lastactivity = time.time()
+        self.create_socket(address[0], socket.SOCK_STREAM)
+        self.connect(address[1])
+
+    def send_request(self, result, data):
+        """
+        Queue a formatted request whose response completes result.
+        """
+        self.outstanding.append(result)
+        self.outbuffer += data
+        self.lastactivity = time.time()
+
+    def handle_connect(self):
+        """
+        Start the TLS handshake on HTTPS connections.
+        """
+        if self.scheme == 'https':
+            self.socket = self.queryhandler.sslcontext.wrap_socket(
+                self.socket, server_hostname=self.hostname,
+                do_handshake_on_connect=False)
+            self.handshaking = True
+            self.do_handshake()
+
+    def do_handshake(self):
+        """
+        Advance the TLS handshake as far as the socket allows.
+        """
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLWantReadError:
+            self.wantwrite = False
+            return
+        except ssl.SSLWantWriteError:
+            self.wantwrite = True
+            return
+        self.handshaking = False
+        self.wantwrite = False
+
+    def readable(self):
+        """
+        Connections always wait for data from the server.
+        """
+        return True
+
+    def writable(self):
+        """
+        Return True, if the connection has something to send.
+        """
+        if not self.connected or self.wantwrite:
+            return True
+        return not self.handshaking and bool(self.outbuffer)
+
+    def handle_write(self):
+        """
+        Send as much of the output buffer as the socket accepts.
+        """
+        if self.handshaking:
+            self.do_handshake()
+            return
+        try:
+            sent = self.socket.send(self.outbuffer)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        self.outbuffer = self.outbuffer[sent:]
+
+    def handle_read(self):
+        """
+        Receive data from the server and deliver completed responses.
+        """
+        if self.handshaking:
+            self.do_handshake()
+            return
+        try:
+            data = self.socket.recv(65536)
+            if self.scheme == 'https':
+                while data and self.socket.pending():
+                    data += self.socket.recv(65536)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        self.lastactivity = time.time()
+        if not data:
+            self.handle_close()
+            return
+        self.parser.feed(data)
+        self.deliver()
+
+    def deliver(self):
+        """
+        Complete the outstanding results, which have received a response.
+        The connection is reported idle first, so that the queries started
+        on completion can reuse it.
+        """
+        completed = []
+        while self.parser.responses and self.outstanding:
+            response = self.parser.responses.popleft()
+            if response[1].get('connection', '').lower() == 'close':
+                self.reusable = False
+            completed.append((self.outstanding.popleft(), response))
+        if not self.outstanding and self.connected:
+            self.queryhandler.connection_idle(self)
+        for (result, response) in completed:
+            self.queryhandler.complete(result, response)
+
+    def fail(self, error):
+        """
+        Pass the outstanding results back to the query handler, which sends
+        them again or fails them with a given error.
+        """
+        while self.outstanding:
+            self.queryhandler.retry(self.outstanding.popleft(), error)
+
+    def close(self):
+        """
+        Close the connection and stop using it for new requests.
+        """
+        asyncore.dispatcher.close(self)
+        self.queryhandler.connection_closed(self)
+
+    def handle_close(self):
+        """
+        Deliver a response delimited by the end of the connection and fail
+        the requests left without a response.
+        """
+        self.parser.finish()
+        self.close()
+        self.deliver()
+        self.fail(api.ConnectionFailed('Connection closed by server'))
+
+    def handle_error(self):
+        """
+        Fail the outstanding results with the error that occured.
+        """
+        error = sys.exc_info()[1]
+        self.close()
+        self.fail(api.ConnectionFailed(str(error)))
+
+
+class AsyncQueryHandler(api.QueryHandler):
+    """
+    This is the non-blocking HTTP query handler. Queries return an
+    AsyncResult immediately and are carried out concurrently by an asyncore
+    event loop, with at most maxinflight queries in flight at a time.
+    Connections are kept alive: up to poolsize idle connections per host
+    are kept for idletimeout seconds and reused by the following queries.
+    A GET query failing on a reused connection, which the server may have
+    closed while it was idle, is sent again over another one. Other queries
+    fail with ConnectionFailed instead, as the server may have processed
+    them before the connection broke.
+    """
+    def __init__(self, endpoint, apiversion, apikey, username, password,
+                 maxinflight=10, timeout=30, sslcontext=None, poolsize=4,
+                 idletimeout=60):
+        """
+        Initialize the query handler with authentication information, the
+        in-flight limit, the per-query inactivity timeout in seconds and the
+        idle connection settings.
+        """
+        api.QueryHandler.__init__(self, endpoint, apiversion, apikey,
+                                  username, password)
+        self.maxinflight = maxinflight
+        self.timeout = timeout
+        if sslcontext is None:
+            sslcontext = ssl.create_default_context()
+        self.sslcontext = sslcontext
+        self.map = {}
+        self.queue = collections.deque()
+        self.inflight = 0
+        self.addresses = {}
+        self.poolsize = poolsize
+        self.idletimeout = idletimeout
+        self.idleconnections = {}
+
+    def get(self, url):
+        """
+        Queue a HTTP GET query, the result of which is parsed as a JSON string.
+        """
+        return self.submit('GET', url, None, (200,))
+
+    def delete(self, url):
+        """
+        Queue a HTTP DELETE query, the result of which is parsed as a JSON
+        string.
+        """
+        return self.submit('DELETE', url, None, (200,))
+
+    def post(self, url, data):
+        """
+        Queue a HTTP POST query, the result of which is parsed as a JSON
+        string.
+        """
+        return self.submit('POST', url, data, (201,))
+
+    def put(self, url, data):
+        """
+        Queue a HTTP PUT query, the result of which is parsed as a JSON
+        string.
+        """
+        return self.submit('PUT', url, data, (200, 201, 204))
+
+    def submit(self, method, url, body, accept):
+        """
+        Queue a query and return its AsyncResult. accept lists the response
+        codes indicating success.
+        """
+        result = AsyncResult(self)
+        result.accept = accept
+        self.queue.append((result, method, url, body))
+        self.dispatch()
+        return result
+
+    def dispatch(self):
+        """
+        Start queued queries while the in-flight limit allows.
+        """
+        while self.queue and self.inflight < self.maxinflight:
+            (result, method, url, body) = self.queue.popleft()
+            self.inflight += 1
+            try:
+                self.start(result, method, url, body)
+            except Exception as error:
+                self.finish(result, error=api.ConnectionFailed(str(error)))
+
+    def start(self, result, method, url, body):
+        """
+        Send a query over an idle connection to the host, or over a new one
+        if there is none.
+        """
+        result.request = (method, url, body)
+        idle = self.idleconnections.get((self.scheme, self.host))
+        result.reused = bool(idle)
+        if idle:
+            conn = idle.pop()
+        else:
+            conn = AsyncConnection(self, self.scheme, self.host,
+                                   self.resolve(self.scheme, self.host))
+        conn.send_request(result, self.format_request(method, self.host,
+                                                      self.build_path(url),
+                                                      body, 'keep-alive'))
+
+    def format_request(self, method, host, path, body, connection):
+        """
+        Format a HTTP/1.1 request.
+        """
+        lines = [method + ' ' + path + ' HTTP/1.1', 'Host: ' + host,
+                 'Connection: ' + connection]
+        for (name, value) in self.build_headers().items():
+            lines.append(name + ': ' + value)
+        if body is not None:
+            lines.append('Content-Length: ' + str(len(body)))
+        return '\r\n'.join(lines) + '\r\n\r\n' + (body or '')
+
+    def resolve(self, scheme, host):
+        """
+        Resolve the address of a host, caching the result.
+        """
+        if (scheme, host) not in self.addresses:
+            (name, sep, port) = host.partition(':')
+            if not port:
+                port = 80 if scheme == 'http' else 443
+            info = socket.getaddrinfo(name, int(port), 0,
+                                      socket.SOCK_STREAM)[0]
+            self.addresses[(scheme, host)] = (info[0], info[4])
+        return self.addresses[(scheme, host)]
+
+    def complete(self, result, response):
+        """
+        Complete a result with a (status, headers, body) response.
+        """
+        (status, headers, body) = response
+        if status not in result.accept:
+            self.finish(result, error=api.response_error(
+                {'code': status, 'body': body, 'headers': headers}))
+            return
+        try:
+            value = json.loads(body)
+        except ValueError as error:
+            self.finish(result, error=api.QueryFailed(str(error)))
+            return
+        self.finish(result, value)
+
+    def finish(self, result, value=None, error=None):
+        """
+        Complete a result and start the next queued query.
+        """
+        self.inflight -= 1
+        result.set(value, error)
+        self.dispatch()
+
+    def retry(self, result, error):
+        """
+        Queue a GET query sent over a reused connection again, or fail it
+        with a given error.
+        """
+        (method, url, body) = result.request
+        if method != 'GET' or not result.reused:
+            self.finish(result, error=error)
+            return
+        self.inflight -= 1
+        self.queue.appendleft((result, method, url, body))
+        self.dispatch()
+
+    def connection_idle(self, conn):
+        """
+        This function is called, when a connection has no outstanding
+        requests left. The connection is kept for reuse, if the server
+        allows it and the pool of the host is not full.
+        """
+        idle = self.idleconnections.setdefault(conn.key, [])
+        if conn in idle:
+            return
+        if conn.reusable and len(idle) < self.poolsize:
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def connection_closed(self, conn):
+        """
+        Forget a closed connection.
+        """
+        idle = self.idleconnections.get(conn.key, [])
+        if conn in idle:
+            idle.remove(conn)
+
+    def check_timeouts(self):
+        """
+        Fail the queries on connections inactive for too long and close the
+        connections idle for too long.
+        """
+        now = time.time()
+        for conn in self.map.values():
+            if conn.outstanding and now - conn.lastactivity > self.timeout:
+                conn.close()
+                conn.fail(api.ConnectionFailed('Query timed out'))
+            elif (not conn.outstanding and
+                  now - conn.lastactivity > self.idletimeout):
+                conn.close()
+
+    def idle(self):
+        """
+        Return True, if no queries are queued or in flight.
+        """
+        return not self.inflight and not self.queue
+
+    def run(self, until=None):
+        """
+        Drive the event loop until all queries have completed or until()
+        returns True. Idle connections are left open.
+        """
+        if until is None:
+            until = self.idle
+        while not until():
+            if not self.map:
+                self.dispatch()
+                if not self.map:
+                    return
+            asyncore.loop(0.05, False, self.map, 1)
+            self.check_timeouts()
+
+    def wait(self, results):
+        """
+        Drive the event loop until all given results have completed and return
+        their values. The first failed query raises its error.
+        """
+        remaining = [len(results)]
+        def countdown(result):
+            remaining[0] -= 1
+        for result in results:
+            result.add_callback(countdown)
+        self.run(lambda: remaining[0] == 0)
+        return [result.result() for result in results]
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        for idle in self.idleconnections.values():
+            for conn in list(idle):
+                conn.close()
+
+
+class AsyncActionHandler(api.ActionHandler):
+    """
+    This class calls an AsyncQueryHandler. Its methods return AsyncResult
+    objects, which can be waited for one by one or all at once with wait().
+    """
+    def wait(self, results):
+        """
+        Wait for a list of AsyncResult objects and return their values.
+        """
+        return self.queryhandler.wait(results)
+
+    def run(self):
+        """
+        Drive the event loop until all queries have completed.
+        """
+        self.queryhandler.run()
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+
+import threading, Queue, json, shlex
+
+# The option set by the positional argument of an action in a script line.
+POSITIONAL = {'getdomainprices': 'currency',
+              'gethostingprices': 'currency',
+              'getvpsprices': 'currency',
+              'getdomainavailability': 'domainname',
+              'getbulkdomainavailability': 'domainfile',
+              'syncdomainlist': 'snapshot'}
+
+class BatchSyntaxError(Exception):
+    """
+    This exception indicates, that a line of a batch file cannot be parsed.
+    """
+
+
+def parse_line(line):
+    """
+    Parse a line of a batch file into command line arguments. A line is
+    either a JSON object like {"action": "getdomainprices", "currency":
+    "HUF"}, or a script line like "getdomainprices HUF" holding the action,
+    its positional argument and further --option value pairs. Returns None
+    for empty lines and comments starting with #.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        try:
+            action = json.loads(line)
+        except ValueError as error:
+            raise BatchSyntaxError('Invalid JSON: ' + str(error))
+        if not isinstance(action, dict) or 'action' not in action:
+            raise BatchSyntaxError('The JSON object has no "action"')
+        args = ['--' + str(action.pop('action'))]
+        for (name, value) in sorted(action.items()):
+            args += ['--' + str(name), unicode(value).encode('utf-8')]
+        return args
+    try:
+        tokens = shlex.split(line)
+    except ValueError as error:
+        raise BatchSyntaxError(str(error))
+    action = tokens.pop(0).lstrip('-')
+    args = ['--' + action]
+    if tokens and not tokens[0].startswith('--'):
+        if action not in POSITIONAL:
+            raise BatchSyntaxError(action + ' takes no positional argument')
+        args += ['--' + POSITIONAL[action], tokens.pop(0)]
+    return args + tokens
+
+
+class BatchRunner:
+    """
+    This class runs the actions of a batch file through a pool of worker
+    threads. Results are yielded in input order if ordered is set, otherwise
+    as soon as they are available.
+    """
+    def __init__(self, call, concurrency=10, ordered=True):
+        """
+        Initialize the runner. call is the function performing an action:
+        it is called with the command line arguments of the action and
+        returns the list of result rows.
+        """
+        self.call = call
+        self.concurrency = concurrency
+        self.ordered = ordered
+
+    def run(self, lines):
+        """
+        Run the actions of an iterable of batch file lines. Yields a tuple
+        (line number, arguments, rows, error) for every action, where error
+        is the exception raised by the action or None.
+        """
+        actions = Queue.Queue(self.concurrency * 2)
+        results = Queue.Queue()
+        stopped = threading.Event()
+        threads = [threading.Thread(target=self.feed,
+                                    args=(lines, actions, stopped))]
+        for i in range(self.concurrency):
+            threads.append(threading.Thread(target=self.work,
+                                            args=(actions, results,
+                                                  stopped)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = self.concurrency
+        waiting = {}
+        nextindex = 0
+        try:
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                if not self.ordered:
+                    yield item[1]
+                    continue
+                waiting[item[0]] = item[1]
+                while nextindex in waiting:
+                    yield waiting.pop(nextindex)
+                    nextindex += 1
+        finally:
+            stopped.set()
+
+    def feed(self, lines, actions, stopped):
+        """
+        Put the parsed actions on the work queue, followed by one end marker
+        per worker.
+        """
+        try:
+            index = 0
+            for (number, line) in enumerate(lines, 1):
+                if stopped.is_set():
+                    break
+                try:
+                    args = parse_line(line)
+                    error = None
+                except BatchSyntaxError as error:
+                    args = []
+                if args is None:
+                    continue
+                actions.put((index, number, args, error))
+                index += 1
+        finally:
+            for i in range(self.concurrency):
+                actions.put(None)
+
+    def work(self, actions, results, stopped):
+        """
+        Run actions from the work queue until the end marker arrives.
+        """
+        while True:
+            action = actions.get()
+            if action is None:
+                results.put(None)
+                return
+            (index, number, args, error) = action
+            rows = None
+            if error is None and not stopped.is_set():
+                try:
+                    rows = self.call(args)
+                except Exception as error:
+                    pass
+            results.put((index, (number, args, rows, error)))
@@ -0,0 +1,450 @@
+#!/usr/bin/python
+
+import sys, os, json, math, time, optparse, resource, subprocess, ssl
+import multiprocessing, multiprocessing.pool, tempfile
+import api, asyncapi, bulk, cli, formats, pipeline, pipelining, standin
+
+SCENARIOS = ['single_calls', 'pooled_calls', 'bulk_availability',
+             'async_availability', 'pipelined_availability', 'domain_list',
+             'domain_list_stream', 'cli_domain_list', 'cli_bulk_availability',
+             'cli_startup', 'threaded_prices', 'pipeline_prices']
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of a list of values, or None for an
+    empty list.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(fraction * len(values))) - 1
+    return values[min(len(values) - 1, max(0, rank))]
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare benchmark results to baseline results. Returns a list of
+    messages describing the scenarios, whose throughput dropped or whose
+    p99 latency grew by more than the tolerance fraction.
+    """
+    regressions = []
+    for (name, result) in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or 'error' in result or 'error' in base:
+            continue
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append('%s: throughput %.1f/s, baseline %.1f/s' %
+                               (name, result['throughput'],
+                                base['throughput']))
+        if (result['p99_ms'] is not None and base['p99_ms'] is not None and
+            result['p99_ms'] > base['p99_ms'] * (1 + tolerance)):
+            regressions.append('%s: p99 latency %.1f ms, baseline %.1f ms' %
+                               (name, result['p99_ms'], base['p99_ms']))
+    return regressions
+
+
+class Benchmark:
+    """
+    This class runs benchmark scenarios against a StandInServer. Every
+    scenario runs in a child process, so that its memory usage can be
+    measured in isolation.
+    """
+    def __init__(self, server, requests=200, names=1000, concurrency=20,
+                 repeats=5, sslcontext=None):
+        """
+        Initialize the benchmark. requests is the number of single calls,
+        names the number of domains checked by the bulk scenarios and repeats
+        the number of times the domain list and CLI startup scenarios run.
+        """
+        self.server = server
+        self.requests = requests
+        self.names = names
+        self.concurrency = concurrency
+        self.repeats = repeats
+        self.sslcontext = sslcontext
+
+    def handler(self, cls=api.HTTPQueryHandler, **kwargs):
+        """
+        Create a query handler of a given class for the server.
+        """
+        return cls(self.server.endpoint(), '1.0', 'key', 'user', 'pass',
+                   **kwargs)
+
+    def domain_names(self):
+        """
+        Return the list of domain names checked by the bulk scenarios.
+        """
+        return ['name' + str(i) + '.hu' for i in range(self.names)]
+
+    def cli_args(self, *args):
+        """
+        Return the command line arguments to run the CLI against the server.
+        """
+        return (['dotrollcli', '--apiendpoint', self.server.endpoint(),
+                 '--apikey', 'key', '--username', 'user', '--password',
+                 'pass', '--concurrency', str(self.concurrency)] +
+                list(args))
+
+    def timed(self, func, count):
+        """
+        Call a function count times. Returns the number of operations, the
+        list of latencies and the number of failed calls.
+        """
+        latencies = []
+        errors = 0
+        for i in range(count):
+            start = time.time()
+            try:
+                func()
+            except api.QueryFailed:
+                errors += 1
+            latencies.append(time.time() - start)
+        return (count, latencies, errors)
+
+    def scenario_single_calls(self):
+        """
+        Download price lists one by one over new connections.
+        """
+        ah = api.ActionHandler(self.handler())
+        return self.timed(lambda: ah.get_domain_prices('HUF'), self.requests)
+
+    def scenario_pooled_calls(self):
+        """
+        Download price lists one by one over a keep-alive connection.
+        """
+        ah = api.ActionHandler(self.handler(api.PooledHTTPQueryHandler))
+        return self.timed(lambda: ah.get_domain_prices('HUF'), self.requests)
+
+    def scenario_bulk_availability(self):
+        """
+        Check the availability of many domains with the bulk checker.
+        """
+        qh = TimingQueryHandler(self.handler(api.PooledHTTPQueryHandler,
+                                             poolsize=self.concurrency))
+        checker = bulk.BulkAvailabilityChecker(api.ActionHandler(qh),
+                                               self.concurrency, retries=0)
+        errors = 0
+        for (domainname, result, error) in checker.check(
+            self.domain_names()):
+            if error is not None:
+                errors += 1
+        return (self.names, qh.latencies, errors)
+
+    def scenario_async_availability(self):
+        """
+        Check the availability of many domains with the asynchronous handler.
+        """
+        qh = self.handler(asyncapi.AsyncQueryHandler,
+                          maxinflight=self.concurrency,
+                          sslcontext=self.sslcontext)
+        try:
+            return self.async_availability(qh)
+        finally:
+            qh.close()
+
+    def scenario_pipelined_availability(self):
+        """
+        Check the availability of many domains over two connections with
+        HTTP/1.1 pipelining.
+        """
+        qh = self.handler(pipelining.PipeliningQueryHandler,
+                          maxconnections=2,
+                          depth=max(1, self.concurrency / 2),
+                          sslcontext=self.sslcontext)
+        try:
+            return self.async_availability(qh)
+        finally:
+            qh.close()
+
+    def async_availability(self, qh):
+        """
+        Check the availability of many domains with an asynchronous query
+        handler.
+        """
+        ah = asyncapi.AsyncActionHandler(qh)
+        latencies = []
+        errors = [0]
+        def record(result):
+            latencies.append(time.time() - result.started)
+            if result.error is not None:
+                errors[0] += 1
+        for domainname in self.domain_names():
+            result = ah.get_domain_availability(domainname)
+            result.started = time.time()
+            result.add_callback(record)
+        ah.run()
+        return (self.names, latencies, errors[0])
+
+    def scenario_domain_list(self):
+        """
+        Download and parse the whole domain list.
+        """
+        ah = api.ActionHandler(self.handler(conditional=False))
+        return self.timed(ah.get_domain_list, self.repeats)
+
+    def scenario_domain_list_stream(self):
+        """
+        Stream the domain list record by record.
+        """
+        ah = api.ActionHandler(self.handler())
+        def consume():
+            for domain in ah.stream_domain_list():
+                pass
+        return self.timed(consume, self.repeats)
+
+    def scenario_threaded_prices(self):
+        """
+        Download and flatten price lists in worker threads.
+        """
+        qh = self.handler(api.PooledHTTPQueryHandler,
+                          poolsize=self.concurrency)
+        def price_rows(url):
+            try:
+                formats.price_rows(qh.get(url))
+            except api.QueryFailed as error:
+                return error
+        threads = multiprocessing.pool.ThreadPool(self.concurrency)
+        try:
+            return self.consumed(threads.imap(
+                price_rows, ['domain/prices/HUF'] * self.requests))
+        finally:
+            threads.close()
+
+    def scenario_pipeline_prices(self):
+        """
+        Download price lists in worker threads and flatten them in worker
+        processes.
+        """
+        qh = self.handler(api.PooledHTTPQueryHandler,
+                          poolsize=self.concurrency)
+        runner = pipeline.Pipeline(qh, self.concurrency)
+        try:
+            return self.consumed(item[2] for item in runner.run(
+                [('domain/prices/HUF', 'prices')] * self.requests))
+        finally:
+            runner.close()
+
+    def consumed(self, errors):
+        """
+        Consume an iterable of errors or None. Returns the number of items,
+        the list of times between them and the number of errors.
+        """
+        latencies = []
+        failed = 0
+        last = time.time()
+        for error in errors:
+            if error is not None:
+                failed += 1
+            latencies.append(time.time() - last)
+            last = time.time()
+        return (len(latencies), latencies, failed)
+
+    def scenario_cli_domain_list(self):
+        """
+        Produce the domain list rows of the CLI.
+        """
+        parser = cli.ArgumentParser()
+        def consume():
+            for row in parser.parse_and_call(self.cli_args('--getdomainlist')):
+                pass
+        return self.timed(consume, self.repeats)
+
+    def scenario_cli_bulk_availability(self):
+        """
+        Produce the bulk availability rows of the CLI.
+        """
+        (fd, path) = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as domainfile:
+                domainfile.write('\n'.join(self.domain_names()))
+            parser = cli.ArgumentParser()
+            # The scenario runs in a child process, silence its progress.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), 2)
+            start = time.time()
+            rows = list(parser.parse_and_call(self.cli_args(
+                '--getbulkdomainavailability', '--domainfile', path)))
+            errors = len([row for row in rows if row[1].startswith('error')])
+            return (len(rows), [time.time() - start], errors)
+        finally:
+            os.unlink(path)
+
+    def scenario_cli_startup(self):
+        """
+        Run the dotrollcli script, including interpreter startup.
+        """
+        script = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'dotrollcli')
+        args = [sys.executable, script] + self.cli_args('--getdomainprices',
+                                                        '--currency',
+                                                        'HUF')[1:]
+        devnull = open(os.devnull, 'w')
+        def run():
+            if subprocess.call(args, stdout=devnull, stderr=devnull):
+                raise api.QueryFailed('dotrollcli failed')
+        return self.timed(run, self.repeats)
+
+    def measure(self, name, queue):
+        """
+        Run a scenario and put its measurements on a queue.
+        """
+        try:
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.time()
+            (operations, latencies, errors) = getattr(self,
+                                                      'scenario_' + name)()
+            seconds = time.time() - start
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            queue.put({'operations': operations,
+                       'errors': errors,
+                       'seconds': seconds,
+                       'throughput': operations / seconds,
+                       'p50_ms': self.milliseconds(percentile(latencies,
+                                                              0.5)),
+                       'p99_ms': self.milliseconds(percentile(latencies,
+                                                              0.99)),
+                       'peak_rss_kb': after,
+                       'rss_growth_kb': after - before})
+        except Exception as error:
+            queue.put({'error': repr(error)})
+
+    def milliseconds(self, seconds):
+        """
+        Convert seconds to milliseconds, keeping None.
+        """
+        if seconds is None:
+            return None
+        return seconds * 1000
+
+    def run(self, name):
+        """
+        Run a scenario in a child process and return its measurements.
+        """
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=self.measure,
+                                          args=(name, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        return result
+
+
+class TimingQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler records the latency of every GET query.
+    """
+    def __init__(self, queryhandler):
+        """
+        Initialize the handler with an empty list of latencies.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.latencies = []
+
+    def get(self, url):
+        """
+        Perform a timed HTTP GET query.
+        """
+        start = time.time()
+        try:
+            return self.queryhandler.get(url)
+        finally:
+            self.latencies.append(time.time() - start)
+
+
+def main(argv):
+    """
+    Run the benchmark from the command line. Returns the exit status.
+    """
+    parser = optparse.OptionParser(description='Benchmark the DotRoll API'
+                                               ' handlers against a local'
+                                               ' stand-in server.')
+    parser.add_option('--output',
+                      help='Write the results as JSON to this file instead'
+                           ' of the standard output.')
+    parser.add_option('--scenarios',
+                      help='Comma separated list of scenarios to run.'
+                           ' Defaults to all: ' + ','.join(SCENARIOS),
+                      default=','.join(SCENARIOS))
+    parser.add_option('--latency', type='float', default=0.005,
+                      help='Server latency in seconds. Defaults to'
+                           ' %default.')
+    parser.add_option('--rtt', type='float', default=0,
+                      help='Round trip time in seconds added by a proxy in'
+                           ' front of the server. Defaults to %default.')
+    parser.add_option('--errorrate', type='float', default=0,
+                      help='Fraction of queries failing with 503.'
+                           ' Defaults to %default.')
+    parser.add_option('--domains', type='int', default=20000,
+                      help='Size of the domain list. Defaults to %default.')
+    parser.add_option('--tlds', type='int', default=500,
+                      help='Size of the price lists. Defaults to %default.')
+    parser.add_option('--requests', type='int', default=200,
+                      help='Number of single calls. Defaults to %default.')
+    parser.add_option('--names', type='int', default=1000,
+                      help='Number of domains checked in bulk. Defaults to'
+                           ' %default.')
+    parser.add_option('--concurrency', type='int', default=20,
+                      help='Concurrency of bulk checks. Defaults to'
+                           ' %default.')
+    parser.add_option('--repeats', type='int', default=5,
+                      help='Number of domain list downloads and CLI runs.'
+                           ' Defaults to %default.')
+    parser.add_option('--certfile',
+                      help='Serve HTTPS using the certificate and key in'
+                           ' this file. Certificates are not verified.')
+    parser.add_option('--baseline',
+                      help='Compare the results to a previous results file'
+                           ' and fail on regressions.')
+    parser.add_option('--tolerance', type='float', default=0.2,
+                      help='Allowed regression as a fraction of the'
+                           ' baseline. Defaults to %default.')
+    (options, args) = parser.parse_args(argv[1:])
+    sslcontext = None
+    if options.certfile:
+        sslcontext = ssl._create_unverified_context()
+        ssl._create_default_https_context = ssl._create_unverified_context
+    server = standin.StandInServer(delay=options.latency,
+                                   domains=options.domains,
+                                   tlds=options.tlds,
+                                   errorrate=options.errorrate,
+                                   certfile=options.certfile, record=False)
+    target = server
+    if options.rtt:
+        target = standin.LatencyProxy(server, options.rtt / 2)
+    try:
+        benchmark = Benchmark(target, options.requests, options.names,
+                              options.concurrency, options.repeats,
+                              sslcontext)
+        results = {}
+        for name in options.scenarios.split(','):
+            results[name] = benchmark.run(name)
+    finally:
+        if target is not server:
+            target.stop()
+        server.stop()
+    report = {'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0],
+              'settings': dict((name, getattr(options, name))
+                               for name in ['latency', 'rtt', 'errorrate',
+                                            'domains',
+                                            'tlds', 'requests', 'names',
+                                            'concurrency', 'repeats']),
+              'results': results}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as outfile:
+            outfile.write(output + '\n')
+    else:
+        print output
+    if options.baseline:
+        with open(options.baseline) as basefile:
+            regressions = compare(results, json.load(basefile)['results'],
+                                  options.tolerance)
+        for regression in regressions:
+            sys.stderr.write('Regression: ' + regression + '\n')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
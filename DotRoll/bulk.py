@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+import threading, Queue, time
+import api, validate
+
+class BulkProgress:
+    """
+    This class holds the progress counters of a bulk availability check.
+    """
+    def __init__(self):
+        """
+        Initialize the counters.
+        """
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def elapsed(self):
+        """
+        Return the number of seconds since the check has started.
+        """
+        return time.time() - self.started
+
+    def rate(self):
+        """
+        Return the number of names checked per second.
+        """
+        elapsed = self.elapsed()
+        if not elapsed:
+            return 0.0
+        return self.completed / elapsed
+
+    def __str__(self):
+        """
+        Return a human readable summary of the progress.
+        """
+        return ('%d checked, %d failed, %d retried, %.1f names/s' %
+                (self.completed, self.failed, self.retried, self.rate()))
+
+
+class BulkAvailabilityChecker:
+    """
+    This class checks the availability of a large number of domain names
+    through a pool of worker threads sharing one ActionHandler. Results are
+    yielded as soon as they are available, not in input order.
+    """
+    def __init__(self, actionhandler, concurrency=10, retries=2,
+                 retrydelay=1, progress=None):
+        """
+        Initialize the checker. Names failing with a connection error, a 5xx
+        error or 429 Too Many Requests are retried up to retries times,
+        waiting retrydelay seconds times the attempt number in between, or
+        the time the server asked for in its Retry-After header. The
+        progress function is called with a BulkProgress object after every
+        completed name.
+        """
+        self.actionhandler = actionhandler
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retrydelay = retrydelay
+        self.progress = progress
+
+    def check(self, domainnames):
+        """
+        Check an iterable of domain names. Yields a tuple (domainname, result,
+        error) for every name, where error is the exception raised by the last
+        attempt or None.
+        """
+        names = Queue.Queue(self.concurrency * 2)
+        results = Queue.Queue()
+        stopped = threading.Event()
+        stats = BulkProgress()
+        threads = [threading.Thread(target=self.feed,
+                                    args=(domainnames, names, stopped))]
+        for i in range(self.concurrency):
+            threads.append(threading.Thread(target=self.work,
+                                            args=(names, results, stopped)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = self.concurrency
+        try:
+            while running:
+                item = results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                (item, retried) = item
+                stats.completed += 1
+                stats.retried += retried
+                if item[2] is not None:
+                    stats.failed += 1
+                if self.progress:
+                    self.progress(stats)
+                yield item
+        finally:
+            stopped.set()
+
+    def feed(self, domainnames, names, stopped):
+        """
+        Put the domain names to check on the work queue, followed by one
+        end marker per worker.
+        """
+        try:
+            for domainname in domainnames:
+                if stopped.is_set():
+                    break
+                domainname = domainname.strip()
+                if domainname:
+                    names.put(domainname)
+        finally:
+            for i in range(self.concurrency):
+                names.put(None)
+
+    def work(self, names, results, stopped):
+        """
+        Check domain names from the work queue until the end marker arrives.
+        """
+        while True:
+            domainname = names.get()
+            if domainname is None:
+                results.put(None)
+                return
+            if stopped.is_set():
+                continue
+            try:
+                results.put(self.check_one(domainname))
+            except Exception as error:
+                results.put(((domainname, None, error), 0))
+
+    def check_one(self, domainname):
+        """
+        Check a single domain name, retrying failed queries. Returns a tuple
+        of the result tuple and the number of retries.
+        """
+        attempt = 0
+        while True:
+            try:
+                result = self.actionhandler.get_domain_availability(domainname)
+                return ((domainname, result, None), attempt)
+            except (api.ConnectionFailed, api.ServerError,
+                    api.RateLimited) as error:
+                if attempt >= self.retries:
+                    return ((domainname, None, error), attempt)
+            except api.QueryFailed as error:
+                # Client errors and invalid names will not go away.
+                return ((domainname, None, error), attempt)
+            attempt += 1
+            if (isinstance(error, api.RateLimited) and
+                error.retryafter is not None):
+                time.sleep(error.retryafter)
+            else:
+                time.sleep(self.retrydelay * attempt)
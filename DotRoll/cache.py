@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+import json, os, time, fnmatch, hashlib, threading, tempfile, collections
+import api
+
+# Rules are (URL pattern, TTL in seconds), the first matching pattern wins.
+DEFAULT_TTLS = [('domain/search/*', 0),
+                ('*/prices/*', 6 * 3600)]
+
+class CachingQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler caches the results of GET queries for a time to live
+    selected by the URL. The cache is bounded to maxsize entries in memory,
+    evicting the least recently used one, and can optionally be persisted to
+    a cache directory shared by several processes.
+    Cached results are shared between callers and must not be modified.
+    """
+    def __init__(self, queryhandler, ttls=DEFAULT_TTLS, maxsize=256,
+                 cachedir=None):
+        """
+        Initialize the cache. ttls is a list of (URL pattern, TTL) rules;
+        URLs not matching any of them are not cached.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.ttls = ttls
+        self.maxsize = maxsize
+        self.cachedir = cachedir
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.clock = time.time
+        self.hits = 0
+        self.diskhits = 0
+        self.misses = 0
+
+    def ttl(self, url):
+        """
+        Return the time to live of an URL.
+        """
+        for (pattern, ttl) in self.ttls:
+            if fnmatch.fnmatchcase(url, pattern):
+                return ttl
+        return 0
+
+    def get(self, url):
+        """
+        Perform a HTTP GET query, serving the result from the cache if
+        possible.
+        """
+        ttl = self.ttl(url)
+        if not ttl:
+            return self.queryhandler.get(url)
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.pop(url, None)
+            if entry is not None and entry[0] > now:
+                self.entries[url] = entry
+                self.hits += 1
+                return entry[1]
+        entry = self.load(url, now)
+        if entry is not None:
+            with self.lock:
+                self.diskhits += 1
+        else:
+            with self.lock:
+                self.misses += 1
+            entry = (now + ttl, self.queryhandler.get(url))
+            self.save(url, entry)
+        self.store(url, entry)
+        return entry[1]
+
+    def store(self, url, entry):
+        """
+        Store an (expiry, value) entry in memory, evicting the least recently
+        used entries above the size limit.
+        """
+        with self.lock:
+            self.entries.pop(url, None)
+            self.entries[url] = entry
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def path(self, url):
+        """
+        Return the path of the cache file for an URL. The key includes the
+        credentials, so that configurations sharing a cache directory do not
+        read each other's entries.
+        """
+        key = '\n'.join([self.endpoint, self.apiversion, str(self.apikey),
+                         str(self.username), url])
+        return os.path.join(self.cachedir,
+                            hashlib.sha1(key).hexdigest() + '.json')
+
+    def load(self, url, now):
+        """
+        Load an unexpired entry from the cache directory. Returns None, if
+        there is no such entry.
+        """
+        if self.cachedir is None:
+            return None
+        try:
+            with open(self.path(url)) as cachefile:
+                data = json.load(cachefile)
+        except (IOError, ValueError):
+            return None
+        if data['expires'] <= now:
+            return None
+        return (data['expires'], data['value'])
+
+    def save(self, url, entry):
+        """
+        Save an entry to the cache directory. Failures are ignored, as the
+        entry is still cached in memory.
+        """
+        if self.cachedir is None:
+            return
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            (fd, tmppath) = tempfile.mkstemp(dir=self.cachedir)
+            with os.fdopen(fd, 'w') as cachefile:
+                json.dump({'expires': entry[0], 'value': entry[1]},
+                          cachefile)
+            os.rename(tmppath, self.path(url))
+        except (IOError, OSError):
+            pass
+
+    def clear(self):
+        """
+        Drop all entries cached in memory.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Return the cache counters as a dictionary.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'diskhits': self.diskhits,
+                    'misses': self.misses, 'size': len(self.entries)}
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+import threading, operator
+
+PRODUCTS = ['domain', 'hosting', 'vps']
+CURRENCIES = ['HUF', 'EUR', 'USD']
+
+def key_string(value):
+    """
+    Return a name or period from a price list as an interned string, so that
+    the entries share a single copy of it.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return intern(value)
+
+
+class Price(object):
+    """
+    This class is a single entry of a price list: the net and gross price of
+    a TLD or package for a period in a currency.
+    """
+    __slots__ = ('product', 'name', 'period', 'currency', 'net', 'gross')
+
+    def __init__(self, product, name, period, currency, net, gross):
+        """
+        Initialize the entry.
+        """
+        self.product = product
+        self.name = name
+        self.period = period
+        self.currency = currency
+        self.net = net
+        self.gross = gross
+
+    def __repr__(self):
+        """
+        Return a readable representation of the entry.
+        """
+        return ('Price(%r, %r, %r, %r, %r, %r)' %
+                (self.product, self.name, self.period, self.currency,
+                 self.net, self.gross))
+
+
+class PriceCatalog:
+    """
+    This class holds the price lists of several products and currencies in
+    memory, indexed for lookups by product, TLD or package name, period and
+    currency. Names and periods are strings as in the price lists.
+    """
+    def __init__(self):
+        """
+        Initialize an empty catalog.
+        """
+        self.prices = {}
+        self.byname = {}
+        self.bycurrency = {}
+        self.byperiod = {}
+        self.byproduct = {}
+
+    def load(self, actionhandler, products=PRODUCTS, currencies=CURRENCIES):
+        """
+        Download the price lists of the products in the currencies through
+        an ActionHandler, all at the same time, and add them to the catalog.
+        """
+        functions = {'domain': actionhandler.get_domain_prices,
+                     'hosting': actionhandler.get_hosting_prices,
+                     'vps': actionhandler.get_vps_prices}
+        results = {}
+        errors = []
+        def download(product, currency):
+            try:
+                results[(product, currency)] = functions[product](currency)
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=download,
+                                    args=(product, currency))
+                   for product in products for currency in currencies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        for ((product, currency), pricelist) in sorted(results.items()):
+            self.add(product, currency, pricelist)
+
+    def add(self, product, currency, pricelist):
+        """
+        Add a price list in the {"prices": {name: {period: {"net": ...,
+        "gross": ...}}}} form returned by the API, replacing the price list
+        of the product in the currency added before.
+        """
+        product = key_string(product)
+        currency = key_string(currency)
+        self.discard(product, currency)
+        for (name, periods) in pricelist['prices'].items():
+            name = key_string(name)
+            for (period, amounts) in periods.items():
+                period = key_string(period)
+                price = Price(product, name, period, currency,
+                              amounts['net'], amounts['gross'])
+                self.prices[(product, name, period, currency)] = price
+                self.byname.setdefault((product, name), []).append(price)
+                self.byproduct.setdefault(product, set()).add(name)
+                self.bycurrency.setdefault((product, currency),
+                                           []).append(price)
+                self.byperiod.setdefault((product, currency, period),
+                                         []).append(price)
+
+    def discard(self, product, currency):
+        """
+        Remove the price list of a product in a currency from the catalog.
+        """
+        old = self.bycurrency.pop((product, currency), [])
+        names = set()
+        for price in old:
+            del self.prices[(product, price.name, price.period, currency)]
+            self.byperiod.pop((product, currency, price.period), None)
+            names.add(price.name)
+        for name in names:
+            remaining = [price for price in self.byname[(product, name)]
+                         if price.currency != currency]
+            if remaining:
+                self.byname[(product, name)] = remaining
+            else:
+                del self.byname[(product, name)]
+                self.byproduct[product].discard(name)
+        if not self.byproduct.get(product, True):
+            del self.byproduct[product]
+
+    def __len__(self):
+        """
+        Return the number of entries.
+        """
+        return len(self.prices)
+
+    def lookup(self, product, name, period, currency):
+        """
+        Return the entry of a TLD or package for a period in a currency, or
+        None.
+        """
+        return self.prices.get((product, name, period, currency))
+
+    def names(self, product):
+        """
+        Return the sorted list of TLDs or packages of a product.
+        """
+        return sorted(self.byproduct.get(product, []))
+
+    def entries(self, product, name):
+        """
+        Return the entries of a TLD or package in all periods and
+        currencies.
+        """
+        return list(self.byname.get((product, name), []))
+
+    def currencies(self, product, name, period):
+        """
+        Return the entries of a TLD or package for a period keyed by
+        currency, to compare the prices across currencies.
+        """
+        return dict((currency, price) for (currency, price)
+                    in ((currency, self.lookup(product, name, period,
+                                               currency))
+                        for currency in CURRENCIES)
+                    if price is not None)
+
+    def cheapest(self, product, currency, period='1', names=None,
+                 field='gross', limit=None):
+        """
+        Return the entries of the product for a period in a currency sorted
+        by the net or gross price, cheapest first. If names is given, only
+        these TLDs or packages are considered.
+        """
+        if names is None:
+            prices = list(self.byperiod.get((product, currency, period), []))
+        else:
+            prices = [self.prices[key] for key
+                      in ((product, name, period, currency)
+                          for name in names)
+                      if key in self.prices]
+        prices.sort(key=operator.attrgetter(field))
+        if limit is not None:
+            prices = prices[:limit]
+        return prices
+
+    def net_gross(self, product, currency, period=None):
+        """
+        Return (name, period, net, gross) tuples for the entries of a product
+        in a currency, optionally only for one period, sorted by name and
+        period.
+        """
+        if period is None:
+            prices = self.bycurrency.get((product, currency), [])
+        else:
+            prices = self.byperiod.get((product, currency, period), [])
+        return sorted((price.name, price.period, price.net, price.gross)
+                      for price in prices)
@@ -1,12 +1,29 @@
 #!/usr/bin/python
 
 import sys
+import time
+import copy
+import threading
 import optparse
-import unittest
 import api
+import formats
+import singleflight
+
+# The modules of the optional subsystems are imported by the methods using
+# them, so that starting the CLI only loads what the options ask for.
 
 CURRENTAPIVERSION='1.0'
 
+# The names of the result columns of the functions. The columns of the
+# domain list are the sorted keys of the domain records.
+COLUMNS = {'getdomainprices': ['tld', 'period', 'gross', 'net'],
+           'gethostingprices': ['package', 'period', 'gross', 'net'],
+           'getvpsprices': ['package', 'period', 'gross', 'net'],
+           'getdomainavailability': ['result'],
+           'getbulkdomainavailability': ['domainname', 'result'],
+           'syncdomainlist': ['change', 'name'],
+           'batch': ['line', 'args', 'rows', 'error']}
+
 class ArgumentParser:
     """
     This class parses command line options and dispatches them to the DotRoll
@@ -21,6 +38,11 @@ class ArgumentParser:
         self.parser = optparse.OptionParser(description='Access the DotRoll'
                                                         ' API functionality'
                                                         ' from command line.')
+        self.metrics = None
+        self.stdin = sys.stdin
+        self.stdout = sys.stdout
+        self.stderr = sys.stderr
+        self.parselock = threading.Lock()
         apigroup = optparse.OptionGroup(self.parser,
                                         'API options',
                                         'These options modify, how the API'
@@ -49,6 +71,36 @@ class ArgumentParser:
                                  ' You don\'t normally need to change this.'
                                  ' Defaults to "%default"',
                             default=CURRENTAPIVERSION)
+        apigroup.add_option('--cachedir',
+                            type='string',
+                            help='The directory used to cache pricelists'
+                                 ' between calls. Caching is disabled, if'
+                                 ' not set.')
+        apigroup.add_option('--ratelimit',
+                            type='string',
+                            help='The maximum number of queries sent per'
+                                 ' second, or comma separated class=rate'
+                                 ' pairs limiting the search, price and list'
+                                 ' queries separately, e.g.'
+                                 ' search=5,price=1,default=10, where'
+                                 ' default limits the other queries.'
+                                 ' Unlimited, if not set.')
+        apigroup.add_option('--ratelimitfile',
+                            type='string',
+                            help='The file used to share the --ratelimit'
+                                 ' between concurrently running processes.')
+        apigroup.add_option('--accounts',
+                            metavar='FILE',
+                            help='Call the action for every account in this'
+                                 ' credentials file in parallel, instead of'
+                                 ' the account given by --apikey, --username'
+                                 ' and --password. The file has a section'
+                                 ' per account with apikey, username,'
+                                 ' password and an optional ratelimit.')
+        apigroup.add_option('--stats',
+                            action='store_true',
+                            help='Print a timing breakdown of the HTTP'
+                                 ' requests on the standard error on exit.')
         self.parser.add_option_group(apigroup)
         actiongroup = optparse.OptionGroup(self.parser,
                                            'Actions',
@@ -72,6 +124,15 @@ class ArgumentParser:
                                action='store_true',
                                help='Download a list of all domains owned'
                                     ' by the user')
+        actiongroup.add_option('--getbulkdomainavailability',
+                               action='store_true',
+                               help='Check the availability of a list of'
+                                    ' domains read from --domainfile.')
+        actiongroup.add_option('--syncdomainlist',
+                               action='store_true',
+                               help='Update the domain list snapshot in'
+                                    ' --snapshot and list the added, removed'
+                                    ' and changed domains.')
         self.parser.add_option_group(actiongroup)
         pricegroup = optparse.OptionGroup(self.parser,
                                           'Price options',
@@ -88,7 +149,97 @@ class ArgumentParser:
         domaingroup.add_option('--domainname',
                               help='Sets the domain name for the current '
                                    'operation')
+        domaingroup.add_option('--domainfile',
+                              help='Sets the file to read domain names from,'
+                                   ' one per line. Defaults to "%default",'
+                                   ' which means the standard input.',
+                              default='-')
+        domaingroup.add_option('--concurrency',
+                              type='int',
+                              help='Sets the number of domains checked, or'
+                                   ' batch actions run, at the same time.'
+                                   ' Defaults to %default.',
+                              default=10)
+        domaingroup.add_option('--retries',
+                              type='int',
+                              help='Sets the number of times a failed check'
+                                   ' is retried. Defaults to %default.',
+                              default=2)
+        domaingroup.add_option('--validatenames',
+                              action='store_true',
+                              help='Checks domain names against the IDNA'
+                                   ' rules and the TLDs of the domain price'
+                                   ' list locally, without sending invalid'
+                                   ' names to the service.')
+        domaingroup.add_option('--availabilityttl',
+                              type='float',
+                              metavar='SECONDS',
+                              help='Sets the number of seconds "available"'
+                                   ' results are reused for. Defaults to'
+                                   ' %default.',
+                              default=0)
+        domaingroup.add_option('--negativettl',
+                              type='float',
+                              metavar='SECONDS',
+                              help='Sets the number of seconds other'
+                                   ' availability results, like'
+                                   ' "registered", are reused for. Defaults'
+                                   ' to %default.',
+                              default=0)
+        domaingroup.add_option('--snapshot',
+                              metavar='FILE',
+                              help='Sets the SQLite database holding the'
+                                   ' domain list snapshot.')
         self.parser.add_option_group(domaingroup)
+        daemongroup = optparse.OptionGroup(self.parser,
+                                           'Daemon options',
+                                           'These options run the command'
+                                           ' line interface as a daemon'
+                                           ' keeping its connections and'
+                                           ' caches warm, or forward the'
+                                           ' action to one')
+        daemongroup.add_option('--daemon',
+                               metavar='SOCKET',
+                               help='Run as a daemon listening on this Unix'
+                                    ' socket.')
+        daemongroup.add_option('--connect',
+                               metavar='SOCKET',
+                               help='Forward the action to the daemon'
+                                    ' listening on this Unix socket.')
+        self.parser.add_option_group(daemongroup)
+        batchgroup = optparse.OptionGroup(self.parser,
+                                          'Batch options',
+                                          'These options run a batch of'
+                                          ' actions in one process')
+        batchgroup.add_option('--batch',
+                              metavar='FILE',
+                              help='Run the actions listed in this file, one'
+                                   ' per line, and print their results as'
+                                   ' JSON lines. A line is either a JSON'
+                                   ' object like {"action":'
+                                   ' "getdomainprices", "currency": "HUF"}'
+                                   ' or a line like "getdomainprices HUF".'
+                                   ' "-" means the standard input.')
+        batchgroup.add_option('--batchorder',
+                              type='choice',
+                              choices=['input', 'completion'],
+                              help='Print the results of a batch in "input"'
+                                   ' or "completion" order. Defaults to'
+                                   ' "%default".',
+                              default='input')
+        self.parser.add_option_group(batchgroup)
+        outputgroup = optparse.OptionGroup(self.parser,
+                                           'Output options',
+                                           'These options change, how the'
+                                           ' results are printed')
+        outputgroup.add_option('--format',
+                               type='choice',
+                               choices=formats.FORMATS,
+                               help='Print the results as "table", "json",'
+                                    ' "jsonl", "csv" or "tsv". Defaults to'
+                                    ' "jsonl" for --batch and "table"'
+                                    ' otherwise.')
+        self.parser.add_option_group(outputgroup)
 
     def usage(self):
         """
@@ -111,8 +262,16 @@ class ArgumentParser:
         if len(args) < 2:
             raise ArgumentError('Incorrect number of arguments')
         (options, args) = self.parser.parse_args(args)
+        return (self.validate(options), options)
+
+    def validate(self, options):
+        """
+        This function validates a set of parsed options.
+        Returns the function to call.
+        """
         actionargs=['getdomainprices', 'gethostingprices', 'getvpsprices',
-                    'getdomainavailability', 'getdomainlist']
+                    'getdomainavailability', 'getdomainlist',
+                    'getbulkdomainavailability', 'syncdomainlist']
         for i in actionargs:
             for j in actionargs:
                 if i != j and getattr(options, i) and getattr(options, j):
@@ -124,125 +283,356 @@ class ArgumentParser:
             not in ['HUF', 'EUR', 'USD']):
             raise ArgumentError('A valid currency code is required for'
                                 ' pricelist download')
+        if options.concurrency < 1:
+            raise ArgumentError('The concurrency must be at least 1')
+        if options.syncdomainlist and not options.snapshot:
+            raise ArgumentError('A --snapshot file is required for domain'
+                                ' list sync')
+        if options.daemon and options.connect:
+            raise ArgumentError('--daemon and --connect are incompatible.')
         func = None
         for i in actionargs:
             if getattr(options, i):
                 func = i
-        return (func, options)
+        if options.batch and (func or options.daemon or options.connect):
+            raise ArgumentError('--batch cannot be combined with an action,'
+                                ' --daemon or --connect.')
+        if options.ratelimit:
+            import ratelimit
+            try:
+                ratelimit.parse_rates(options.ratelimit)
+            except ValueError as error:
+                raise ArgumentError(str(error))
+        if options.accounts and options.ratelimitfile:
+            raise ArgumentError('--accounts and --ratelimitfile are'
+                                ' incompatible, as every account has its own'
+                                ' rate limit.')
+        if options.accounts and (func in ['getbulkdomainavailability',
+                                          'syncdomainlist'] or
+                                 options.batch or options.daemon or
+                                 options.connect):
+            raise ArgumentError('--accounts cannot be combined with'
+                                ' --getbulkdomainavailability,'
+                                ' --syncdomainlist, --batch, --daemon or'
+                                ' --connect.')
+        return func
 
-    def call(self, func, options):
+    def call(self, func, options, apih=None):
         """
-        Call corresponding API function with arguments
+        Call corresponding API function with arguments. If apih is given,
+        the call is made through this ActionHandler, otherwise a new one is
+        built from the options.
         """
-        qh = api.HTTPQueryHandler(options.apiendpoint, options.apiversion,
-                                  options.apikey, options.username,
-                                  options.password)
-        apih = api.ActionHandler(qh)
+        if apih is None:
+            apih = self.build_action_handler(options)
         result = ''
         if func == 'getdomainprices':
-            res = apih.get_domain_prices(options.currency)
-            result = []
-            for i in res['prices'].keys():
-                for j in res['prices'][i].keys():
-                    result.append([i, j, res['prices'][i][j]['gross'],
-                                   res['prices'][i][j]['net']])
+            result = self.price_rows(apih.get_domain_prices(options.currency))
         if func == 'gethostingprices':
-            res = apih.get_hosting_prices(options.currency)
-            result = []
-            for i in res['prices'].keys():
-                for j in res['prices'][i].keys():
-                    result.append([i, j, res['prices'][i][j]['gross'],
-                                   res['prices'][i][j]['net']])
+            result = self.price_rows(apih.get_hosting_prices(
+                options.currency))
         if func == 'getvpsprices':
-            res = apih.get_vps_prices(options.currency)
-            result = []
-            for i in res['prices'].keys():
-                for j in res['prices'][i].keys():
-                    result.append([i, j, res['prices'][i][j]['gross'],
-                                   res['prices'][i][j]['net']])
+            result = self.price_rows(apih.get_vps_prices(options.currency))
         if func == 'getdomainavailability':
             res = apih.get_domain_availability(options.domainname)
             result = [[res['result']]]
         if func == 'getdomainlist':
-            res = apih.get_domain_list()
-            result = []
-            for row in res['domains']:
-                rowresult = []
-                for j in row.keys():
-                    rowresult.append(row[j])
-                result.append(rowresult)
+            result = apih.stream_domain_list()
+        if func == 'getbulkdomainavailability':
+            result = self.check_bulk_availability(apih, options)
+        if func == 'syncdomainlist':
+            result = self.sync_domain_list(apih, options)
         return result
 
+    def build_action_handler(self, options, account=None, pool=None):
+        """
+        Build the ActionHandler and the query handlers below it as configured
+        by the options. If an account is given, its credentials and rate
+        limit are used, and the connections are taken from a shared pool.
+        The rate limit of an account replaces the default one.
+        """
+        hooks = []
+        if options.stats:
+            import metrics
+            if self.metrics is None or account is None:
+                self.metrics = metrics.MetricsRegistry()
+            hooks.append(metrics.MetricsHook(self.metrics))
+        (apikey, username, password) = (options.apikey, options.username,
+                                        options.password)
+        rates = {}
+        if options.ratelimit:
+            import ratelimit
+            rates = ratelimit.parse_rates(options.ratelimit)
+        if account is not None:
+            (apikey, username, password) = (account.apikey, account.username,
+                                            account.password)
+            if account.ratelimit:
+                rates['default'] = account.ratelimit
+        qh = api.PooledHTTPQueryHandler(options.apiendpoint,
+                                        options.apiversion, apikey, username,
+                                        password,
+                                        poolsize=options.concurrency,
+                                        pool=pool, hooks=hooks)
+        if rates:
+            import ratelimit
+            qh = ratelimit.RateLimitedQueryHandler(
+                qh, ratelimit.create_buckets(rates, options.ratelimitfile))
+        qh = singleflight.SingleFlightQueryHandler(qh)
+        if (options.validatenames or options.availabilityttl or
+            options.negativettl):
+            import validate
+            pricelist = api.ActionHandler(qh).get_domain_prices
+            qh = validate.ValidatingQueryHandler(
+                qh, options.validatenames,
+                lambda: self.supported_tlds(pricelist,
+                                            options.currency or 'HUF'),
+                options.availabilityttl, options.negativettl)
+        if options.cachedir:
+            import cache
+            qh = cache.CachingQueryHandler(qh, cachedir=options.cachedir)
+        return api.ActionHandler(qh)
+
+    def supported_tlds(self, pricelist, currency):
+        """
+        Return the set of TLDs in the domain price list of a currency,
+        downloaded by the pricelist function. If it cannot be downloaded, a
+        warning is printed and None is returned, so that domain names under
+        any TLD are checked.
+        """
+        import validate
+        try:
+            return validate.price_list_tlds(pricelist(currency))
+        except Exception as error:
+            self.stderr.write('Cannot download the domain price list, TLDs'
+                              ' are not checked: ' + str(error) + '\n')
+            return None
+
+    def price_rows(self, res):
+        """
+        Return the rows of a price list sorted by product and period.
+        """
+        return formats.price_rows(res)
+
+    def sync_domain_list(self, apih, options):
+        """
+        Update the domain list snapshot and return the changes found.
+        """
+        import sync
+        snapshot = sync.DomainListSync(apih, options.snapshot)
+        try:
+            position = snapshot.position()
+            snapshot.sync()
+            return [[change.kind, change.name]
+                    for change in snapshot.changes(position)]
+        finally:
+            snapshot.close()
+
+    def check_bulk_availability(self, apih, options):
+        """
+        Check the availability of the domains listed in the domain file,
+        yielding result rows as they finish and reporting progress on the
+        standard error.
+        """
+        import bulk
+        if options.domainfile == '-':
+            domainfile = self.stdin
+        else:
+            domainfile = open(options.domainfile)
+        reporter = ProgressReporter(stream=self.stderr)
+        checker = bulk.BulkAvailabilityChecker(apih, options.concurrency,
+                                               options.retries,
+                                               progress=reporter.report)
+        try:
+            for (domainname, res, error) in checker.check(domainfile):
+                if error is None:
+                    yield [domainname, res['result']]
+                else:
+                    yield [domainname, 'error: ' + str(error)]
+        finally:
+            reporter.finish()
+            if domainfile is not self.stdin:
+                domainfile.close()
+
     def parse_and_call(self, args):
         """
         Parse arguments and call function
         """
         (func, options) = self.parse(args)
+        return self.dispatch(func, options)
+
+    def parse_and_print(self, args):
+        """
+        Parse arguments, call function and print the results in the chosen
+        format as they are produced.
+        """
+        (func, options) = self.parse(args)
+        rows = self.dispatch(func, options)
+        format = options.format
+        if options.batch:
+            func = 'batch'
+            format = format or 'jsonl'
+        columns = COLUMNS.get(func)
+        if options.accounts and columns:
+            columns = ['account'] + columns
+        writer = formats.create_writer(format or 'table', self.stdout,
+                                       columns)
+        writer.write_all(rows)
+
+    def dispatch(self, func, options):
+        """
+        Call function as requested by the options: directly, through a
+        daemon or for every action of a batch.
+        """
+        if options.daemon:
+            import daemon
+            daemon.serve(options.daemon)
+            return []
+        if options.connect:
+            import daemon
+            client = daemon.DaemonClient(options.connect)
+            return client.call(func, options, self.stdin, self.stderr)
+        if options.batch:
+            return self.run_batch(options)
+        if options.accounts:
+            return self.call_accounts(func, options)
         return self.call(func, options)
 
+    def call_accounts(self, func, options):
+        """
+        Call function for every account of the credentials file in parallel,
+        yielding the rows tagged with the account name as the accounts
+        finish. Failing accounts are reported on the standard error.
+        """
+        import accounts
+        try:
+            accountlist = accounts.load_accounts(options.accounts)
+        except (IOError, ValueError) as error:
+            raise ArgumentError(str(error))
+        self.metrics = None
+        client = accounts.MultiAccountClient(
+            accountlist, options.apiendpoint, options.apiversion,
+            options.concurrency,
+            build=lambda account, pool: self.build_action_handler(
+                options, account, pool))
+        try:
+            for (name, rows, error) in client.run(
+                lambda apih: list(self.call(func, options, apih))):
+                if error is not None:
+                    self.stderr.write(name + ': ' + str(error) + '\n')
+                    continue
+                for row in rows:
+                    if isinstance(row, dict):
+                        row = dict(row)
+                        row['account'] = name
+                    else:
+                        row = [name] + row
+                    yield row
+        finally:
+            client.close()
 
-class ArgumentError(Exception):
+    def run_batch(self, options):
+        """
+        Run the actions of the batch file concurrently through one shared
+        ActionHandler, yielding a record for every action.
+        """
+        import batch
+        if options.batch == '-':
+            batchfile = self.stdin
+        else:
+            batchfile = open(options.batch)
+        apih = self.build_action_handler(options)
+        runner = batch.BatchRunner(
+            lambda args: self.call_batch_action(args, options, apih),
+            options.concurrency, options.batchorder == 'input')
+        try:
+            for (number, args, rows, error) in runner.run(batchfile):
+                record = {'line': number, 'args': args}
+                if error is None:
+                    record['rows'] = rows
+                else:
+                    record['error'] = (str(error) or
+                                       error.__class__.__name__).decode(
+                                           'utf-8', 'replace')
+                yield record
+        finally:
+            if batchfile is not self.stdin:
+                batchfile.close()
+
+    def call_batch_action(self, args, options, apih):
+        """
+        Call an action of a batch with its arguments added to the options of
+        the batch. Returns the list of result rows.
+        """
+        if not self.parser.has_option(args[0]):
+            raise ArgumentError('Unknown action: ' + args[0])
+        try:
+            with self.parselock:
+                (actionoptions, rest) = self.parser.parse_args(
+                    args, copy.copy(options))
+        except SystemExit:
+            raise ArgumentError('Invalid arguments: ' + ' '.join(args))
+        actionoptions.batch = None
+        func = self.validate(actionoptions)
+        if func is None:
+            raise ArgumentError('Unknown action: ' + args[0])
+        return list(self.call(func, actionoptions, apih))
+
+    def report_stats(self, stream=sys.stderr):
+        """
+        Print the timing breakdown of the requests, if --stats was given.
+        """
+        if self.metrics is not None:
+            import metrics
+            stream.write(metrics.format_breakdown(self.metrics))
+
+
+class ProgressReporter:
     """
-    This exception indicates, that an error has occured parsing command line
-    arguments.
+    This class prints the progress of long running actions on the standard
+    error, at most once per interval.
     """
 
-    def __init__(self, message):
+    def __init__(self, interval=1, stream=sys.stderr):
         """
-        Initializes the class with an error message.
+        Initializes the reporter with the reporting interval in seconds.
         """
-        self.message = message
+        self.interval = interval
+        self.stream = stream
+        self.lastreport = 0
+        self.progress = None
 
-    def __str__(self):
+    def report(self, progress):
         """
-        Returns the error message passed to the Exception in __init__()
+        Prints the progress, if the interval has passed since the last report.
         """
-        return self.message
+        self.progress = progress
+        now = time.time()
+        if now - self.lastreport >= self.interval:
+            self.lastreport = now
+            self.stream.write(str(progress) + '\n')
 
-
-###############################################################################
-# Unit testing code                                                           #
-###############################################################################
+    def finish(self):
+        """
+        Prints the final progress.
+        """
+        if self.progress is not None:
+            self.stream.write(str(self.progress) + '\n')
 
 
-class ArgumentParserTest(unittest.TestCase):
+class ArgumentError(Exception):
     """
-    This class tests the DotRoll.ArgumentParser class.
+    This exception indicates, that an error has occured parsing command line
+    arguments.
     """
 
-    def test_zero_arguments(self):
+    def __init__(self, message):
         """
-        Tests, if the parse run fails, if there are no arguments.
+        Initializes the class with an error message.
         """
-        parser = ArgumentParser()
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli'])
+        self.message = message
 
-    def test_incompatible_actions(self):
+    def __str__(self):
         """
-        Tests, if the command line interface correctly fails, if the user tries
-        to submit a contact and domain registration at the same time, etc.
+        Returns the error message passed to the Exception in __init__()
         """
-        parser = ArgumentParser()
-        try:
-            parser.parse(['dotrollcli', '--getdomainlist'])
-        except ArgumentError:
-            self.fail('Calling a single action raises an ArgumentError')
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli',
-                                                        '--getdomainprices',
-                                                        '--gethostingprices'])
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli',
-                                                        '--getdomainprices',
-                                                        '--getvpsprices'])
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli',
-                                                        '--gethostingprices',
-                                                        '--getvpsprices'])
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli',
-                                                        '--gethostingprices',
-                                                        '--getdomainavailability'])
-        self.assertRaises(ArgumentError, parser.parse, ['dotrollcli',
-                                                        '--getvpsprices',
-                                                        '--getdomainlist'])
-
-
-if __name__ == '__main__':
-    unittest.main()
+        return self.message
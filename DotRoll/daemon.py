@@ -0,0 +1,233 @@
+#!/usr/bin/python
+
+import socket, SocketServer, threading, json, os, sys, signal, optparse
+import StringIO
+import api, cli
+
+# Calls agreeing in these options share the warm handlers of the daemon.
+HANDLER_OPTIONS = ['apiendpoint', 'apiversion', 'apikey', 'username',
+                   'password', 'cachedir', 'ratelimit', 'ratelimitfile',
+                   'concurrency', 'validatenames', 'availabilityttl',
+                   'negativettl']
+
+def to_str(value):
+    """
+    Convert the unicode strings decoded from JSON to UTF-8 encoded strings,
+    recursively.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [to_str(item) for item in value]
+    if isinstance(value, dict):
+        return dict((to_str(key), to_str(item))
+                    for (key, item) in value.items())
+    return value
+
+
+class DaemonRequestHandler(SocketServer.StreamRequestHandler):
+    """
+    This request handler reads calls as JSON objects, one per line, and
+    answers each with JSON lines: {"row": [...]} for every result row,
+    {"progress": "..."} for progress reports and finally {"done": true} or
+    {"error": "...", "type": "..."}.
+    """
+    def setup(self):
+        """
+        Set up the lock serializing the messages sent to the client.
+        """
+        SocketServer.StreamRequestHandler.setup(self)
+        self.lock = threading.Lock()
+
+    def handle(self):
+        """
+        Answer the calls sent over the connection.
+        """
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            self.answer(json.loads(line))
+
+    def answer(self, request):
+        """
+        Perform a call and send the results to the client.
+        """
+        try:
+            for row in self.server.call(request, self):
+                self.send({'row': row})
+            self.send({'done': True})
+        except Exception as error:
+            description = str(error) or error.__class__.__name__
+            self.send({'error': description.decode('utf-8', 'replace'),
+                       'type': error.__class__.__name__})
+
+    def send(self, message):
+        """
+        Send a message to the client.
+        """
+        with self.lock:
+            self.wfile.write(json.dumps(message) + '\n')
+            self.wfile.flush()
+
+    def write(self, text):
+        """
+        Forward progress reports written to the standard error of the call.
+        """
+        self.send({'progress': text})
+
+
+class DaemonServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    This server answers command line calls forwarded by DaemonClient over a
+    Unix socket accessible only to its owner. The handlers built for the
+    calls are kept, so that their connection pools and caches stay warm for
+    the following calls.
+    """
+    daemon_threads = True
+
+    def __init__(self, path):
+        """
+        Bind the server to the socket at path, replacing a stale socket left
+        behind by a daemon, which is no longer running.
+        """
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error:
+                os.unlink(path)
+            else:
+                raise socket.error('A daemon is already listening on ' +
+                                   path)
+            finally:
+                probe.close()
+        oldmask = os.umask(0077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path,
+                                                   DaemonRequestHandler)
+        finally:
+            os.umask(oldmask)
+        self.path = path
+        self.handlers = {}
+        self.lock = threading.Lock()
+
+    def action_handler(self, parser, options):
+        """
+        Return the warm ActionHandler for the options, building it on first
+        use.
+        """
+        key = tuple(getattr(options, name) for name in HANDLER_OPTIONS)
+        if options.validatenames:
+            # The TLDs of validated names come from the price list in the
+            # currency of the call.
+            key += (options.currency,)
+        with self.lock:
+            apih = self.handlers.get(key)
+            if apih is None:
+                apih = self.handlers[key] = parser.build_action_handler(
+                    options)
+        return apih
+
+    def call(self, request, stderr):
+        """
+        Perform a call and return its result rows. Input lines sent with the
+        call are read as the standard input.
+        """
+        options = optparse.Values(to_str(request['options']))
+        options.stats = False
+        parser = cli.ArgumentParser()
+        parser.stdin = StringIO.StringIO(''.join(to_str(request.get('input',
+                                                                    []))))
+        parser.stderr = stderr
+        return parser.call(request['func'], options,
+                           self.action_handler(parser, options))
+
+    def stop(self):
+        """
+        Stop serving and remove the socket.
+        """
+        self.shutdown()
+        self.server_close()
+        os.unlink(self.path)
+
+
+class DaemonClient:
+    """
+    This class forwards command line calls to a DaemonServer.
+    """
+    def __init__(self, path):
+        """
+        Initialize the client with the path of the daemon socket.
+        """
+        self.path = path
+
+    def call(self, func, options, stdin=sys.stdin, stderr=sys.stderr):
+        """
+        Forward a call and yield its result rows. The domain file of a bulk
+        check is read here, as the daemon may not see the same files.
+        """
+        options = vars(options).copy()
+        for name in ['cachedir', 'ratelimitfile', 'snapshot']:
+            if options.get(name):
+                options[name] = os.path.abspath(options[name])
+        request = {'func': func, 'options': options}
+        if func == 'getbulkdomainavailability':
+            if options['domainfile'] == '-':
+                request['input'] = stdin.readlines()
+            else:
+                with open(options['domainfile']) as domainfile:
+                    request['input'] = domainfile.readlines()
+            options['domainfile'] = '-'
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                conn.connect(self.path)
+                conn.sendall(json.dumps(request) + '\n')
+            except socket.error as error:
+                raise api.ConnectionFailed('Cannot reach the daemon at ' +
+                                           self.path + ': ' + str(error))
+            reader = conn.makefile('rb')
+            while True:
+                line = reader.readline()
+                if not line:
+                    raise api.ConnectionFailed('The daemon closed the'
+                                               ' connection')
+                message = to_str(json.loads(line))
+                if 'row' in message:
+                    yield message['row']
+                elif 'progress' in message:
+                    stderr.write(message['progress'])
+                elif 'error' in message:
+                    raise self.error(message)
+                else:
+                    return
+        finally:
+            conn.close()
+
+    def error(self, message):
+        """
+        Return the exception to raise for an error reported by the daemon.
+        """
+        if message['type'] == 'ArgumentError':
+            return cli.ArgumentError(message['error'])
+        errorclass = getattr(api, message['type'], None)
+        if (not isinstance(errorclass, type) or
+            not issubclass(errorclass, api.QueryFailed)):
+            errorclass = api.QueryFailed
+        return errorclass(message['error'])
+
+
+def serve(path):
+    """
+    Run a daemon listening on path until it is interrupted or terminated.
+    """
+    server = DaemonServer(path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
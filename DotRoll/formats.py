@@ -0,0 +1,209 @@
+#!/usr/bin/python
+
+import json, csv, collections
+
+FORMATS = ['table', 'json', 'jsonl', 'csv', 'tsv']
+
+def text(value):
+    """
+    Return a value as a UTF-8 encoded string, None as an empty string.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def price_rows(pricelist):
+    """
+    Return the rows of a price list sorted by product and period.
+    """
+    rows = []
+    for name in sorted(pricelist['prices']):
+        periods = pricelist['prices'][name]
+        for period in sorted(periods):
+            rows.append([name, period, periods[period]['gross'],
+                         periods[period]['net']])
+    return rows
+
+
+class RowWriter:
+    """
+    This class is the base of the writers printing result rows to a stream
+    as they are produced. Rows are lists of values in column order, or
+    dictionaries keyed by column name. If no column names are given, they
+    are the sorted keys of the first dictionary row.
+    """
+    def __init__(self, stream, columns=None):
+        """
+        Initialize the writer with the output stream and the column names.
+        """
+        self.stream = stream
+        self.columns = columns
+        self.rows = 0
+
+    def write_all(self, rows):
+        """
+        Write all rows of an iterable, then finish the output.
+        """
+        for row in rows:
+            self.write(row)
+        self.finish()
+
+    def write(self, row):
+        """
+        Write a row.
+        """
+        if self.columns is None and isinstance(row, dict):
+            self.columns = sorted(row)
+        if isinstance(row, dict):
+            row = [row.get(column) for column in self.columns]
+        if self.rows == 0:
+            self.start(row)
+        self.rows += 1
+        self.write_values(row)
+
+    def start(self, row):
+        """
+        Write what comes before the first row.
+        """
+
+    def write_values(self, values):
+        """
+        Write the values of a row.
+        """
+        raise NotImplementedError('Use a subclass of RowWriter')
+
+    def finish(self):
+        """
+        Write what comes after the last row.
+        """
+
+    def record(self, values):
+        """
+        Return the values of a row as a dictionary keyed by column name in
+        column order. Values without a column name are keyed by position.
+        """
+        columns = self.columns or []
+        return collections.OrderedDict(
+            (columns[i] if i < len(columns) else str(i), value)
+            for (i, value) in enumerate(values))
+
+
+class TableWriter(RowWriter):
+    """
+    This writer prints rows as fixed width columns of equal width.
+    """
+    width = 79
+
+    def start(self, row):
+        """
+        Set the column width from the number of fields in the first row.
+        """
+        self.fieldwidth = int(round(self.width / len(row))) if row else 0
+
+    def write_values(self, values):
+        """
+        Write the values as a line of padded fields.
+        """
+        if len(values) == 1:
+            self.stream.write(text(values[0]) + '\n')
+            return
+        self.stream.write(' '.join(text(value).ljust(self.fieldwidth)
+                                   for value in values) + '\n')
+
+
+class JSONWriter(RowWriter):
+    """
+    This writer prints a JSON array of row objects, one object per line.
+    """
+    def write_values(self, values):
+        """
+        Write the values as an object of the array.
+        """
+        if self.rows == 1:
+            self.stream.write('[\n')
+        else:
+            self.stream.write(',\n')
+        self.stream.write(json.dumps(self.record(values)))
+
+    def finish(self):
+        """
+        Close the array.
+        """
+        if self.rows:
+            self.stream.write('\n]\n')
+        else:
+            self.stream.write('[]\n')
+
+
+class JSONLinesWriter(RowWriter):
+    """
+    This writer prints a JSON object per row and line.
+    """
+    def write_values(self, values):
+        """
+        Write the values as a line holding an object.
+        """
+        self.stream.write(json.dumps(self.record(values)) + '\n')
+
+
+class DelimitedWriter(RowWriter):
+    """
+    This writer prints rows as CSV, or any other delimited text, preceded by
+    a header line with the column names if known.
+    """
+    def __init__(self, stream, columns=None, delimiter=','):
+        """
+        Initialize the writer with the output stream, the column names and
+        the field delimiter.
+        """
+        RowWriter.__init__(self, stream, columns)
+        self.writer = csv.writer(stream, delimiter=delimiter,
+                                 lineterminator='\n')
+
+    def start(self, row):
+        """
+        Write the header line.
+        """
+        if self.columns:
+            self.writer.writerow([text(column) for column in self.columns])
+
+    def finish(self):
+        """
+        Write the header line, if there were no rows.
+        """
+        if self.rows == 0:
+            self.start(None)
+
+    def write_values(self, values):
+        """
+        Write the values as a delimited line.
+        """
+        self.writer.writerow([self.field(value) for value in values])
+
+    def field(self, value):
+        """
+        Return a value as a field, with nested values encoded as JSON.
+        """
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return text(value)
+
+
+def create_writer(format, stream, columns=None):
+    """
+    Create the writer for an output format.
+    """
+    if format == 'table':
+        return TableWriter(stream, columns)
+    if format == 'json':
+        return JSONWriter(stream, columns)
+    if format == 'jsonl':
+        return JSONLinesWriter(stream, columns)
+    if format == 'csv':
+        return DelimitedWriter(stream, columns)
+    if format == 'tsv':
+        return DelimitedWriter(stream, columns, '\t')
+    raise ValueError('Unknown output format: ' + str(format))
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+
+import json, zlib
+
+class JSONStreamReader:
+    """
+    This class decodes JSON values from a file-like object incrementally,
+    reading only as much data as needed to decode the next value.
+    """
+    def __init__(self, fileobj, chunksize=65536):
+        """
+        Initialize the reader with the file to read from.
+        """
+        self.fileobj = fileobj
+        self.chunksize = chunksize
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """
+        Read the next chunk of data into the buffer, dropping the data
+        already consumed. Returns False at the end of the file.
+        """
+        data = self.fileobj.read(self.chunksize)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character without consuming it.
+        Returns an empty string at the end of the file.
+        """
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in ' \t\r\n'):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consume the next character, which must be one of chars, and return it.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expected one of "' + chars + '" at "' +
+                             self.buffer[self.pos:self.pos + 20] + '"')
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode and return the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            if (end == len(self.buffer) and
+                not isinstance(value, (dict, list, basestring)) and
+                self.fill()):
+                # A number or literal may continue in the next chunk.
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(fileobj, key, chunksize=65536):
+    """
+    Yield the elements of the array stored under key in the JSON object read
+    from fileobj one at a time, without reading the whole object into memory.
+    Yields nothing, if the object has no such key.
+    """
+    reader = JSONStreamReader(fileobj, chunksize)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name != key:
+            reader.value()
+        else:
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        if reader.expect(',}') == '}':
+            return
+
+
+class GzipStreamReader:
+    """
+    This class decompresses a gzip compressed file-like object while it is
+    being read.
+    """
+    def __init__(self, fileobj):
+        """
+        Initialize the reader with the compressed file.
+        """
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def read(self, size):
+        """
+        Return up to size bytes of decompressed data. Returns an empty string
+        at the end of the file.
+        """
+        while True:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                data = self.fileobj.read(size)
+                if not data:
+                    return self.decompressor.flush()
+            data = self.decompressor.decompress(data, size)
+            if data:
+                return data
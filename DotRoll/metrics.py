@@ -0,0 +1,256 @@
+#!/usr/bin/python
+
+import threading, json, bisect
+import api
+
+# Upper bounds in seconds of the histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+
+PHASES = ['connect', 'tls', 'ttfb', 'read', 'decompress', 'decode']
+
+class Histogram:
+    """
+    This class counts observed values in cumulative buckets, the way
+    Prometheus histograms do.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty histogram with the bucket upper bounds.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        Count a value.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """
+        Return the list of (upper bound, count) pairs of the buckets,
+        counting the values up to the bound, ending with '+Inf'.
+        """
+        result = []
+        total = 0
+        for (bound, count) in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append(('+Inf', self.count))
+        return result
+
+
+class MetricsRegistry:
+    """
+    This class keeps counters and histograms in process, identified by a
+    metric name and a dictionary of labels, and exports them in the
+    Prometheus text format or as JSON.
+    """
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def describe(self, name, text):
+        """
+        Set the help text of a metric.
+        """
+        self.help[name] = text
+
+    def key(self, name, labels):
+        """
+        Return the dictionary key of a metric with labels.
+        """
+        return (name, tuple(sorted((labels or {}).items())))
+
+    def increment(self, name, labels=None, value=1):
+        """
+        Add value to a counter.
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """
+        Count a value in a histogram.
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter(self, name, labels=None):
+        """
+        Return the value of a counter.
+        """
+        with self.lock:
+            return self.counters.get(self.key(name, labels), 0)
+
+    def histogram(self, name, labels=None):
+        """
+        Return a histogram, or None if nothing has been observed.
+        """
+        with self.lock:
+            return self.histograms.get(self.key(name, labels))
+
+    def format_labels(self, labels, extra=()):
+        """
+        Format a list of (name, value) label pairs for the Prometheus text
+        format.
+        """
+        labels = list(labels) + list(extra)
+        if not labels:
+            return ''
+        return '{' + ','.join('%s="%s"' % (name, str(value)
+                                             .replace('\\', '\\\\')
+                                             .replace('"', '\\"'))
+                              for (name, value) in labels) + '}'
+
+    def prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for (kind, metrics) in [('counter', self.counters),
+                                    ('histogram', self.histograms)]:
+                lastname = None
+                for ((name, labels), value) in sorted(metrics.items()):
+                    if name != lastname:
+                        if name in self.help:
+                            lines.append('# HELP %s %s' %
+                                         (name, self.help[name]))
+                        lines.append('# TYPE %s %s' % (name, kind))
+                        lastname = name
+                    if kind == 'counter':
+                        lines.append('%s%s %s' %
+                                     (name, self.format_labels(labels),
+                                      repr(value)))
+                        continue
+                    for (bound, count) in value.cumulative():
+                        lines.append('%s_bucket%s %d' %
+                                     (name,
+                                      self.format_labels(labels,
+                                                         [('le', bound)]),
+                                      count))
+                    lines.append('%s_sum%s %r' %
+                                 (name, self.format_labels(labels),
+                                  value.sum))
+                    lines.append('%s_count%s %d' %
+                                 (name, self.format_labels(labels),
+                                  value.count))
+        return '\n'.join(lines) + '\n'
+
+    def as_dict(self):
+        """
+        Return the metrics as a dictionary of lists of samples.
+        """
+        result = {}
+        with self.lock:
+            for ((name, labels), value) in sorted(self.counters.items()):
+                result.setdefault(name, []).append({'labels': dict(labels),
+                                                    'value': value})
+            for ((name, labels), value) in sorted(self.histograms.items()):
+                result.setdefault(name, []).append({
+                    'labels': dict(labels),
+                    'count': value.count,
+                    'sum': value.sum,
+                    'max': value.max,
+                    'buckets': [[str(bound), count] for (bound, count)
+                                in value.cumulative()]})
+        return result
+
+    def json(self):
+        """
+        Return the metrics as a JSON string.
+        """
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+
+class MetricsHook(api.RequestHook):
+    """
+    This request hook records the number, status, size and phase timings of
+    requests in a MetricsRegistry.
+    """
+    def __init__(self, registry):
+        """
+        Initialize the hook with the registry to record into.
+        """
+        self.registry = registry
+        registry.describe('dotroll_requests_total',
+                          'Number of HTTP requests by method and status.')
+        registry.describe('dotroll_sent_bytes_total',
+                          'Request body bytes sent.')
+        registry.describe('dotroll_received_bytes_total',
+                          'Response body bytes received.')
+        registry.describe('dotroll_request_seconds',
+                          'Total duration of HTTP requests.')
+        registry.describe('dotroll_request_phase_seconds',
+                          'Duration of the phases of HTTP requests.')
+
+    def after_request(self, request):
+        """
+        Record a completed request.
+        """
+        status = request.status
+        if status is None:
+            status = 'error'
+        self.registry.increment('dotroll_requests_total',
+                                {'method': request.method,
+                                 'status': status})
+        self.registry.increment('dotroll_sent_bytes_total',
+                                value=request.sent)
+        self.registry.increment('dotroll_received_bytes_total',
+                                value=request.received)
+        self.registry.observe('dotroll_request_seconds', request.duration)
+        for (phase, seconds) in request.timings.items():
+            self.registry.observe('dotroll_request_phase_seconds', seconds,
+                                  {'phase': phase})
+
+
+def format_breakdown(registry):
+    """
+    Return a human readable breakdown of the request timings recorded by a
+    MetricsHook.
+    """
+    lines = ['%-12s %8s %10s %10s %10s' % ('phase', 'count', 'total s',
+                                            'mean ms', 'max ms')]
+    rows = [(phase, registry.histogram('dotroll_request_phase_seconds',
+                                       {'phase': phase}))
+            for phase in PHASES]
+    rows.append(('total', registry.histogram('dotroll_request_seconds')))
+    for (phase, histogram) in rows:
+        if histogram is None:
+            continue
+        lines.append('%-12s %8d %10.3f %10.1f %10.1f' %
+                     (phase, histogram.count, histogram.sum,
+                      1000 * histogram.sum / histogram.count,
+                      1000 * histogram.max))
+    statuses = []
+    with registry.lock:
+        for ((name, labels), value) in sorted(registry.counters.items()):
+            if name == 'dotroll_requests_total':
+                labels = dict(labels)
+                statuses.append('%s %s: %d' % (labels['method'],
+                                               labels['status'], value))
+    lines.append('requests: ' + (', '.join(statuses) or 'none'))
+    lines.append('bytes sent: %d, received: %d' %
+                 (registry.counter('dotroll_sent_bytes_total'),
+                  registry.counter('dotroll_received_bytes_total')))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+import threading, Queue
+
+class PageIterator:
+    """
+    This class iterates over the elements produced by a source in pages of
+    pagesize elements. A background thread fetches up to prefetch pages ahead
+    while the caller processes the current one.
+    The offset attribute counts the elements handed out so far. If fetching
+    fails, the error is raised from next() and calling next() again resumes
+    from the offset by restarting the source and skipping the elements
+    already handed out. A new PageIterator created with a saved offset
+    resumes the same way.
+    The background thread keeps running until the last page has been fetched
+    or close() is called, so callers, which may stop iterating early, should
+    use the iterator in a with statement.
+    """
+    def __init__(self, source, pagesize=100, offset=0, prefetch=2):
+        """
+        Initialize the iterator. source is a function returning a new
+        iterator over all elements each time it is called.
+        """
+        self.source = source
+        self.pagesize = pagesize
+        self.offset = offset
+        self.prefetch = prefetch
+        self.queue = None
+        self.stopped = None
+        self.thread = None
+        self.finished = False
+
+    def __iter__(self):
+        """
+        Return the iterator itself.
+        """
+        return self
+
+    def __enter__(self):
+        """
+        Return the iterator itself.
+        """
+        return self
+
+    def __exit__(self, exctype, value, traceback):
+        """
+        Stop fetching pages when leaving the with statement.
+        """
+        self.close()
+
+    def next(self):
+        """
+        Return the next page as a list of elements.
+        """
+        if self.finished:
+            raise StopIteration
+        if self.queue is None:
+            self.start()
+        item = self.queue.get()
+        if item is None:
+            self.finished = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.queue = None
+            raise item
+        self.offset += len(item)
+        return item
+
+    def start(self):
+        """
+        Start fetching pages from the current offset in a background thread.
+        """
+        self.queue = Queue.Queue(self.prefetch)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.produce,
+                                       args=(self.offset, self.queue,
+                                             self.stopped))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def produce(self, skip, queue, stopped):
+        """
+        Put pages on the queue, followed by None at the end or by the
+        exception that occured. The source iterator is closed on return, so
+        that it can release its resources, e.g. a streaming connection.
+        """
+        elements = self.source()
+        try:
+            page = []
+            for element in elements:
+                if stopped.is_set():
+                    return
+                if skip:
+                    skip -= 1
+                    continue
+                page.append(element)
+                if len(page) == self.pagesize:
+                    if not self.put(queue, stopped, page):
+                        return
+                    page = []
+            if page and not self.put(queue, stopped, page):
+                return
+            self.put(queue, stopped, None)
+        except Exception as error:
+            self.put(queue, stopped, error)
+        finally:
+            if hasattr(elements, 'close'):
+                elements.close()
+
+    def put(self, queue, stopped, item):
+        """
+        Put an item on the queue, unless the iterator has been closed.
+        Returns False, if it has.
+        """
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def close(self):
+        """
+        Stop fetching pages in the background.
+        """
+        if self.stopped is not None:
+            self.stopped.set()
+        self.queue = None
+        self.finished = True
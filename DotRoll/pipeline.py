@@ -0,0 +1,163 @@
+#!/usr/bin/python
+
+import threading, Queue, multiprocessing, json
+import formats
+
+def availability_rows(result):
+    """
+    Return the row of a domain availability result.
+    """
+    return [[result['result']]]
+
+
+def domain_rows(domainlist):
+    """
+    Return the rows of the domain records of a domain list, with the values
+    in the order of the sorted keys of the first record, the columns the
+    writers choose for them.
+    """
+    domains = domainlist['domains']
+    if not domains:
+        return []
+    columns = sorted(domains[0])
+    return [[record.get(column) for column in columns]
+            for record in domains]
+
+
+# The functions turning a parsed response into result rows, by the kind of
+# the query.
+DECODERS = {'prices': formats.price_rows,
+            'availability': availability_rows,
+            'domains': domain_rows}
+
+def decode(kind, body):
+    """
+    Parse the body of a response as a JSON string and return its rows. This
+    function runs in the worker processes.
+    """
+    return DECODERS[kind](json.loads(body))
+
+
+class Pipeline:
+    """
+    This class downloads many responses through worker threads and parses
+    them in a pool of worker processes, so that parsing large responses does
+    not hold the interpreter lock of the threads doing the I/O. The threads
+    hand the raw response bodies to the process pool. At most queuesize
+    queries are in the pipeline, downloaded or parsed but not yet consumed,
+    and results are yielded in input order.
+    """
+    def __init__(self, queryhandler, concurrency=4, processes=None,
+                 queuesize=None):
+        """
+        Initialize the pipeline with a HTTPQueryHandler. processes is the
+        number of worker processes, by default the number of CPUs, and
+        queuesize defaults to twice the number of threads and processes.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if queuesize is None:
+            queuesize = 2 * (concurrency + processes)
+        self.queryhandler = queryhandler
+        self.concurrency = concurrency
+        self.queuesize = queuesize
+        self.pool = multiprocessing.Pool(processes)
+
+    def run(self, queries):
+        """
+        Run an iterable of (url, kind) tuples, where kind is a key of
+        DECODERS. Yields a tuple (url, rows, error) for every query in input
+        order, where error is the exception raised or None. An exception
+        raised by the iterable is raised after the results of the queries
+        before it.
+        """
+        jobs = Queue.Queue()
+        results = Queue.Queue()
+        slots = threading.Semaphore(self.queuesize)
+        stopped = threading.Event()
+        failure = []
+        threads = [threading.Thread(target=self.feed,
+                                    args=(queries, jobs, slots, stopped,
+                                          failure))]
+        for i in range(self.concurrency):
+            threads.append(threading.Thread(target=self.work,
+                                            args=(jobs, results, stopped)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = self.concurrency
+        pending = {}
+        position = 0
+        try:
+            while running or pending:
+                if position not in pending:
+                    item = results.get()
+                    if item is None:
+                        running -= 1
+                    else:
+                        pending[item[0]] = item[1:]
+                    continue
+                (url, parsed, error) = pending.pop(position)
+                position += 1
+                rows = None
+                if error is None:
+                    try:
+                        rows = parsed.get()
+                    except Exception as parseerror:
+                        error = parseerror
+                slots.release()
+                yield (url, rows, error)
+            if failure:
+                raise failure[0]
+        finally:
+            stopped.set()
+            slots.release()
+
+    def feed(self, queries, jobs, slots, stopped, failure):
+        """
+        Number the queries and put them on the work queue, waiting for a free
+        slot before each, followed by one end marker per worker. Taking the
+        slots in input order ensures, that the next result to yield always
+        has one. An exception raised by the queries is added to the failure
+        list.
+        """
+        try:
+            for (position, (url, kind)) in enumerate(queries):
+                slots.acquire()
+                if stopped.is_set():
+                    slots.release()
+                    break
+                jobs.put((position, url, kind))
+        except Exception as error:
+            failure.append(error)
+        finally:
+            for i in range(self.concurrency):
+                jobs.put(None)
+
+    def work(self, jobs, results, stopped):
+        """
+        Download the responses of queries from the work queue and hand them
+        to the process pool until the end marker arrives.
+        """
+        while True:
+            job = jobs.get()
+            if job is None:
+                results.put(None)
+                return
+            (position, url, kind) = job
+            if stopped.is_set():
+                continue
+            try:
+                body = self.queryhandler.get_raw(url)
+                results.put((position, url,
+                             self.pool.apply_async(decode, (kind, body)),
+                             None))
+            except Exception as error:
+                results.put((position, url, None, error))
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+import asyncapi
+
+class PipeliningQueryHandler(asyncapi.AsyncQueryHandler):
+    """
+    This is a non-blocking HTTP query handler, which sends queries over up to
+    maxconnections keep-alive connections using HTTP/1.1 pipelining: up to
+    depth requests are sent over a connection back to back, and the
+    responses, which arrive in the same order, are matched to them in turn.
+    This saves a round trip time per query over one query at a time.
+    GET queries left without a response, because the server has closed the
+    connection or it has been inactive for timeout seconds, are sent again
+    up to retries times, so a GET query may wait up to (retries + 1) *
+    timeout seconds. Other queries are not pipelined, as the server may
+    have processed them before a connection broke: each is sent over a
+    connection of its own and fails with the connection error.
+    """
+    def __init__(self, endpoint, apiversion, apikey, username, password,
+                 maxconnections=2, depth=10, retries=3, timeout=30,
+                 sslcontext=None):
+        """
+        Initialize the query handler with authentication information, the
+        connection and pipelining limits and the inactivity timeout.
+        """
+        asyncapi.AsyncQueryHandler.__init__(self, endpoint, apiversion,
+                                            apikey, username, password,
+                                            maxconnections * depth, timeout,
+                                            sslcontext)
+        self.maxconnections = maxconnections
+        self.depth = depth
+        self.retries = retries
+        self.connections = []
+
+    def start(self, result, method, url, body):
+        """
+        Send a GET query over the least busy connection, opening a new one if
+        all are busy and the limit allows. Other queries are sent over a new
+        connection closed after the response.
+        """
+        if method != 'GET':
+            asyncapi.AsyncQueryHandler.start(self, result, method, url, body)
+            return
+        result.request = (method, url, body)
+        if not hasattr(result, 'attempts'):
+            result.attempts = 0
+        conn = None
+        if self.connections:
+            conn = min(self.connections,
+                       key=lambda conn: len(conn.outstanding))
+        if conn is None or (conn.outstanding and
+                            len(self.connections) < self.maxconnections):
+            conn = asyncapi.AsyncConnection(self, self.scheme, self.host,
+                                            self.resolve(self.scheme,
+                                                         self.host))
+            self.connections.append(conn)
+        conn.send_request(result, self.format_request(method, self.host,
+                                                      self.build_path(url),
+                                                      body, 'keep-alive'))
+
+    def retry(self, result, error):
+        """
+        Queue a GET query left without a response again, or fail it with a
+        given error.
+        """
+        (method, url, body) = result.request
+        if method != 'GET' or result.attempts >= self.retries:
+            self.finish(result, error=error)
+            return
+        result.attempts += 1
+        self.inflight -= 1
+        self.queue.append((result, method, url, body))
+        self.dispatch()
+
+    def connection_idle(self, conn):
+        """
+        Keep pipelined connections without outstanding requests open for
+        reuse.
+        """
+        if conn not in self.connections:
+            conn.close()
+
+    def connection_closed(self, conn):
+        """
+        Forget a closed connection.
+        """
+        if conn in self.connections:
+            self.connections.remove(conn)
+        asyncapi.AsyncQueryHandler.connection_closed(self, conn)
+
+    def close(self):
+        """
+        Close all connections.
+        """
+        for conn in list(self.connections):
+            conn.close()
+        asyncapi.AsyncQueryHandler.close(self)
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+
+import threading, multiprocessing, fcntl, fnmatch, time
+import api
+
+# Rules are (URL pattern, endpoint class), the first matching pattern wins.
+ENDPOINT_CLASSES = [('domain/search/*', 'search'),
+                    ('*/prices/*', 'price'),
+                    ('domain/list', 'list')]
+
+def parse_rates(spec):
+    """
+    Parse a rate limit given as a number of queries per second, or as comma
+    separated endpoint class=rate pairs, e.g. "search=5,price=1,default=10".
+    Returns a dictionary mapping endpoint classes to rates, where a single
+    number is the rate of the 'default' class. Raises ValueError, if the
+    specification is invalid.
+    """
+    classes = set(name for (pattern, name) in ENDPOINT_CLASSES)
+    classes.add('default')
+    rates = {}
+    for item in str(spec).split(','):
+        (name, sep, rate) = item.rpartition('=')
+        name = name.strip() or 'default'
+        if name not in classes:
+            raise ValueError('Unknown endpoint class in rate limit: ' + name)
+        if name in rates:
+            raise ValueError('Duplicate rate limit for ' + name)
+        try:
+            rates[name] = float(rate)
+        except ValueError:
+            raise ValueError('Invalid rate limit: ' + item.strip())
+        if rates[name] <= 0:
+            raise ValueError('Rate limits must be positive: ' + item.strip())
+    return rates
+
+
+def create_buckets(rates, path=None, shared=False):
+    """
+    Create a token bucket for every endpoint class of a dictionary returned
+    by parse_rates. If a path is given, the buckets keep their state in a
+    slot per class of this file, otherwise if shared is set, in shared
+    memory.
+    """
+    buckets = {}
+    for (name, rate) in rates.items():
+        if path is not None:
+            buckets[name] = FileTokenBucket(path, rate, slot=name)
+        elif shared:
+            buckets[name] = SharedTokenBucket(rate)
+        else:
+            buckets[name] = TokenBucket(rate)
+    return buckets
+
+
+class TokenBucket:
+    """
+    This class is a thread-safe token bucket refilled with rate tokens per
+    second up to capacity tokens. Callers taking more tokens than available
+    reserve them and wait until they have been refilled, so waiting callers
+    are served in order.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize a full bucket. capacity defaults to one second worth of
+        tokens.
+        """
+        self.rate = float(rate)
+        if capacity is None:
+            capacity = max(1, rate)
+        self.capacity = capacity
+        self.clock = time.time
+        self.sleep = time.sleep
+        self.lock = threading.Lock()
+        self.tokens = capacity
+        self.updated = self.clock()
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, waiting until they are available.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.sleep(wait)
+
+    def reserve(self, tokens):
+        """
+        Take tokens from the bucket and return the number of seconds to wait
+        until they are available.
+        """
+        with self.lock:
+            (self.tokens, self.updated, wait) = self.take(self.tokens,
+                                                          self.updated,
+                                                          tokens)
+        return wait
+
+    def take(self, available, updated, tokens):
+        """
+        Refill a bucket state and take tokens from it. Returns the new
+        (available, updated) state and the number of seconds to wait.
+        """
+        now = self.clock()
+        available = min(self.capacity,
+                        available + max(0, now - updated) * self.rate)
+        available -= tokens
+        wait = 0
+        if available < 0:
+            wait = -available / self.rate
+        return (available, now, wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    This token bucket keeps its state in shared memory, so that it can be
+    shared with worker processes created by the multiprocessing module after
+    the bucket.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize a full bucket in shared memory.
+        """
+        TokenBucket.__init__(self, rate, capacity)
+        self.lock = multiprocessing.Lock()
+        self.state = multiprocessing.RawArray('d', [self.capacity,
+                                                    self.updated])
+
+    def reserve(self, tokens):
+        """
+        Take tokens from the shared bucket and return the number of seconds
+        to wait until they are available.
+        """
+        with self.lock:
+            (self.state[0], self.state[1], wait) = self.take(self.state[0],
+                                                             self.state[1],
+                                                             tokens)
+        return wait
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    This token bucket keeps its state in a local file, so that it can be
+    shared by unrelated processes using the same path. The file holds a line
+    per named slot, so that several buckets can share it, and it is locked
+    while the state is updated.
+    """
+    def __init__(self, path, rate, capacity=None, slot='default'):
+        """
+        Initialize the bucket stored in a slot of the file at path. A
+        missing file or slot is a full bucket.
+        """
+        TokenBucket.__init__(self, rate, capacity)
+        self.path = path
+        self.slot = slot
+
+    def reserve(self, tokens):
+        """
+        Take tokens from the bucket file and return the number of seconds to
+        wait until they are available.
+        """
+        with self.lock:
+            with open(self.path, 'a+') as bucketfile:
+                fcntl.flock(bucketfile, fcntl.LOCK_EX)
+                try:
+                    bucketfile.seek(0)
+                    slots = {}
+                    for line in bucketfile.read().splitlines():
+                        fields = line.split()
+                        try:
+                            slots[fields[0]] = (float(fields[1]),
+                                                float(fields[2]))
+                        except (IndexError, ValueError):
+                            pass
+                    (available, updated) = slots.get(
+                        self.slot, (self.capacity, self.clock()))
+                    (available, updated, wait) = self.take(available,
+                                                           updated, tokens)
+                    slots[self.slot] = (available, updated)
+                    bucketfile.seek(0)
+                    bucketfile.truncate()
+                    bucketfile.write(''.join(
+                        name + ' ' + repr(state[0]) + ' ' + repr(state[1]) +
+                        '\n' for (name, state) in sorted(slots.items())))
+                    bucketfile.flush()
+                finally:
+                    fcntl.flock(bucketfile, fcntl.LOCK_UN)
+        return wait
+
+
+class RateLimitedQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler limits the rate of queries with token buckets chosen
+    by the endpoint class of the URL. buckets maps endpoint class names, as
+    assigned by the classes rules, to token buckets; the bucket stored under
+    'default' limits all other queries. Queries without a bucket are not
+    limited.
+    """
+    def __init__(self, queryhandler, buckets, classes=ENDPOINT_CLASSES):
+        """
+        Initialize the handler with the buckets and the list of
+        (URL pattern, endpoint class) rules.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.buckets = buckets
+        self.classes = classes
+
+    def endpoint_class(self, url):
+        """
+        Return the endpoint class of an URL.
+        """
+        for (pattern, name) in self.classes:
+            if fnmatch.fnmatchcase(url, pattern):
+                return name
+        return 'default'
+
+    def wait(self, url):
+        """
+        Wait until the bucket of an URL allows a query.
+        """
+        bucket = self.buckets.get(self.endpoint_class(url))
+        if bucket is None:
+            bucket = self.buckets.get('default')
+        if bucket is not None:
+            bucket.acquire()
+
+    def get(self, url):
+        """
+        Perform a rate limited HTTP GET query.
+        """
+        self.wait(url)
+        return self.queryhandler.get(url)
+
+    def delete(self, url):
+        """
+        Perform a rate limited HTTP DELETE query.
+        """
+        self.wait(url)
+        return self.queryhandler.delete(url)
+
+    def post(self, url, data):
+        """
+        Perform a rate limited HTTP POST query.
+        """
+        self.wait(url)
+        return self.queryhandler.post(url, data)
+
+    def put(self, url, data):
+        """
+        Perform a rate limited HTTP PUT query.
+        """
+        self.wait(url)
+        return self.queryhandler.put(url, data)
+
+    def stream(self, url, key):
+        """
+        Perform a rate limited streaming HTTP GET query.
+        """
+        self.wait(url)
+        return self.queryhandler.stream(url, key)
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+
+import json, time, threading
+import api
+
+class ReplayMiss(api.QueryFailed):
+    """
+    This exception indicates, that no interaction has been recorded for a
+    replayed query.
+    """
+
+
+def load_cassette(path):
+    """
+    Load the interactions recorded in a cassette file, which holds a JSON
+    object per line:
+
+    {"method": "GET", "url": "domain/list", "body": null, "code": 200,
+     "response": "...", "error": null, "elapsed": 0.05}
+
+    code and response are the status and body of the response; error is
+    the name of the exception raised without a response, e.g.
+    "ConnectionFailed". elapsed is the recorded duration in seconds.
+    """
+    interactions = []
+    with open(path) as cassette:
+        for line in cassette:
+            if line.strip():
+                interactions.append(json.loads(line))
+    return interactions
+
+
+class ReplayQueryHandler(api.QueryHandler):
+    """
+    This query handler answers queries from recorded interactions, indexed
+    by (method, URL, body). Interactions recorded for the same query are
+    replayed in order, and the last one is repeated when they run out.
+    Queries that have not been recorded fail with ReplayMiss.
+    """
+    def __init__(self, interactions, latency=0, endpoint='',
+                 apiversion=''):
+        """
+        Initialize the handler with a list of interactions or the path of
+        a cassette. latency is the number of seconds every query is delayed
+        by, or 'recorded' to delay queries by their recorded duration.
+        """
+        api.QueryHandler.__init__(self, endpoint, apiversion, '', '', '')
+        if isinstance(interactions, basestring):
+            interactions = load_cassette(interactions)
+        self.index = {}
+        for interaction in interactions:
+            key = (interaction['method'], interaction['url'],
+                   interaction.get('body'))
+            self.index.setdefault(key, []).append(interaction)
+        self.positions = {}
+        self.latency = latency
+        self.sleep = time.sleep
+        self.lock = threading.Lock()
+
+    def replay(self, method, url, body):
+        """
+        Return the next interaction recorded for a query, waiting for the
+        simulated latency.
+        """
+        key = (method, url, body)
+        with self.lock:
+            interactions = self.index.get(key)
+            if not interactions:
+                raise ReplayMiss('No interaction recorded for ' + method +
+                                 ' ' + url)
+            position = self.positions.get(key, 0)
+            self.positions[key] = min(position + 1, len(interactions) - 1)
+        interaction = interactions[position]
+        if self.latency == 'recorded':
+            self.sleep(interaction.get('elapsed', 0))
+        elif self.latency:
+            self.sleep(self.latency)
+        return interaction
+
+    def respond(self, method, url, body, expected):
+        """
+        Replay a query and parse the recorded response as a JSON string, or
+        raise the recorded error.
+        """
+        interaction = self.replay(method, url, body)
+        if interaction.get('error'):
+            errorclass = getattr(api, interaction['error'], None)
+            if (not isinstance(errorclass, type) or
+                not issubclass(errorclass, api.QueryFailed)):
+                errorclass = api.QueryFailed
+            raise errorclass(interaction.get('response') or
+                             interaction['error'])
+        result = {'code': interaction['code'],
+                  'body': interaction['response'],
+                  'headers': interaction.get('headers', {})}
+        if result['code'] not in expected:
+            raise api.response_error(result)
+        return json.loads(result['body'])
+
+    def get(self, url):
+        """
+        Replay a HTTP GET query.
+        """
+        return self.respond('GET', url, None, [200])
+
+    def delete(self, url):
+        """
+        Replay a HTTP DELETE query.
+        """
+        return self.respond('DELETE', url, None, [200])
+
+    def post(self, url, data):
+        """
+        Replay a HTTP POST query.
+        """
+        return self.respond('POST', url, data, [201])
+
+    def put(self, url, data):
+        """
+        Replay a HTTP PUT query.
+        """
+        return self.respond('PUT', url, data, [200, 201, 204])
+
+
+class RecordingQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler appends the queries passed to the wrapped handler and
+    their outcomes to a cassette file, which ReplayQueryHandler can replay.
+    """
+    def __init__(self, queryhandler, path):
+        """
+        Initialize the handler with the handler to wrap and the path of the
+        cassette, which is appended to.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.cassette = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def record(self, method, url, body, func, args):
+        """
+        Call a query function and record the query with its outcome.
+        """
+        interaction = {'method': method, 'url': url, 'body': body,
+                       'code': None, 'response': None, 'error': None}
+        start = time.time()
+        try:
+            value = func(*args)
+        except api.QueryFailed as error:
+            if error.code is None:
+                interaction['error'] = error.__class__.__name__
+                interaction['response'] = error.description
+            else:
+                interaction['code'] = error.code
+                interaction['response'] = error.body
+            raise
+        else:
+            interaction['code'] = {'POST': 201}.get(method, 200)
+            interaction['response'] = json.dumps(value)
+            return value
+        finally:
+            interaction['elapsed'] = time.time() - start
+            with self.lock:
+                self.cassette.write(json.dumps(interaction, sort_keys=True) +
+                                    '\n')
+                self.cassette.flush()
+
+    def get(self, url):
+        """
+        Perform and record a HTTP GET query.
+        """
+        return self.record('GET', url, None, self.queryhandler.get, (url,))
+
+    def delete(self, url):
+        """
+        Perform and record a HTTP DELETE query.
+        """
+        return self.record('DELETE', url, None, self.queryhandler.delete,
+                           (url,))
+
+    def post(self, url, data):
+        """
+        Perform and record a HTTP POST query.
+        """
+        return self.record('POST', url, data, self.queryhandler.post,
+                           (url, data))
+
+    def put(self, url, data):
+        """
+        Perform and record a HTTP PUT query.
+        """
+        return self.record('PUT', url, data, self.queryhandler.put,
+                           (url, data))
+
+    def stream(self, url, key):
+        """
+        Perform and record a HTTP GET query, yielding the elements of the
+        array stored under key.
+        """
+        return iter(self.get(url)[key])
+
+    def close(self):
+        """
+        Close the cassette file.
+        """
+        self.cassette.close()
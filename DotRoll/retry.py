@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+import threading, random, time
+import api
+
+class CircuitOpen(api.QueryFailed):
+    """
+    This exception indicates, that a query has not been sent, because the
+    circuit breaker is open after repeated failures.
+    """
+
+
+class CircuitBreaker:
+    """
+    This class stops queries to a failing service. After threshold
+    consecutive failures the circuit opens and queries fail immediately.
+    After resettimeout seconds a single trial query is let through, which
+    closes the circuit if it succeeds and opens it again if it fails.
+    """
+    def __init__(self, threshold=5, resettimeout=30):
+        """
+        Initialize the breaker in the closed state.
+        """
+        self.threshold = threshold
+        self.resettimeout = resettimeout
+        self.failures = 0
+        self.openedat = None
+        self.trial = False
+        self.lock = threading.Lock()
+        self.clock = time.time
+
+    def allow(self):
+        """
+        Return True, if a query may be sent.
+        """
+        with self.lock:
+            if self.openedat is None:
+                return True
+            if self.trial or self.clock() - self.openedat < self.resettimeout:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        """
+        Record a successful query, closing the circuit.
+        """
+        with self.lock:
+            self.failures = 0
+            self.openedat = None
+            self.trial = False
+
+    def failure(self):
+        """
+        Record a failed query, opening the circuit if the threshold has been
+        reached or the trial query has failed.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.openedat = self.clock()
+            self.trial = False
+
+    def state(self):
+        """
+        Return the state of the circuit: 'closed', 'open' or 'half-open'.
+        """
+        with self.lock:
+            if self.openedat is None:
+                return 'closed'
+            if self.trial or self.clock() - self.openedat >= self.resettimeout:
+                return 'half-open'
+            return 'open'
+
+
+class RetryingQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler retries GET queries failing with a connection error,
+    a 5xx error or 429 Too Many Requests. Retries are delayed by exponential
+    backoff with full jitter, or by the time the server asked for in its
+    Retry-After header. All queries pass through an optional circuit breaker.
+    """
+    def __init__(self, queryhandler, retries=3, backoff=0.5, maxbackoff=30,
+                 breaker=None):
+        """
+        Initialize the handler. The n-th retry is delayed by a random time
+        of up to backoff * 2 ** n seconds, but at most maxbackoff seconds.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.retries = retries
+        self.backoff = backoff
+        self.maxbackoff = maxbackoff
+        self.breaker = breaker
+        self.sleep = time.sleep
+        self.retried = 0
+
+    def get(self, url):
+        """
+        Perform a HTTP GET query, retrying transient failures.
+        """
+        return self.call(self.queryhandler.get, (url,), self.retries)
+
+    def delete(self, url):
+        """
+        Perform a HTTP DELETE query through the circuit breaker.
+        """
+        return self.call(self.queryhandler.delete, (url,), 0)
+
+    def post(self, url, data):
+        """
+        Perform a HTTP POST query through the circuit breaker.
+        """
+        return self.call(self.queryhandler.post, (url, data), 0)
+
+    def put(self, url, data):
+        """
+        Perform a HTTP PUT query through the circuit breaker.
+        """
+        return self.call(self.queryhandler.put, (url, data), 0)
+
+    def call(self, func, args, retries):
+        """
+        Call a query function, retrying transient failures up to retries
+        times.
+        """
+        attempt = 0
+        while True:
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpen('Circuit breaker is open')
+            try:
+                result = func(*args)
+            except (api.ConnectionFailed, api.ServerError,
+                    api.RateLimited) as error:
+                # Being rate limited shows, that the service is up.
+                self.record(not isinstance(error, api.RateLimited))
+                if attempt >= retries:
+                    raise
+                self.sleep(self.delay(attempt, error))
+                attempt += 1
+                self.retried += 1
+                continue
+            except api.QueryFailed:
+                self.record(False)
+                raise
+            except Exception:
+                # Unparseable responses and other errors must still reach
+                # the breaker, or a trial query would never end.
+                self.record(True)
+                raise
+            self.record(False)
+            return result
+
+    def record(self, failed):
+        """
+        Report the outcome of a query to the circuit breaker.
+        """
+        if self.breaker is None:
+            return
+        if failed:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+
+    def delay(self, attempt, error):
+        """
+        Return the number of seconds to wait before a retry, at most
+        maxbackoff seconds even if the server asked for longer.
+        """
+        if isinstance(error, api.RateLimited) and error.retryafter is not None:
+            return min(error.retryafter, self.maxbackoff)
+        return random.uniform(0, min(self.maxbackoff,
+                                     self.backoff * 2 ** attempt))
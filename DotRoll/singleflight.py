@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+import threading
+import api
+
+class Flight:
+    """
+    This class holds the outcome of a query shared by all its callers.
+    """
+    def __init__(self):
+        """
+        Initialize the flight as not yet landed.
+        """
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler coalesces concurrent identical GET queries: while a
+    query is in flight, other threads asking for the same URL wait for its
+    result instead of sending the query again. The result is shared between
+    the callers and must not be modified.
+    """
+    def __init__(self, queryhandler):
+        """
+        Initialize the handler with no queries in flight.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def get(self, url):
+        """
+        Perform a HTTP GET query, or wait for the identical one in flight.
+        """
+        key = ('GET', url)
+        with self.lock:
+            self.calls += 1
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                follower = True
+            else:
+                flight = self.flights[key] = Flight()
+                follower = False
+        if follower:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self.queryhandler.get(url)
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.event.set()
+        return flight.value
+
+    def stats(self):
+        """
+        Return the query counters as a dictionary.
+        """
+        with self.lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlightQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler coalesces identical GET queries of an
+    AsyncQueryHandler: while a query is in flight, the same AsyncResult is
+    returned for the same URL. The result is shared between the callers and
+    must not be modified.
+    """
+    def __init__(self, queryhandler):
+        """
+        Initialize the handler with no queries in flight.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def get(self, url):
+        """
+        Queue a HTTP GET query, or return the identical one in flight.
+        """
+        key = ('GET', url)
+        self.calls += 1
+        result = self.flights.get(key)
+        if result is not None:
+            self.coalesced += 1
+            return result
+        result = self.flights[key] = self.queryhandler.get(url)
+        result.add_callback(lambda result: self.flights.pop(key, None))
+        return result
+
+    def run(self, until=None):
+        """
+        Drive the event loop of the wrapped handler.
+        """
+        self.queryhandler.run(until)
+
+    def wait(self, results):
+        """
+        Wait for a list of AsyncResult objects and return their values.
+        """
+        return self.queryhandler.wait(results)
+
+    def stats(self):
+        """
+        Return the query counters as a dictionary.
+        """
+        return {'calls': self.calls, 'coalesced': self.coalesced}
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+
+import json, time, random, threading, gzip, ssl, hashlib, socket, Queue
+import StringIO, BaseHTTPServer, SocketServer
+
+class StandInRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    This request handler imitates the /rest/<version>/... endpoints of the
+    DotRoll API, keeping connections alive.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        """
+        Count the connections accepted by the server.
+        """
+        with self.server.lock:
+            self.server.connections += 1
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        """
+        Send the response for the requested endpoint.
+        """
+        with self.server.lock:
+            if self.server.record:
+                self.server.paths.append(self.path)
+                self.server.requestheaders.append(self.headers)
+            self.server.active += 1
+            self.server.maxactive = max(self.server.maxactive,
+                                        self.server.active)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active -= 1
+        if (self.server.etag and
+            self.headers.get('If-None-Match') == self.server.etag):
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        (status, body) = self.server.respond(self.path)
+        self.send_response(status)
+        for (name, value) in self.server.extraheaders.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.etag:
+            self.send_header('ETag', self.server.etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = StringIO.StringIO()
+            gzipfile = gzip.GzipFile(fileobj=buf, mode='wb')
+            gzipfile.write(body)
+            gzipfile.close()
+            body = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.dropconnections:
+            self.close_connection = 1
+
+    def log_message(self, format, *args):
+        """
+        Keep the output clean.
+        """
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    This is a local HTTP(S) server standing in for the DotRoll API in tests
+    and benchmarks. If body is set, it is the response to every query.
+    Otherwise price lists have tlds entries, the domain list has domains
+    entries and a random errorrate fraction of the queries fails with
+    503 Service Unavailable.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, body=None, dropconnections=False, delay=0, etag=None,
+                 domains=100, tlds=50, errorrate=0, certfile=None,
+                 record=True):
+        """
+        Bind the server to a random local port and start serving. Every
+        response is delayed by delay seconds. If etag is set, it is sent as
+        the ETag of the body. If certfile is set, the server speaks HTTPS
+        using the certificate and key in it. record enables recording the
+        paths and headers of the queries.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StandInRequestHandler)
+        if certfile is not None:
+            self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+                                          server_side=True)
+        self.scheme = 'http' if certfile is None else 'https'
+        self.body = body
+        self.dropconnections = dropconnections
+        self.delay = delay
+        self.etag = etag
+        self.domains = domains
+        self.tlds = tlds
+        self.errorrate = errorrate
+        self.record = record
+        self.status = 200
+        self.extraheaders = {}
+        self.requestheaders = []
+        self.connections = 0
+        self.paths = []
+        self.active = 0
+        self.maxactive = 0
+        self.bodies = {}
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def endpoint(self):
+        """
+        Return the endpoint URL of the server.
+        """
+        return (self.scheme + '://127.0.0.1:' + str(self.server_address[1]) +
+                '/rest')
+
+    def respond(self, path):
+        """
+        Return the (status, body) response for a request path.
+        """
+        if self.body is not None:
+            return (self.status, self.body)
+        if self.errorrate and random.random() < self.errorrate:
+            return (503, 'Service temporarily unavailable')
+        parts = path.split('?', 1)[0].split('/')[3:]
+        if len(parts) == 3 and parts[1] == 'prices':
+            return (200, self.generate(parts[0] + '/prices',
+                                       self.price_list))
+        if len(parts) == 3 and parts[:2] == ['domain', 'search']:
+            if int(hashlib.md5(parts[2]).hexdigest()[:2], 16) % 3:
+                return (200, '{"result": "available"}')
+            return (200, '{"result": "registered"}')
+        if parts == ['domain', 'list']:
+            return (200, self.generate('domain/list', self.domain_list))
+        return (404, '{"error": "Not found"}')
+
+    def generate(self, name, generator):
+        """
+        Return a generated body, generating it on first use.
+        """
+        with self.lock:
+            if name not in self.bodies:
+                self.bodies[name] = json.dumps(generator(name))
+            return self.bodies[name]
+
+    def price_list(self, name):
+        """
+        Generate a price list with tlds entries.
+        """
+        prices = {}
+        for i in range(self.tlds):
+            prices['tld' + str(i)] = dict(
+                (str(period), {'net': 1000 * period + i,
+                               'gross': 1270 * period + i})
+                for period in range(1, 4))
+        return {'prices': prices}
+
+    def domain_list(self, name):
+        """
+        Generate a domain list with domains entries.
+        """
+        return {'domains': [{'name': 'domain' + str(i) + '.hu',
+                             'status': 'active',
+                             'expires': '2015-%02d-01' % (i % 12 + 1),
+                             'autorenew': bool(i % 2)}
+                            for i in range(self.domains)]}
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+
+class LatencyProxy:
+    """
+    This is a local TCP proxy in front of a StandInServer, which delays the
+    data passed in each direction by delay seconds, to imitate the round trip
+    time to a distant server. Data sent back to back is delayed together,
+    so that requests sent without waiting for the responses only pay the
+    round trip time once. Connecting is not delayed.
+    """
+    def __init__(self, server, delay):
+        """
+        Bind the proxy to a random local port and start forwarding the
+        connections to the server.
+        """
+        self.server = server
+        self.delay = delay
+        self.sockets = []
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(128)
+        self.thread = threading.Thread(target=self.accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def endpoint(self):
+        """
+        Return the endpoint URL of the server behind the proxy.
+        """
+        return (self.server.scheme + '://127.0.0.1:' +
+                str(self.socket.getsockname()[1]) + '/rest')
+
+    def accept(self):
+        """
+        Accept connections and start forwarding their data in both
+        directions until the listening socket is closed.
+        """
+        while True:
+            try:
+                (client, address) = self.socket.accept()
+                upstream = socket.create_connection(
+                    self.server.server_address)
+            except socket.error:
+                return
+            self.sockets.extend([client, upstream])
+            for (source, target) in ((client, upstream), (upstream, client)):
+                chunks = Queue.Queue()
+                for (func, args) in ((self.receive, (source, chunks)),
+                                     (self.forward, (chunks, target))):
+                    thread = threading.Thread(target=func, args=args)
+                    thread.daemon = True
+                    thread.start()
+
+    def receive(self, source, chunks):
+        """
+        Queue the data arriving from a socket with the time it is due.
+        """
+        while True:
+            try:
+                data = source.recv(65536)
+            except socket.error:
+                data = ''
+            chunks.put((time.time() + self.delay, data))
+            if not data:
+                return
+
+    def forward(self, chunks, target):
+        """
+        Send the queued data to a socket when it is due, and pass on the end
+        of the connection.
+        """
+        while True:
+            (due, data) = chunks.get()
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                if not data:
+                    target.shutdown(socket.SHUT_WR)
+                    return
+                target.sendall(data)
+            except socket.error:
+                return
+
+    def stop(self):
+        """
+        Stop accepting connections and close the connections forwarded.
+        """
+        for sock in [self.socket] + self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+import sqlite3, hashlib, json, time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sync INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    record TEXT
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    consumer TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+"""
+
+def record_hash(record):
+    """
+    Return the hash of a domain record, which does not depend on the order
+    of its keys.
+    """
+    return hashlib.sha1(json.dumps(record, sort_keys=True)).hexdigest()
+
+
+class Change:
+    """
+    This class is an entry of the change feed: a domain added, removed or
+    changed by a sync. record is the new record, or the last known one for
+    removed domains.
+    """
+    def __init__(self, id, sync, kind, name, record):
+        """
+        Initialize the entry.
+        """
+        self.id = id
+        self.sync = sync
+        self.kind = kind
+        self.name = name
+        self.record = record
+
+    def __repr__(self):
+        """
+        Return a readable representation of the entry.
+        """
+        return 'Change(%r, %r, %r, %r)' % (self.id, self.sync, self.kind,
+                                           self.name)
+
+
+class DomainListSync:
+    """
+    This class keeps a snapshot of the domain list in a SQLite database,
+    keyed by domain name. Every sync streams the domain list and compares
+    the hash of each record to the snapshot, so unchanged records are
+    skipped without being written. Added, removed and changed domains are
+    appended to a change feed, which consumers read from their last
+    position.
+    """
+    def __init__(self, actionhandler, path):
+        """
+        Initialize the sync with an ActionHandler and the path of the
+        database, which is created if missing.
+        """
+        self.actionhandler = actionhandler
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def sync(self):
+        """
+        Download the domain list and update the snapshot. Returns the number
+        of added, removed, changed and unchanged domains as a dictionary.
+        """
+        hashes = dict(self.db.execute('SELECT name, hash FROM domains'))
+        counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+        seen = set()
+        with self.db:
+            syncid = self.db.execute('INSERT INTO syncs (time) VALUES (?)',
+                                     (time.time(),)).lastrowid
+            for record in self.actionhandler.stream_domain_list():
+                name = record['name']
+                seen.add(name)
+                digest = record_hash(record)
+                old = hashes.get(name)
+                if old == digest:
+                    counts['unchanged'] += 1
+                    continue
+                text = json.dumps(record, sort_keys=True)
+                kind = 'added' if old is None else 'changed'
+                self.db.execute('INSERT OR REPLACE INTO domains'
+                                ' (name, hash, record) VALUES (?, ?, ?)',
+                                (name, digest, text))
+                self.record_change(syncid, kind, name, text)
+                counts[kind] += 1
+            for name in set(hashes) - seen:
+                (text,) = self.db.execute('SELECT record FROM domains'
+                                          ' WHERE name = ?',
+                                          (name,)).fetchone()
+                self.db.execute('DELETE FROM domains WHERE name = ?',
+                                (name,))
+                self.record_change(syncid, 'removed', name, text)
+                counts['removed'] += 1
+        return counts
+
+    def record_change(self, syncid, kind, name, text):
+        """
+        Append an entry to the change feed.
+        """
+        self.db.execute('INSERT INTO changes (sync, kind, name, record)'
+                        ' VALUES (?, ?, ?, ?)', (syncid, kind, name, text))
+
+    def changes(self, since=0):
+        """
+        Yield the entries of the change feed after the position since, in
+        order. The id of an entry is its position.
+        """
+        cursor = self.db.execute('SELECT id, sync, kind, name, record'
+                                 ' FROM changes WHERE id > ? ORDER BY id',
+                                 (since,))
+        for (id, syncid, kind, name, text) in cursor:
+            yield Change(id, syncid, kind, name, json.loads(text))
+
+    def consume(self, consumer):
+        """
+        Yield the entries of the change feed not yet consumed by a named
+        consumer. The position of the consumer is saved after every entry,
+        when the next one is requested.
+        """
+        row = self.db.execute('SELECT position FROM cursors'
+                              ' WHERE consumer = ?', (consumer,)).fetchone()
+        position = row[0] if row else 0
+        for change in list(self.changes(position)):
+            yield change
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO cursors'
+                                ' (consumer, position) VALUES (?, ?)',
+                                (consumer, change.id))
+
+    def position(self):
+        """
+        Return the position of the last entry of the change feed.
+        """
+        (position,) = self.db.execute('SELECT MAX(id)'
+                                      ' FROM changes').fetchone()
+        return position or 0
+
+    def snapshot(self):
+        """
+        Yield the records of the snapshot sorted by domain name.
+        """
+        for (text,) in self.db.execute('SELECT record FROM domains'
+                                       ' ORDER BY name'):
+            yield json.loads(text)
+
+    def prune(self, before):
+        """
+        Delete the entries of the change feed up to the position before.
+        """
+        with self.db:
+            self.db.execute('DELETE FROM changes WHERE id <= ?', (before,))
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.db.close()
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+import unittest, os, tempfile, shutil
+import accounts, api, standin
+
+class MultiAccountClientTest(unittest.TestCase):
+    def test_load_accounts(self):
+        """
+        Test reading a credentials file.
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'accounts.ini')
+            with open(path, 'w') as credentials:
+                credentials.write('[first]\napikey = k1\nusername = u1\n'
+                                  'password = p1\nratelimit = 2.5\n\n'
+                                  '[second]\napikey = k2\nusername = u2\n'
+                                  'password = p2\n')
+            accountlist = accounts.load_accounts(path)
+            self.assertEqual([account.name for account in accountlist],
+                             ['first', 'second'])
+            self.assertEqual(accountlist[0].ratelimit, 2.5)
+            self.assertEqual(accountlist[1].password, 'p2')
+            with open(path, 'a') as credentials:
+                credentials.write('[third]\napikey = k3\n')
+            self.assertRaises(ValueError, accounts.load_accounts, path)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_fan_out(self):
+        """
+        Test, that calls run for every account over shared connections, and
+        a failing account does not abort the others.
+        """
+        server = standin.StandInServer(domains=2, delay=0.05)
+        try:
+            accountlist = [accounts.Account('account' + str(i), 'key',
+                                            'user' + str(i), 'pass', 100)
+                           for i in range(4)]
+            client = accounts.MultiAccountClient(accountlist,
+                                                 server.endpoint(), '1.0',
+                                                 concurrency=4)
+            result = client.call('get_domain_list')
+            self.assertEqual(sorted(result.results), ['account0', 'account1',
+                                                      'account2', 'account3'])
+            records = list(result.merged('domains'))
+            self.assertEqual(len(records), 8)
+            self.assertEqual(records[0]['account'], 'account0')
+            self.assertEqual(server.maxactive, 4)
+            def failing(actionhandler):
+                if actionhandler.queryhandler.username == 'user2':
+                    raise api.QueryFailed('Forbidden')
+                return actionhandler.get_domain_list()
+            outcomes = dict((name, error) for (name, value, error)
+                            in client.run(failing))
+            self.assertEqual(len(outcomes), 4)
+            self.assertTrue(isinstance(outcomes['account2'],
+                                       api.QueryFailed))
+            self.assertEqual(outcomes['account0'], None)
+            self.assertEqual(server.connections, 4)
+            client.close()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+
+import unittest
+import api, standin, testing
+
+class ActionHandlerTest(unittest.TestCase):
+    def test_get_prices(self):
+        """
+        Test querying the service price lists.
+        This test uses mock testing, it does not actually perform
+        HTTP queries.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ah = api.ActionHandler(qh)
+        qh.add_expectation('domain/prices/HUF', 'get', '', 200, '{"new": 1}')
+        qh.add_expectation('domain/prices/EUR', 'get', '', 200, '{"new": 2}')
+        qh.add_expectation('hosting/prices/HUF', 'get', '', 200, '{"new": 3}')
+        qh.add_expectation('hosting/prices/EUR', 'get', '', 200, '{"new": 4}')
+        qh.add_expectation('vps/prices/HUF', 'get', '', 200, '{"new": 5}')
+        qh.add_expectation('vps/prices/EUR', 'get', '', 200, '{"new": 6}')
+        self.assertEqual(ah.get_domain_prices('HUF'), {'new': 1})
+        self.assertEqual(ah.get_domain_prices('EUR'), {'new': 2})
+        self.assertEqual(ah.get_hosting_prices('HUF'), {'new': 3})
+        self.assertEqual(ah.get_hosting_prices('EUR'), {'new': 4})
+        self.assertEqual(ah.get_vps_prices('HUF'), {'new': 5})
+        self.assertEqual(ah.get_vps_prices('EUR'), {'new': 6})
+
+    def test_get_domain_availability(self):
+        """
+        Test querying the domain availability.
+        This test uses mock testing, it does not actually perform
+        HTTP queries.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ah = api.ActionHandler(qh)
+        qh.add_expectation('domain/search/janoszen.hu', 'get', '', 200,
+                           '{"status": "available"}');
+        self.assertEqual(ah.get_domain_availability('janoszen.hu'),
+                         {'status': 'available'})
+
+    def test_get_domain_list(self):
+        """
+        Test querying the domain list of the current user.
+        This test uses mock testing, it does not actually perform
+        HTTP queries.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ah = api.ActionHandler(qh)
+        qh.add_expectation('domain/list', 'get', '', 200,
+                           '["janoszen.hu"]');
+        self.assertEqual(ah.get_domain_list(), ['janoszen.hu'])
+
+    def test_stream_domain_list(self):
+        """
+        Test iterating over the domain list of the current user.
+        This test uses mock testing, it does not actually perform
+        HTTP queries.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ah = api.ActionHandler(qh)
+        qh.add_expectation('domain/list', 'get', '', 200,
+                           '{"domains": [{"name": "janoszen.hu"}]}');
+        self.assertEqual(list(ah.stream_domain_list()),
+                         [{'name': 'janoszen.hu'}])
+
+    def test_iter_domain_list(self):
+        """
+        Test iterating over the domain list of the current user in pages.
+        This test uses mock testing, it does not actually perform
+        HTTP queries.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ah = api.ActionHandler(qh)
+        qh.add_expectation('domain/list', 'get', '', 200,
+                           '{"domains": ["a.hu", "b.hu", "c.hu"]}');
+        with ah.iter_domain_list(2) as pages:
+            self.assertEqual(list(pages), [['a.hu', 'b.hu'], ['c.hu']])
+
+
+class PooledHTTPQueryHandlerTest(unittest.TestCase):
+    def test_reuses_connection(self):
+        """
+        Test, that consecutive queries are sent over the same connection.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0',
+                                            'key', 'user', 'pass')
+            for i in range(3):
+                self.assertEqual(qh.get('domain/search/janoszen.hu'),
+                                 {'result': 'available'})
+            qh.close()
+            self.assertEqual(server.connections, 1)
+            self.assertEqual(server.paths[0],
+                             '/rest/1.0/domain/search/janoszen.hu'
+                             '?api_key=key&fmt=json')
+        finally:
+            server.stop()
+
+    def test_reconnects_stale_connection(self):
+        """
+        Test, that a connection closed by the server is replaced
+        transparently.
+        """
+        server = standin.StandInServer('{"new": 1}',
+                                       dropconnections=True)
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0',
+                                            'key', 'user', 'pass')
+            self.assertEqual(qh.get('domain/prices/HUF'), {'new': 1})
+            self.assertEqual(qh.get('domain/prices/HUF'), {'new': 1})
+            qh.close()
+            self.assertEqual(server.connections, 2)
+        finally:
+            server.stop()
+
+    def test_no_resend_on_stale_connection(self):
+        """
+        Test, that a write query failing on a stale connection is not sent
+        again.
+        """
+        server = standin.StandInServer('{"new": 1}',
+                                       dropconnections=True)
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0',
+                                            'key', 'user', 'pass')
+            self.assertEqual(qh.get('domain/prices/HUF'), {'new': 1})
+            self.assertRaises(api.ConnectionFailed, qh.post, 'domain',
+                              '{"name": "janoszen.hu"}')
+            qh.close()
+            self.assertEqual(server.connections, 1)
+        finally:
+            server.stop()
+
+    def test_stream_reuses_connection(self):
+        """
+        Test, that completely read streams return their connection to the
+        pool, while a stream abandoned midway discards it.
+        """
+        server = standin.StandInServer('{"domains": [{"name": "a.hu"},'
+                                       ' {"name": "b.hu"}], "total": 2}')
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0',
+                                            'key', 'user', 'pass')
+            for i in range(2):
+                self.assertEqual(len(list(qh.stream('domain/list',
+                                                    'domains'))), 2)
+            self.assertEqual(qh.get('domain/list')['total'], 2)
+            self.assertEqual(server.connections, 1)
+            domains = qh.stream('domain/list', 'domains')
+            self.assertEqual(next(domains), {'name': 'a.hu'})
+            domains.close()
+            self.assertEqual(qh.get('domain/list')['total'], 2)
+            qh.close()
+            self.assertEqual(server.connections, 2)
+        finally:
+            server.stop()
+
+    def test_max_requests(self):
+        """
+        Test, that connections are retired after maxrequests queries.
+        """
+        server = standin.StandInServer('{"new": 1}')
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0',
+                                            'key', 'user', 'pass',
+                                            maxrequests=2)
+            for i in range(4):
+                qh.get('domain/prices/HUF')
+            qh.close()
+            self.assertEqual(server.connections, 2)
+        finally:
+            server.stop()
+
+
+class HTTPQueryHandlerTest(unittest.TestCase):
+    def test_conditional_get(self):
+        """
+        Test, that a GET query is repeated conditionally and the remembered
+        result is returned on 304 Not Modified.
+        """
+        server = standin.StandInServer('{"domains": []}', etag='"v1"')
+        try:
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass')
+            self.assertEqual(qh.get('domain/list'), {'domains': []})
+            self.assertEqual(qh.get('domain/list'), {'domains': []})
+            self.assertEqual(server.requestheaders[0].get('If-None-Match'),
+                             None)
+            self.assertEqual(server.requestheaders[1].get('If-None-Match'),
+                             '"v1"')
+            server.etag = '"v2"'
+            server.body = '{"domains": ["janoszen.hu"]}'
+            self.assertEqual(qh.get('domain/list'),
+                             {'domains': ['janoszen.hu']})
+        finally:
+            server.stop()
+
+    def test_compression(self):
+        """
+        Test, that compressed responses are requested and decompressed.
+        """
+        server = standin.StandInServer('{"prices": {}}')
+        try:
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass', compress=False)
+            self.assertEqual(qh.get('domain/prices/HUF'), {'prices': {}})
+            qh.compress = True
+            self.assertEqual(qh.get('domain/prices/HUF'), {'prices': {}})
+            self.assertEqual(server.requestheaders[0].get('Accept-Encoding'),
+                             'identity')
+            self.assertEqual(server.requestheaders[1].get('Accept-Encoding'),
+                             'gzip')
+        finally:
+            server.stop()
+
+    def test_errors(self):
+        """
+        Test, that failed queries raise classified exceptions.
+        """
+        server = standin.StandInServer('Slow down')
+        try:
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass')
+            server.status = 429
+            server.extraheaders = {'Retry-After': '7'}
+            try:
+                qh.get('domain/search/janoszen.hu')
+                self.fail('No exception raised')
+            except api.RateLimited as error:
+                self.assertEqual((error.code, error.body, error.retryafter),
+                                 (429, 'Slow down', 7))
+            server.status = 503
+            self.assertRaises(api.ServerError, qh.get, 'domain/list')
+            server.status = 404
+            self.assertRaises(api.QueryFailed, qh.get, 'domain/list')
+        finally:
+            server.stop()
+        self.assertRaises(api.ConnectionFailed, qh.get, 'domain/list')
+
+    def test_stream(self):
+        """
+        Test streaming a compressed domain list.
+        """
+        server = standin.StandInServer('{"domains": [{"name": "janoszen.hu"},'
+                                       ' {"name": "dotroll.hu"}]}')
+        try:
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass')
+            self.assertEqual([domain['name'] for domain
+                              in qh.stream('domain/list', 'domains')],
+                             ['janoszen.hu', 'dotroll.hu'])
+        finally:
+            server.stop()
+
+    def test_prepare(self):
+        """
+        Test, that the request URL parts and the authentication header are
+        precomputed, and recomputed by prepare().
+        """
+        qh = api.HTTPQueryHandler('https://api.example.com/rest', '1.0',
+                                  'k y', 'user', 'pass')
+        self.assertEqual((qh.scheme, qh.host), ('https', 'api.example.com'))
+        self.assertEqual(qh.build_path('domain/list'),
+                         '/rest/1.0/domain/list?api_key=k%20y&fmt=json')
+        self.assertEqual(qh.build_headers(),
+                         {'Authorization': 'Basic dXNlcjpwYXNz'})
+        qh.apikey = 'other'
+        qh.prepare()
+        self.assertEqual(qh.build_url('domain/list'),
+                         'https://api.example.com/rest/1.0/domain/list'
+                         '?api_key=other&fmt=json')
+
+
+if __name__ == '__main__':
+    unittest.main()
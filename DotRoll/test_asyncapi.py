@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+import unittest, socket, json, time
+import api, asyncapi, standin
+
+class ResponseParserTest(unittest.TestCase):
+    def test_pipelined_responses(self):
+        """
+        Test parsing several responses arriving in arbitrary fragments.
+        """
+        data = ('HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}'
+                'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                '3\r\n{"a\r\n4\r\n": 1\r\n1\r\n}\r\n0\r\n\r\n'
+                'HTTP/1.0 404 Not Found\r\n\r\nmissing')
+        parser = asyncapi.ResponseParser()
+        for i in range(0, len(data), 7):
+            parser.feed(data[i:i + 7])
+        parser.finish()
+        self.assertEqual([(status, body) for (status, headers, body)
+                          in parser.responses],
+                         [(200, '{}'), (200, '{"a": 1}'), (404, 'missing')])
+
+
+class AsyncQueryHandlerTest(unittest.TestCase):
+    def test_concurrent_queries(self):
+        """
+        Test, that queries are carried out concurrently up to the in-flight
+        limit.
+        """
+        server = standin.StandInServer('{"result": "available"}',
+                                       delay=0.2)
+        try:
+            qh = asyncapi.AsyncQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass', maxinflight=10)
+            ah = asyncapi.AsyncActionHandler(qh)
+            start = time.time()
+            results = [ah.get_domain_availability('test' + str(i) + '.hu')
+                       for i in range(20)]
+            self.assertEqual(ah.wait(results),
+                             [{'result': 'available'}] * 20)
+            self.assertTrue(time.time() - start < 2)
+            self.assertTrue(server.maxactive <= 10)
+            self.assertEqual(sorted(server.paths)[0],
+                             '/rest/1.0/domain/search/test0.hu'
+                             '?api_key=key&fmt=json')
+        finally:
+            server.stop()
+
+    def test_keepalive(self):
+        """
+        Test, that idle connections are reused by the following queries.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        try:
+            qh = asyncapi.AsyncQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass', maxinflight=2)
+            ah = asyncapi.AsyncActionHandler(qh)
+            for i in range(3):
+                results = [ah.get_domain_availability('test' + str(j) +
+                                                       '.hu')
+                           for j in range(4)]
+                self.assertEqual(ah.wait(results),
+                                 [{'result': 'available'}] * 4)
+            self.assertEqual(server.connections, 2)
+            qh.close()
+            self.assertEqual(qh.map, {})
+        finally:
+            server.stop()
+
+    def test_reconnects_stale_connection(self):
+        """
+        Test, that a GET query failing on an idle connection closed by the
+        server is sent again, while a write query fails.
+        """
+        server = standin.StandInServer('{"result": "available"}',
+                                       dropconnections=True)
+        try:
+            qh = asyncapi.AsyncQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass')
+            for i in range(2):
+                self.assertEqual(qh.get('domain/search/a.hu').result(),
+                                 {'result': 'available'})
+            self.assertEqual(server.connections, 2)
+            write = qh.post('domain', '{"name": "a.hu"}')
+            qh.run()
+            self.assertTrue(isinstance(write.error, api.ConnectionFailed))
+            qh.close()
+        finally:
+            server.stop()
+
+    def test_connection_failure(self):
+        """
+        Test, that a failed connection fails the query.
+        """
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        qh = asyncapi.AsyncQueryHandler('http://127.0.0.1:' + str(port) +
+                                        '/rest', '1.0', 'key', 'user', 'pass')
+        self.assertRaises(api.QueryFailed, qh.get('domain/list').result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+import unittest, threading
+import batch
+
+class BatchRunnerTest(unittest.TestCase):
+    def test_parse_line(self):
+        """
+        Test parsing script and JSON lines.
+        """
+        self.assertEqual(batch.parse_line('getdomainprices HUF'),
+                         ['--getdomainprices', '--currency', 'HUF'])
+        self.assertEqual(batch.parse_line('{"action": "getdomainavailability",'
+                                          ' "domainname": "foo.hu"}'),
+                         ['--getdomainavailability', '--domainname',
+                          'foo.hu'])
+        self.assertEqual(batch.parse_line('getdomainlist --retries 1'),
+                         ['--getdomainlist', '--retries', '1'])
+        self.assertEqual(batch.parse_line('  # comment'), None)
+        self.assertRaises(batch.BatchSyntaxError, batch.parse_line,
+                          'getdomainlist x')
+        self.assertRaises(batch.BatchSyntaxError, batch.parse_line,
+                          '{"currency": 1}')
+
+    def test_order(self):
+        """
+        Test, that results are yielded in input order and errors are
+        reported per action.
+        """
+        release = threading.Event()
+        def call(args):
+            if args[-1] == 'slow':
+                release.wait()
+            if args[-1] == 'bad':
+                raise ValueError('bad action')
+            if args[-1] == 'x':
+                release.set()
+            return [[args[-1]]]
+        lines = ['getdomainavailability slow', '', 'getdomainavailability x',
+                 'getdomainavailability bad', 'getdomainlist x']
+        runner = batch.BatchRunner(call, concurrency=3)
+        results = list(runner.run(lines))
+        self.assertEqual([result[0] for result in results], [1, 3, 4, 5])
+        self.assertEqual(results[0][2], [['slow']])
+        self.assertEqual(str(results[2][3]), 'bad action')
+        self.assertTrue(isinstance(results[3][3], batch.BatchSyntaxError))
+        release.clear()
+        runner = batch.BatchRunner(call, concurrency=2, ordered=False)
+        results = runner.run(['getdomainavailability slow',
+                              'getdomainavailability y'])
+        self.assertEqual(results.next()[0], 2)
+        release.set()
+        self.assertEqual([result[0] for result in results], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+
+import unittest
+import benchmark, standin
+
+class BenchmarkTest(unittest.TestCase):
+    def test_scenarios(self):
+        """
+        Test running small scenarios in child processes.
+        """
+        server = standin.StandInServer(domains=50, tlds=5, record=False)
+        try:
+            runner = benchmark.Benchmark(server, requests=5, names=20,
+                                         concurrency=4, repeats=2)
+            for name in ['pooled_calls', 'bulk_availability',
+                         'domain_list_stream', 'cli_domain_list']:
+                result = runner.run(name)
+                self.assertFalse('error' in result, result.get('error'))
+                self.assertEqual(result['errors'], 0)
+                self.assertTrue(result['throughput'] > 0)
+                self.assertTrue(result['p50_ms'] <= result['p99_ms'])
+        finally:
+            server.stop()
+
+    def test_compare(self):
+        """
+        Test detecting regressions against a baseline.
+        """
+        self.assertEqual(benchmark.percentile([5, 1, 4, 2, 3], 0.5), 3)
+        self.assertEqual(benchmark.percentile([5, 1, 4, 2, 3], 0.99), 5)
+        baseline = {'a': {'throughput': 100.0, 'p99_ms': 10.0},
+                    'b': {'throughput': 100.0, 'p99_ms': 10.0}}
+        results = {'a': {'throughput': 90.0, 'p99_ms': 11.0},
+                   'b': {'throughput': 70.0, 'p99_ms': 13.0},
+                   'c': {'throughput': 1.0, 'p99_ms': 1.0}}
+        self.assertEqual(len(benchmark.compare(results, baseline, 0.2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
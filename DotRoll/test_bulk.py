@@ -0,0 +1,65 @@
+#!/usr/bin/python
+
+import unittest, threading
+import api, bulk, validate
+
+class FlakyActionHandler:
+    """
+    This action handler fails the first query for every name starting with
+    "flaky", every query for names starting with "bad", and rejects names
+    starting with "invalid" or "missing".
+    """
+    def __init__(self):
+        """
+        Initialize the set of names seen.
+        """
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def get_domain_availability(self, domainname):
+        """
+        Return a fake availability result.
+        """
+        with self.lock:
+            first = domainname not in self.seen
+            self.seen.add(domainname)
+        if domainname.startswith('invalid'):
+            raise validate.InvalidDomainName('Invalid domain name')
+        if domainname.startswith('missing'):
+            raise api.QueryFailed('HTTP 404', 404, 'Not found')
+        if domainname.startswith('bad'):
+            raise api.ConnectionFailed('Connection reset')
+        if first and domainname.startswith('flaky'):
+            raise api.RateLimited('HTTP 429', 429, '', 0)
+        return {'result': 'available'}
+
+
+class BulkAvailabilityCheckerTest(unittest.TestCase):
+    def test_check(self):
+        """
+        Test, that every name is checked and transient failures are retried,
+        but invalid names and client errors are not.
+        """
+        reports = []
+        checker = bulk.BulkAvailabilityChecker(FlakyActionHandler(),
+                                               concurrency=4,
+                                               retries=1, retrydelay=0,
+                                               progress=reports.append)
+        names = ['test' + str(i) + '.hu\n' for i in range(50)]
+        names += ['flaky.hu', 'bad.hu', 'invalid.hu', 'missing.hu', '']
+        results = dict((name, (result, error)) for (name, result, error)
+                       in checker.check(names))
+        self.assertEqual(len(results), 54)
+        self.assertEqual(results['test7.hu'], ({'result': 'available'}, None))
+        self.assertEqual(results['flaky.hu'], ({'result': 'available'}, None))
+        self.assertTrue(isinstance(results['bad.hu'][1], api.QueryFailed))
+        self.assertTrue(isinstance(results['invalid.hu'][1],
+                                   validate.InvalidDomainName))
+        self.assertEqual(results['missing.hu'][1].code, 404)
+        self.assertEqual(reports[-1].completed, 54)
+        self.assertEqual(reports[-1].failed, 3)
+        self.assertEqual(reports[-1].retried, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+import unittest, tempfile, shutil
+import api, cache, testing
+
+class CachingQueryHandlerTest(unittest.TestCase):
+    def test_ttl(self):
+        """
+        Test, that price lists are cached until they expire and searches
+        are not cached.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ch = cache.CachingQueryHandler(qh)
+        now = [1000]
+        ch.clock = lambda: now[0]
+        ah = api.ActionHandler(ch)
+        qh.add_expectation('domain/prices/HUF', 'get', '', 200, '{"new": 1}')
+        qh.add_expectation('domain/search/janoszen.hu', 'get', '', 200,
+                           '{"result": "available"}')
+        qh.add_expectation('domain/search/janoszen.hu', 'get', '', 200,
+                           '{"result": "registered"}')
+        qh.add_expectation('domain/prices/HUF', 'get', '', 200, '{"new": 2}')
+        self.assertEqual(ah.get_domain_prices('HUF'), {'new': 1})
+        self.assertEqual(ah.get_domain_prices('HUF'), {'new': 1})
+        self.assertEqual(ah.get_domain_availability('janoszen.hu'),
+                         {'result': 'available'})
+        self.assertEqual(ah.get_domain_availability('janoszen.hu'),
+                         {'result': 'registered'})
+        now[0] += 6 * 3600
+        self.assertEqual(ah.get_domain_prices('HUF'), {'new': 2})
+        self.assertEqual(ch.stats(), {'hits': 1, 'diskhits': 0,
+                                      'misses': 2, 'size': 1})
+
+    def test_lru(self):
+        """
+        Test, that the least recently used entry is evicted.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        ch = cache.CachingQueryHandler(qh, maxsize=2)
+        for currency in ['HUF', 'EUR', 'USD', 'EUR']:
+            qh.add_expectation('vps/prices/' + currency, 'get', '', 200,
+                               '"' + currency + '"')
+        for currency in ['HUF', 'EUR', 'HUF', 'USD', 'HUF', 'EUR']:
+            self.assertEqual(ch.get('vps/prices/' + currency), currency)
+        self.assertEqual(ch.stats()['hits'], 2)
+        self.assertEqual(ch.stats()['misses'], 4)
+
+    def test_cachedir(self):
+        """
+        Test, that cached entries survive in the cache directory, and are
+        not shared with another API key.
+        """
+        cachedir = tempfile.mkdtemp()
+        try:
+            qh = testing.MockQueryHandler('', '', '', '', '')
+            qh.add_expectation('hosting/prices/EUR', 'get', '', 200,
+                               '{"new": 1}')
+            ch = cache.CachingQueryHandler(qh, cachedir=cachedir)
+            self.assertEqual(ch.get('hosting/prices/EUR'), {'new': 1})
+            ch = cache.CachingQueryHandler(qh, cachedir=cachedir)
+            self.assertEqual(ch.get('hosting/prices/EUR'), {'new': 1})
+            self.assertEqual(ch.get('hosting/prices/EUR'), {'new': 1})
+            self.assertEqual(ch.stats(), {'hits': 1, 'diskhits': 1,
+                                          'misses': 0, 'size': 1})
+            other = testing.MockQueryHandler('', '', 'other', '', '')
+            other.add_expectation('hosting/prices/EUR', 'get', '', 200,
+                                  '{"new": 2}')
+            ch = cache.CachingQueryHandler(other, cachedir=cachedir)
+            self.assertEqual(ch.get('hosting/prices/EUR'), {'new': 2})
+        finally:
+            shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+import unittest
+import api, catalog, standin
+
+class PriceCatalogTest(unittest.TestCase):
+    def test_queries(self):
+        """
+        Test lookups and cheapest, cross-currency and net/gross queries.
+        """
+        pricecatalog = catalog.PriceCatalog()
+        pricecatalog.add('domain', 'HUF', {'prices': {
+            u'hu': {u'1': {'net': 3000, 'gross': 3810},
+                    u'2': {'net': 6000, 'gross': 7620}},
+            u'com': {u'1': {'net': 2500, 'gross': 3175}},
+            u'eu': {u'1': {'net': 2800, 'gross': 3556}}}})
+        pricecatalog.add('domain', 'EUR', {'prices': {
+            u'hu': {u'1': {'net': 10, 'gross': 12.7}}}})
+        self.assertEqual(len(pricecatalog), 5)
+        self.assertEqual(pricecatalog.lookup('domain', 'hu', '2', 'HUF').gross,
+                         7620)
+        self.assertEqual(pricecatalog.lookup('domain', 'hu', '2', 'EUR'), None)
+        self.assertEqual([price.name for price
+                          in pricecatalog.cheapest('domain', 'HUF')],
+                         ['com', 'eu', 'hu'])
+        self.assertEqual([price.name for price
+                          in pricecatalog.cheapest('domain', 'HUF',
+                                                   names=['hu', 'eu', 'xx'],
+                                                   limit=1)],
+                         ['eu'])
+        self.assertEqual(sorted(pricecatalog.currencies('domain', 'hu', '1')),
+                         ['EUR', 'HUF'])
+        self.assertEqual(pricecatalog.net_gross('domain', 'HUF', '1')[0],
+                         ('com', '1', 2500, 3175))
+        pricecatalog.add('domain', 'HUF', {'prices': {
+            u'hu': {u'1': {'net': 2000, 'gross': 2540}}}})
+        self.assertEqual(len(pricecatalog), 2)
+        self.assertEqual(len(pricecatalog.entries('domain', 'hu')), 2)
+        self.assertEqual(pricecatalog.lookup('domain', 'hu', '2', 'HUF'), None)
+        self.assertEqual(pricecatalog.lookup('domain', 'com', '1', 'HUF'),
+                         None)
+        self.assertEqual(pricecatalog.names('domain'), ['hu'])
+        self.assertEqual(pricecatalog.cheapest('domain', 'HUF')[0].name, 'hu')
+        self.assertEqual(pricecatalog.cheapest('domain', 'HUF', period='2'),
+                         [])
+        pricecatalog.discard('domain', 'HUF')
+        pricecatalog.discard('domain', 'EUR')
+        self.assertEqual(len(pricecatalog), 0)
+        self.assertEqual(pricecatalog.names('domain'), [])
+
+    def test_load(self):
+        """
+        Test loading every price list from the server.
+        """
+        server = standin.StandInServer(tlds=4)
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass')
+            pricecatalog = catalog.PriceCatalog()
+            pricecatalog.load(api.ActionHandler(qh))
+            self.assertEqual(len(server.paths), 9)
+            self.assertEqual(len(pricecatalog), 3 * 3 * 4 * 3)
+            self.assertEqual(pricecatalog.names('vps'),
+                             ['tld0', 'tld1', 'tld2', 'tld3'])
+            self.assertEqual(pricecatalog.lookup('hosting', 'tld2', '3',
+                                                 'USD').net, 3002)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+import unittest, json, StringIO, os, tempfile, shutil
+import cli, standin
+
+class ArgumentParserTest(unittest.TestCase):
+    """
+    This class tests the DotRoll.ArgumentParser class.
+    """
+
+    def test_zero_arguments(self):
+        """
+        Tests, if the parse run fails, if there are no arguments.
+        """
+        parser = cli.ArgumentParser()
+        self.assertRaises(cli.ArgumentError, parser.parse, ['dotrollcli'])
+
+    def test_incompatible_actions(self):
+        """
+        Tests, if the command line interface correctly fails, if the user tries
+        to submit a contact and domain registration at the same time, etc.
+        """
+        parser = cli.ArgumentParser()
+        try:
+            parser.parse(['dotrollcli', '--getdomainlist'])
+        except cli.ArgumentError:
+            self.fail('Calling a single action raises an ArgumentError')
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--getdomainprices',
+                           '--gethostingprices'])
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--getdomainprices',
+                           '--getvpsprices'])
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--gethostingprices',
+                           '--getvpsprices'])
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--gethostingprices',
+                           '--getdomainavailability'])
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--getvpsprices', '--getdomainlist'])
+        self.assertRaises(cli.ArgumentError, parser.parse,
+                          ['dotrollcli', '--getdomainavailability',
+                           '--getbulkdomainavailability'])
+
+    def test_batch(self):
+        """
+        Tests, if a batch runs its actions over one connection and reports
+        the results in input order, and if results are printed in the
+        chosen format.
+        """
+        server = standin.StandInServer(tlds=1)
+        try:
+            parser = cli.ArgumentParser()
+            parser.stdin = StringIO.StringIO(
+                'getdomainprices HUF\n'
+                '{"action": "getdomainavailability", "domainname": "a.hu"}\n'
+                'getvpsprices XYZ\n')
+            parser.stdout = StringIO.StringIO()
+            parser.parse_and_print(
+                ['dotrollcli', '--apiendpoint', server.endpoint(), '--apikey',
+                 'key', '--username', 'user', '--password', 'pass',
+                 '--batch', '-', '--concurrency', '1'])
+            records = [json.loads(line) for line
+                       in parser.stdout.getvalue().splitlines()]
+            self.assertEqual([record['line'] for record in records],
+                             [1, 2, 3])
+            self.assertEqual(len(records[0]['rows']), 3)
+            self.assertTrue(records[1]['rows'][0][0] in ('available',
+                                                         'registered'))
+            self.assertTrue('currency' in records[2]['error'])
+            self.assertEqual(server.connections, 1)
+            parser.stdout = StringIO.StringIO()
+            parser.parse_and_print(
+                ['dotrollcli', '--apiendpoint', server.endpoint(), '--apikey',
+                 'key', '--username', 'user', '--password', 'pass',
+                 '--getvpsprices', '--currency', 'EUR', '--format', 'csv'])
+            self.assertEqual(parser.stdout.getvalue().splitlines()[:3],
+                             ['package,period,gross,net', 'tld0,1,1270,1000',
+                              'tld0,2,2540,2000'])
+        finally:
+            server.stop()
+
+    def test_accounts(self):
+        """
+        Tests, if calls for several accounts go through the same handler
+        stack as single calls, with the cache and statistics enabled.
+        """
+        server = standin.StandInServer(tlds=1)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'accounts.ini')
+            with open(path, 'w') as credentials:
+                credentials.write('[first]\napikey = k1\nusername = u1\n'
+                                  'password = p1\n\n[second]\napikey = k2\n'
+                                  'username = u2\npassword = p2\n')
+            args = ['dotrollcli', '--apiendpoint', server.endpoint(),
+                    '--accounts', path, '--getdomainprices', '--currency',
+                    'HUF', '--cachedir', os.path.join(tmpdir, 'cache'),
+                    '--stats']
+            for i in range(2):
+                parser = cli.ArgumentParser()
+                rows = list(parser.parse_and_call(args))
+                self.assertEqual(sorted(row[0] for row in rows),
+                                 ['first'] * 3 + ['second'] * 3)
+            self.assertEqual(len(server.paths), 2)
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, 'cache'))),
+                             2)
+            self.assertTrue(parser.metrics is not None)
+            self.assertRaises(cli.ArgumentError, parser.parse,
+                              args + ['--ratelimit', '1', '--ratelimitfile',
+                                      os.path.join(tmpdir, 'bucket')])
+        finally:
+            shutil.rmtree(tmpdir)
+            server.stop()
+
+    def test_ratelimit(self):
+        """
+        Tests, if per endpoint class rate limits get a bucket each, sharing
+        the rate limit file, and if invalid rate limits are rejected.
+        """
+        import ratelimit
+        tmpdir = tempfile.mkdtemp()
+        try:
+            parser = cli.ArgumentParser()
+            args = ['dotrollcli', '--apiendpoint', 'http://127.0.0.1/rest',
+                    '--apikey', 'key', '--username', 'user', '--password',
+                    'pass', '--getdomainlist', '--ratelimit']
+            (func, options) = parser.parse(
+                args + ['search=5,price=1,default=10', '--ratelimitfile',
+                        os.path.join(tmpdir, 'bucket')])
+            qh = parser.build_action_handler(options).queryhandler
+            while not isinstance(qh, ratelimit.RateLimitedQueryHandler):
+                qh = qh.queryhandler
+            self.assertEqual(sorted((name, bucket.rate, bucket.slot)
+                                    for (name, bucket)
+                                    in qh.buckets.items()),
+                             [('default', 10, 'default'),
+                              ('price', 1, 'price'),
+                              ('search', 5, 'search')])
+            for spec in ['search=x', 'unknown=1']:
+                self.assertRaises(cli.ArgumentError, parser.parse,
+                                  args + [spec])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_validate_names(self):
+        """
+        Tests, if the TLDs are taken from the price list in the chosen
+        currency, and if names are checked under any TLD with a warning when
+        it cannot be downloaded.
+        """
+        import validate
+        server = standin.StandInServer(tlds=1)
+        try:
+            args = ['dotrollcli', '--apiendpoint', server.endpoint(),
+                    '--apikey', 'key', '--username', 'user', '--password',
+                    'pass', '--validatenames', '--currency', 'EUR',
+                    '--getdomainavailability', '--domainname']
+            parser = cli.ArgumentParser()
+            self.assertRaises(validate.InvalidDomainName,
+                              parser.parse_and_call, args + ['a.hu'])
+            self.assertEqual(len(parser.parse_and_call(args + ['a.tld0'])),
+                             1)
+            self.assertTrue(server.paths[0].startswith(
+                '/rest/1.0/domain/prices/EUR'))
+        finally:
+            server.stop()
+        server = standin.StandInServer('{"result": "available"}')
+        try:
+            parser = cli.ArgumentParser()
+            parser.stderr = StringIO.StringIO()
+            args[2] = server.endpoint()
+            self.assertEqual(parser.parse_and_call(args + ['a.hu']),
+                             [['available']])
+            self.assertTrue('TLDs are not checked' in
+                            parser.stderr.getvalue())
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
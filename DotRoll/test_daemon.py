@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+import unittest, threading, os, StringIO, tempfile, shutil
+import api, cli, daemon, standin
+
+class DaemonTest(unittest.TestCase):
+    def test_forwarding(self):
+        """
+        Test, that forwarded calls share the warm connection pool of the
+        daemon and errors are passed back.
+        """
+        tmpdir = tempfile.mkdtemp()
+        backend = standin.StandInServer(tlds=2)
+        server = daemon.DaemonServer(os.path.join(tmpdir, 'dotroll.sock'))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            parser = cli.ArgumentParser()
+            args = ['dotrollcli', '--apiendpoint', backend.endpoint(),
+                    '--apikey', 'key', '--username', 'user', '--password',
+                    'pass', '--connect', server.path]
+            for i in range(2):
+                rows = list(parser.parse_and_call(args + ['--getvpsprices',
+                                                          '--currency',
+                                                          'EUR']))
+                self.assertEqual(len(rows), 6)
+                self.assertTrue(['tld1', '2', 2541, 2001] in rows)
+            self.assertEqual(backend.connections, 1)
+            parser.stdin = StringIO.StringIO('a.hu\nb.hu\n')
+            parser.stderr = StringIO.StringIO()
+            rows = list(parser.parse_and_call(
+                args + ['--getbulkdomainavailability']))
+            self.assertEqual(sorted(row[0] for row in rows), ['a.hu', 'b.hu'])
+            self.assertTrue('2 checked' in parser.stderr.getvalue())
+            backend.status = 503
+            backend.body = 'Unavailable'
+            rows = parser.parse_and_call(args + ['--getdomainlist'])
+            self.assertRaises(api.ServerError, list, rows)
+        finally:
+            server.stop()
+            thread.join()
+            backend.stop()
+            shutil.rmtree(tmpdir)
+
+    def test_validation_currency(self):
+        """
+        Test, that calls validating names in different currencies do not
+        share the TLD set of the first one.
+        """
+        tmpdir = tempfile.mkdtemp()
+        backend = standin.StandInServer(tlds=2)
+        server = daemon.DaemonServer(os.path.join(tmpdir, 'dotroll.sock'))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            parser = cli.ArgumentParser()
+            args = ['dotrollcli', '--apiendpoint', backend.endpoint(),
+                    '--apikey', 'key', '--username', 'user', '--password',
+                    'pass', '--connect', server.path, '--validatenames',
+                    '--getdomainavailability', '--domainname', 'a.tld0']
+            for currency in ['EUR', 'USD', 'EUR']:
+                rows = list(parser.parse_and_call(args + ['--currency',
+                                                          currency]))
+                self.assertEqual(len(rows), 1)
+            self.assertEqual(len(server.handlers), 2)
+            self.assertEqual(sorted(path.split('?')[0] for path
+                                    in backend.paths
+                                    if '/prices/' in path),
+                             ['/rest/1.0/domain/prices/EUR',
+                              '/rest/1.0/domain/prices/USD'])
+        finally:
+            server.stop()
+            thread.join()
+            backend.stop()
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+import unittest, json, StringIO
+import formats
+
+class RowWriterTest(unittest.TestCase):
+    def write(self, format, rows, columns=None):
+        """
+        Write rows in a format and return the output.
+        """
+        stream = StringIO.StringIO()
+        formats.create_writer(format, stream, columns).write_all(rows)
+        return stream.getvalue()
+
+    def test_formats(self):
+        """
+        Test the output of every format.
+        """
+        rows = [['hu', '1', 1270, 1000], ['com', '2', 2540, 2000]]
+        columns = ['tld', 'period', 'gross', 'net']
+        self.assertEqual(self.write('csv', rows, columns),
+                         'tld,period,gross,net\nhu,1,1270,1000\n'
+                         'com,2,2540,2000\n')
+        self.assertEqual(self.write('tsv', rows[:1], columns),
+                         'tld\tperiod\tgross\tnet\nhu\t1\t1270\t1000\n')
+        self.assertEqual(self.write('jsonl', rows[:1], columns),
+                         '{"tld": "hu", "period": "1", "gross": 1270,'
+                         ' "net": 1000}\n')
+        self.assertEqual(json.loads(self.write('json', rows, columns))[1],
+                         {'tld': 'com', 'period': '2', 'gross': 2540,
+                          'net': 2000})
+        self.assertEqual(self.write('json', []), '[]\n')
+        self.assertEqual(self.write('csv', [], columns),
+                         'tld,period,gross,net\n')
+        self.assertEqual(self.write('table', [['available']]),
+                         'available\n')
+        self.assertEqual(self.write('table', rows).split('\n')[0],
+                         ' '.join(field.ljust(19)
+                                  for field in ['hu', '1', '1270', '1000']))
+
+    def test_dict_rows(self):
+        """
+        Test, that dictionary rows are written in sorted column order.
+        """
+        rows = [{'name': u'\xe1.hu', 'status': 'active', 'autorenew': True},
+                {'status': 'expired', 'name': 'b.hu'}]
+        self.assertEqual(self.write('csv', rows),
+                         'autorenew,name,status\nTrue,\xc3\xa1.hu,active\n'
+                         ',b.hu,expired\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
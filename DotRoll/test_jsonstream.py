@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+import unittest, gzip, StringIO
+import jsonstream
+
+class IterJSONArrayTest(unittest.TestCase):
+    def test_iter_json_array(self):
+        """
+        Test streaming an array, while skipping other keys, with data
+        arriving one byte at a time.
+        """
+        data = ('{"count": 12345, "meta": {"domains": [1, "]"]}, '
+                '"domains": [{"name": "janoszen.hu", "expires": 2014}, '
+                '{"name": "\\u00e1rv\\u00edzt\\u0171r\\u0151.hu"}, 1000, '
+                'true], "tail": null}')
+        items = list(jsonstream.iter_json_array(StringIO.StringIO(data),
+                                                'domains', 1))
+        self.assertEqual(items, [{'name': 'janoszen.hu', 'expires': 2014},
+                                 {'name': u'\xe1rv\xedzt\u0171r\u0151.hu'},
+                                 1000, True])
+
+    def test_empty(self):
+        """
+        Test streaming empty and missing arrays.
+        """
+        self.assertEqual(list(jsonstream.iter_json_array(StringIO.StringIO(
+            '{"domains": []}'), 'domains')), [])
+        self.assertEqual(list(jsonstream.iter_json_array(
+            StringIO.StringIO('{}'), 'domains')), [])
+        self.assertRaises(ValueError, list, jsonstream.iter_json_array(
+            StringIO.StringIO('{"domains": [1'), 'domains'))
+
+    def test_gzip(self):
+        """
+        Test decompressing a gzip stream in small pieces.
+        """
+        buf = StringIO.StringIO()
+        gzipfile = gzip.GzipFile(fileobj=buf, mode='wb')
+        gzipfile.write('{"domains": [' + ', '.join(['"x"'] * 1000) + ']}')
+        gzipfile.close()
+        buf.seek(0)
+        self.assertEqual(list(jsonstream.iter_json_array(
+            jsonstream.GzipStreamReader(buf), 'domains', 7)), ['x'] * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+import unittest, json
+import api, metrics, standin
+
+class MetricsRegistryTest(unittest.TestCase):
+    def test_export(self):
+        """
+        Test the Prometheus and JSON export of counters and histograms.
+        """
+        registry = metrics.MetricsRegistry()
+        registry.describe('requests_total', 'Requests.')
+        registry.increment('requests_total', {'status': 200})
+        registry.increment('requests_total', {'status': 200})
+        registry.observe('seconds', 0.003)
+        registry.observe('seconds', 20)
+        text = registry.prometheus()
+        self.assertTrue('# HELP requests_total Requests.\n' in text)
+        self.assertTrue('requests_total{status="200"} 2\n' in text)
+        self.assertTrue('seconds_bucket{le="0.001"} 0\n' in text)
+        self.assertTrue('seconds_bucket{le="0.005"} 1\n' in text)
+        self.assertTrue('seconds_bucket{le="+Inf"} 2\n' in text)
+        self.assertTrue('seconds_count 2\n' in text)
+        data = json.loads(registry.json())
+        self.assertEqual(data['requests_total'],
+                         [{'labels': {'status': 200}, 'value': 2}])
+        self.assertEqual(data['seconds'][0]['max'], 20)
+
+    def test_hook(self):
+        """
+        Test, that the hook records the phases of real requests.
+        """
+        server = standin.StandInServer(domains=10)
+        try:
+            registry = metrics.MetricsRegistry()
+            qh = api.PooledHTTPQueryHandler(
+                server.endpoint(), '1.0', 'key', 'user', 'pass',
+                hooks=[metrics.MetricsHook(registry)])
+            ah = api.ActionHandler(qh)
+            ah.get_domain_list()
+            ah.get_domain_list()
+            server.status = 404
+            server.body = 'Not found'
+            self.assertRaises(api.QueryFailed, ah.get_domain_list)
+            self.assertEqual(registry.counter('dotroll_requests_total',
+                                              {'method': 'GET',
+                                               'status': 200}), 2)
+            self.assertEqual(registry.counter('dotroll_requests_total',
+                                              {'method': 'GET',
+                                               'status': 404}), 1)
+            phase = lambda name: registry.histogram(
+                'dotroll_request_phase_seconds', {'phase': name})
+            self.assertEqual(phase('connect').count, 1)
+            self.assertEqual(phase('ttfb').count, 3)
+            self.assertEqual(phase('decode').count, 2)
+            self.assertTrue(registry.counter('dotroll_received_bytes_total'))
+            self.assertTrue('ttfb' in metrics.format_breakdown(registry))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
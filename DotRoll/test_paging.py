@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import unittest, threading
+import paging
+
+class PageIteratorTest(unittest.TestCase):
+    def test_pages(self):
+        """
+        Test splitting the elements into pages.
+        """
+        pages = paging.PageIterator(lambda: iter(range(10)), pagesize=4)
+        self.assertEqual(list(pages), [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual(pages.offset, 10)
+        self.assertEqual(list(paging.PageIterator(lambda: iter([]))), [])
+
+    def test_resume(self):
+        """
+        Test resuming after the source has failed.
+        """
+        failures = [5]
+        def source():
+            for i in range(10):
+                if failures and i == failures[0]:
+                    failures.pop()
+                    raise IOError('Connection reset')
+                yield i
+        pages = paging.PageIterator(source, pagesize=3)
+        self.assertEqual(pages.next(), [0, 1, 2])
+        self.assertRaises(IOError, pages.next)
+        self.assertEqual(pages.offset, 3)
+        self.assertEqual(list(pages), [[3, 4, 5], [6, 7, 8], [9]])
+        self.assertEqual(list(paging.PageIterator(source, pagesize=5,
+                                                  offset=8)), [[8, 9]])
+
+    def test_prefetch(self):
+        """
+        Test, that pages are fetched ahead of the caller.
+        """
+        produced = threading.Event()
+        def source():
+            for i in range(10):
+                if i == 6:
+                    produced.set()
+                yield i
+        pages = paging.PageIterator(source, pagesize=2, prefetch=2)
+        self.assertEqual(pages.next(), [0, 1])
+        self.assertTrue(produced.wait(5))
+        pages.close()
+        pages.thread.join()
+
+    def test_stop_early(self):
+        """
+        Test, that leaving the with statement early stops the background
+        thread and closes the source.
+        """
+        closed = threading.Event()
+        def source():
+            try:
+                i = 0
+                while True:
+                    yield i
+                    i += 1
+            finally:
+                closed.set()
+        with paging.PageIterator(source, pagesize=2) as pages:
+            for page in pages:
+                break
+        pages.thread.join(5)
+        self.assertFalse(pages.thread.is_alive())
+        self.assertTrue(closed.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+
+import unittest
+import api, pipeline, standin
+
+class PipelineTest(unittest.TestCase):
+    def test_ordered_results(self):
+        """
+        Test, that responses are parsed in worker processes and yielded in
+        input order, with failed queries reported in place.
+        """
+        server = standin.StandInServer(domains=5, tlds=3, delay=0.01)
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass', poolsize=4)
+            runner = pipeline.Pipeline(qh, concurrency=4, processes=2,
+                                       queuesize=3)
+            queries = []
+            for i in range(10):
+                queries.append(('domain/prices/HUF', 'prices'))
+                queries.append(('domain/search/d' + str(i) + '.hu',
+                                'availability'))
+            queries.append(('domain/list', 'domains'))
+            queries.append(('domain/list', 'availability'))
+            queries.append(('domain/unknown', 'prices'))
+            results = list(runner.run(queries))
+            self.assertEqual([url for (url, rows, error) in results],
+                             [url for (url, kind) in queries])
+            self.assertEqual(results[0][1][0], ['tld0', '1', 1270, 1000])
+            self.assertEqual(len(results[0][1]), 9)
+            self.assertTrue(results[1][1][0][0] in ('available',
+                                                    'registered'))
+            self.assertEqual(len(results[-3][1]), 5)
+            self.assertEqual(results[-3][1][0],
+                             [False, '2015-01-01', 'domain0.hu', 'active'])
+            self.assertTrue(isinstance(results[-2][2], KeyError))
+            self.assertTrue(isinstance(results[-1][2], api.QueryFailed))
+            self.assertEqual([error for (url, rows, error)
+                              in results[:-2]], [None] * 21)
+            self.assertEqual(list(runner.run([])), [])
+            runner.close()
+        finally:
+            server.stop()
+
+    def test_failing_queries(self):
+        """
+        Test, that an error raised by the queries is raised after the results
+        of the queries before it.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        def queries():
+            for i in range(3):
+                yield ('domain/search/d' + str(i) + '.hu', 'availability')
+            raise IOError('Cannot read the domain file')
+        try:
+            qh = api.PooledHTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass')
+            runner = pipeline.Pipeline(qh, concurrency=2, processes=1)
+            results = runner.run(queries())
+            for i in range(3):
+                self.assertEqual(next(results)[1], [['available']])
+            self.assertRaises(IOError, next, results)
+            runner.close()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+import unittest, time
+import api, asyncapi, pipelining, standin
+
+class PipeliningQueryHandlerTest(unittest.TestCase):
+    def test_pipelining(self):
+        """
+        Test, that queries are pipelined over few connections, paying the
+        round trip time once per batch of requests.
+        """
+        server = standin.StandInServer()
+        proxy = standin.LatencyProxy(server, 0.05)
+        try:
+            qh = pipelining.PipeliningQueryHandler(proxy.endpoint(), '1.0',
+                                                   'key', 'user', 'pass',
+                                                   maxconnections=2, depth=20)
+            ah = asyncapi.AsyncActionHandler(qh)
+            start = time.time()
+            results = [ah.get_domain_availability('test' + str(i) + '.hu')
+                       for i in range(40)]
+            results.append(ah.get_domain_prices('EUR'))
+            values = ah.wait(results)
+            self.assertTrue(time.time() - start < 1.5)
+            self.assertTrue(all(value['result'] in ('available',
+                                                    'registered')
+                                for value in values[:-1]))
+            self.assertEqual(len(values[-1]['prices']), 50)
+            self.assertEqual(len(server.paths), 41)
+            ah.run()
+            self.assertEqual(server.connections, 2)
+            qh.close()
+            self.assertEqual(qh.map, {})
+        finally:
+            proxy.stop()
+            server.stop()
+
+    def test_retry(self):
+        """
+        Test, that queries left without a response by a closed connection are
+        sent again.
+        """
+        server = standin.StandInServer('{"result": "available"}',
+                                       dropconnections=True)
+        try:
+            qh = pipelining.PipeliningQueryHandler(server.endpoint(), '1.0',
+                                                   'key', 'user', 'pass',
+                                                   maxconnections=1, retries=2)
+            ah = asyncapi.AsyncActionHandler(qh)
+            results = [ah.get_domain_availability('test' + str(i) + '.hu')
+                       for i in range(3)]
+            self.assertEqual(ah.wait(results),
+                             [{'result': 'available'}] * 3)
+            self.assertEqual(server.connections, 3)
+            results = [ah.get_domain_availability('test' + str(i) + '.hu')
+                       for i in range(4)]
+            ah.run()
+            self.assertTrue(isinstance(results[3].error,
+                                       api.ConnectionFailed))
+        finally:
+            server.stop()
+
+    def test_writes_not_pipelined(self):
+        """
+        Test, that a write query is sent over a connection of its own instead
+        of behind the pipelined queries.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        try:
+            qh = pipelining.PipeliningQueryHandler(server.endpoint(), '1.0',
+                                                   'key', 'user', 'pass',
+                                                   maxconnections=1)
+            ah = asyncapi.AsyncActionHandler(qh)
+            results = [ah.get_domain_availability('test' + str(i) + '.hu')
+                       for i in range(3)]
+            write = qh.post('domain', '{"name": "test.hu"}')
+            results.append(ah.get_domain_availability('test3.hu'))
+            self.assertEqual(ah.wait(results),
+                             [{'result': 'available'}] * 4)
+            ah.run()
+            self.assertEqual(write.error.code, 501)
+            self.assertEqual(len(server.paths), 4)
+            self.assertEqual(server.connections, 2)
+            self.assertEqual(len(qh.connections), 1)
+            qh.close()
+            self.assertEqual(qh.map, {})
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+import unittest, multiprocessing, os, time, tempfile, shutil
+import api, ratelimit, testing
+
+class TokenBucketTest(unittest.TestCase):
+    def fake_time(self, bucket, now):
+        """
+        Replace the clock of a bucket with now[0] and record waits instead of
+        sleeping.
+        """
+        waits = []
+        bucket.clock = lambda: now[0]
+        bucket.sleep = waits.append
+        bucket.updated = now[0]
+        return waits
+
+    def test_bucket(self):
+        """
+        Test, that the bucket allows bursts up to its capacity and then
+        delays callers by the refill time.
+        """
+        now = [1000.0]
+        bucket = ratelimit.TokenBucket(2, 3)
+        waits = self.fake_time(bucket, now)
+        for i in range(5):
+            bucket.acquire()
+        self.assertEqual(waits, [0.5, 1.0])
+        now[0] += 10
+        bucket.acquire()
+        self.assertEqual(len(waits), 2)
+
+    def test_file_bucket(self):
+        """
+        Test, that buckets using the same file share their tokens.
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            now = [1000.0]
+            path = os.path.join(tmpdir, 'bucket')
+            first = ratelimit.FileTokenBucket(path, 1, 2)
+            second = ratelimit.FileTokenBucket(path, 1, 2)
+            waits = self.fake_time(first, now)
+            waits += self.fake_time(second, now)
+            first.acquire()
+            second.acquire()
+            first.acquire()
+            self.assertEqual(waits, [1.0])
+            other = ratelimit.FileTokenBucket(path, 1, 2, slot='search')
+            waits += self.fake_time(other, now)
+            other.acquire()
+            other.acquire()
+            self.assertEqual(waits, [1.0])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_shared_bucket(self):
+        """
+        Test, that a bucket in shared memory is shared with worker processes.
+        """
+        bucket = ratelimit.SharedTokenBucket(1, 10)
+        processes = [multiprocessing.Process(target=bucket.acquire,
+                                             args=(4,))
+                     for i in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertTrue(bucket.state[0] < 3)
+
+
+class RateLimitedQueryHandlerTest(unittest.TestCase):
+    def test_parse_rates(self):
+        """
+        Test parsing single and per endpoint class rate limits.
+        """
+        self.assertEqual(ratelimit.parse_rates('2.5'), {'default': 2.5})
+        self.assertEqual(ratelimit.parse_rates('search=5, price=1,default=10'),
+                         {'search': 5, 'price': 1, 'default': 10})
+        for spec in ['fast', 'search=', 'search=0', 'other=1',
+                     'list=1,list=2']:
+            self.assertRaises(ValueError, ratelimit.parse_rates, spec)
+        buckets = ratelimit.create_buckets({'search': 5, 'default': 1},
+                                           shared=True)
+        self.assertEqual(buckets['search'].rate, 5)
+        self.assertTrue(isinstance(buckets['default'],
+                                   ratelimit.SharedTokenBucket))
+
+    def test_endpoint_classes(self):
+        """
+        Test, that queries take tokens from the bucket of their endpoint
+        class.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        buckets = {'search': ratelimit.TokenBucket(1, 5),
+                   'default': ratelimit.TokenBucket(1, 5)}
+        rh = ratelimit.RateLimitedQueryHandler(qh, buckets)
+        ah = api.ActionHandler(rh)
+        qh.add_expectation('domain/search/janoszen.hu', 'get', '', 200, '{}')
+        qh.add_expectation('domain/search/dotroll.hu', 'get', '', 200, '{}')
+        qh.add_expectation('vps/prices/EUR', 'get', '', 200, '{}')
+        ah.get_domain_availability('janoszen.hu')
+        ah.get_domain_availability('dotroll.hu')
+        ah.get_vps_prices('EUR')
+        self.assertTrue(3 <= buckets['search'].tokens < 3.1)
+        self.assertTrue(4 <= buckets['default'].tokens < 4.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+
+import unittest, os, tempfile, shutil
+import api, replay, standin
+
+class ReplayQueryHandlerTest(unittest.TestCase):
+    def test_record_and_replay(self):
+        """
+        Test, that recorded queries are replayed offline with their errors
+        and simulated latency.
+        """
+        tmpdir = tempfile.mkdtemp()
+        server = standin.StandInServer(domains=3, tlds=2)
+        try:
+            path = os.path.join(tmpdir, 'cassette.jsonl')
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass')
+            rh = replay.RecordingQueryHandler(qh, path)
+            ah = api.ActionHandler(rh)
+            prices = ah.get_domain_prices('HUF')
+            domains = list(ah.stream_domain_list())
+            server.status = 404
+            server.body = 'Not found'
+            self.assertRaises(api.QueryFailed, ah.get_domain_availability,
+                              'x.hu')
+            rh.close()
+        finally:
+            server.stop()
+        try:
+            ph = replay.ReplayQueryHandler(path, latency='recorded')
+            delays = []
+            ph.sleep = delays.append
+            ah = api.ActionHandler(ph)
+            self.assertEqual(ah.get_domain_prices('HUF'), prices)
+            self.assertEqual(ah.get_domain_prices('HUF'), prices)
+            self.assertEqual(list(ah.stream_domain_list()), domains)
+            try:
+                ah.get_domain_availability('x.hu')
+                self.fail('The recorded error has not been raised')
+            except api.QueryFailed as error:
+                self.assertEqual((error.code, error.body), (404, 'Not found'))
+            self.assertRaises(replay.ReplayMiss, ah.get_vps_prices, 'EUR')
+            self.assertEqual(len(delays), 4)
+            self.assertTrue(all(delay > 0 for delay in delays))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
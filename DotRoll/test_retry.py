@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+import unittest
+import api, retry
+
+class ScriptedQueryHandler(api.QueryHandler):
+    """
+    This query handler raises or returns the items of a list in turn.
+    """
+    def __init__(self, script):
+        """
+        Initialize the handler with the list of outcomes.
+        """
+        api.QueryHandler.__init__(self, '', '', '', '', '')
+        self.script = script
+        self.calls = 0
+
+    def get(self, url):
+        """
+        Return or raise the next outcome.
+        """
+        self.calls += 1
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def post(self, url, data):
+        """
+        Return or raise the next outcome.
+        """
+        return self.get(url)
+
+
+class RetryingQueryHandlerTest(unittest.TestCase):
+    def test_retry(self):
+        """
+        Test, that transient failures of GET queries are retried with
+        backoff, and Retry-After is honoured.
+        """
+        qh = ScriptedQueryHandler([api.ConnectionFailed('Connection reset'),
+                                   api.ServerError('HTTP 503', 503, ''),
+                                   api.RateLimited('HTTP 429', 429, '', 7),
+                                   {'new': 1}])
+        rh = retry.RetryingQueryHandler(qh, retries=3, backoff=1)
+        delays = []
+        rh.sleep = delays.append
+        self.assertEqual(rh.get('domain/prices/HUF'), {'new': 1})
+        self.assertEqual(len(delays), 3)
+        self.assertTrue(0 <= delays[0] <= 1)
+        self.assertTrue(0 <= delays[1] <= 2)
+        self.assertEqual(delays[2], 7)
+        self.assertEqual(rh.delay(0, api.RateLimited('HTTP 429', 429, '',
+                                                     86400)), 30)
+
+    def test_no_retry(self):
+        """
+        Test, that client errors and non-GET queries are not retried.
+        """
+        qh = ScriptedQueryHandler([api.QueryFailed('HTTP 404', 404, ''),
+                                   api.ServerError('HTTP 500', 500, ''),
+                                   api.ServerError('HTTP 500', 500, ''),
+                                   api.ServerError('HTTP 500', 500, '')])
+        rh = retry.RetryingQueryHandler(qh, retries=1)
+        rh.sleep = lambda delay: None
+        self.assertRaises(api.QueryFailed, rh.get, 'domain/search/x.hu')
+        self.assertRaises(api.ServerError, rh.post, 'domain', '{}')
+        self.assertRaises(api.ServerError, rh.get, 'domain/list')
+        self.assertEqual(qh.calls, 4)
+
+    def test_circuit_breaker(self):
+        """
+        Test, that the circuit opens after repeated failures and closes
+        after a successful trial query.
+        """
+        breaker = retry.CircuitBreaker(threshold=2, resettimeout=10)
+        now = [0]
+        breaker.clock = lambda: now[0]
+        qh = ScriptedQueryHandler([api.ConnectionFailed('Refused'),
+                                   api.ConnectionFailed('Refused'),
+                                   {'new': 1}])
+        rh = retry.RetryingQueryHandler(qh, retries=0, breaker=breaker)
+        self.assertRaises(api.ConnectionFailed, rh.get, 'domain/list')
+        self.assertRaises(api.ConnectionFailed, rh.get, 'domain/list')
+        self.assertEqual(breaker.state(), 'open')
+        self.assertRaises(retry.CircuitOpen, rh.get, 'domain/list')
+        self.assertEqual(qh.calls, 2)
+        now[0] += 10
+        self.assertEqual(breaker.state(), 'half-open')
+        self.assertEqual(rh.get('domain/list'), {'new': 1})
+        self.assertEqual(breaker.state(), 'closed')
+
+    def test_trial_unexpected_error(self):
+        """
+        Test, that a trial query failing with an unexpected error opens the
+        circuit again instead of blocking all queries.
+        """
+        breaker = retry.CircuitBreaker(threshold=1, resettimeout=10)
+        now = [0]
+        breaker.clock = lambda: now[0]
+        qh = ScriptedQueryHandler([api.ServerError('HTTP 500', 500, ''),
+                                   ValueError('No JSON object'),
+                                   {'new': 1}])
+        rh = retry.RetryingQueryHandler(qh, retries=0, breaker=breaker)
+        self.assertRaises(api.ServerError, rh.get, 'domain/list')
+        now[0] += 10
+        self.assertRaises(ValueError, rh.get, 'domain/list')
+        self.assertEqual(breaker.state(), 'open')
+        now[0] += 10
+        self.assertEqual(rh.get('domain/list'), {'new': 1})
+        self.assertEqual(breaker.state(), 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
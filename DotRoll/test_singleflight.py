@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import unittest, threading
+import api, asyncapi, singleflight, standin
+
+class GatedQueryHandler(api.QueryHandler):
+    """
+    This query handler blocks GET queries until its gate is opened.
+    """
+    def __init__(self):
+        """
+        Initialize the handler with the gate closed.
+        """
+        api.QueryHandler.__init__(self, '', '', '', '', '')
+        self.gate = threading.Event()
+        self.urls = []
+
+    def get(self, url):
+        """
+        Wait for the gate, then return the URL.
+        """
+        self.urls.append(url)
+        self.gate.wait()
+        return {'url': url}
+
+
+class SingleFlightQueryHandlerTest(unittest.TestCase):
+    def test_coalescing(self):
+        """
+        Test, that concurrent identical queries are sent once.
+        """
+        qh = GatedQueryHandler()
+        sh = singleflight.SingleFlightQueryHandler(qh)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+                       sh.get('domain/prices/EUR')))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        while sh.stats()['calls'] < 10:
+            threading.Event().wait(0.01)
+        qh.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(qh.urls, ['domain/prices/EUR'])
+        self.assertEqual(results, [{'url': 'domain/prices/EUR'}] * 10)
+        self.assertEqual(sh.stats(), {'calls': 10, 'coalesced': 9})
+        self.assertEqual(sh.get('domain/prices/EUR'),
+                         {'url': 'domain/prices/EUR'})
+        self.assertEqual(len(qh.urls), 2)
+
+    def test_async_coalescing(self):
+        """
+        Test, that identical queries of an AsyncQueryHandler are sent once.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        try:
+            qh = asyncapi.AsyncQueryHandler(server.endpoint(), '1.0', 'key',
+                                            'user', 'pass')
+            ah = asyncapi.AsyncActionHandler(
+                singleflight.AsyncSingleFlightQueryHandler(qh))
+            results = [ah.get_domain_availability('janoszen.hu')
+                       for i in range(5)]
+            results.append(ah.get_domain_availability('dotroll.hu'))
+            self.assertEqual(ah.wait(results), [{'result': 'available'}] * 6)
+            self.assertEqual(len(server.paths), 2)
+            self.assertEqual(ah.queryhandler.stats(),
+                             {'calls': 6, 'coalesced': 4})
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+import unittest, json, time, urllib2
+import standin
+
+class StandInServerTest(unittest.TestCase):
+    def test_endpoints(self):
+        """
+        Test, that the generated endpoints return well-formed data.
+        """
+        server = standin.StandInServer(domains=3, tlds=2)
+        try:
+            base = server.endpoint() + '/1.0/'
+            prices = json.load(urllib2.urlopen(base + 'vps/prices/EUR'))
+            self.assertEqual(sorted(prices['prices']), ['tld0', 'tld1'])
+            self.assertEqual(prices['prices']['tld1']['2'],
+                             {'net': 2001, 'gross': 2541})
+            domains = json.load(urllib2.urlopen(base + 'domain/list'))
+            self.assertEqual(len(domains['domains']), 3)
+            search = json.load(urllib2.urlopen(base + 'domain/search/x.hu'))
+            self.assertTrue(search['result'] in ('available', 'registered'))
+            server.errorrate = 1
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                              base + 'domain/list')
+        finally:
+            server.stop()
+
+    def test_latency_proxy(self):
+        """
+        Test, that the proxy forwards queries with the added latency.
+        """
+        server = standin.StandInServer('{"result": "available"}')
+        proxy = standin.LatencyProxy(server, 0.1)
+        try:
+            start = time.time()
+            self.assertEqual(json.load(urllib2.urlopen(
+                proxy.endpoint() + '/1.0/domain/search/x.hu')),
+                             {'result': 'available'})
+            self.assertTrue(time.time() - start >= 0.2)
+        finally:
+            proxy.stop()
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
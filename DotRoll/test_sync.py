@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+import unittest, json, os, tempfile, shutil
+import api, standin, sync
+
+class DomainListSyncTest(unittest.TestCase):
+    def test_sync(self):
+        """
+        Test, that syncs record added, changed and removed domains, and
+        consumers read every change once.
+        """
+        tmpdir = tempfile.mkdtemp()
+        server = standin.StandInServer()
+        try:
+            domains = [{'name': 'a.hu', 'status': 'active'},
+                       {'name': 'b.hu', 'status': 'active'},
+                       {'name': 'c.hu', 'status': 'active'}]
+            server.body = json.dumps({'domains': domains})
+            qh = api.HTTPQueryHandler(server.endpoint(), '1.0', 'key',
+                                      'user', 'pass')
+            path = os.path.join(tmpdir, 'domains.db')
+            snapshot = sync.DomainListSync(api.ActionHandler(qh), path)
+            self.assertEqual(snapshot.sync(), {'added': 3, 'removed': 0,
+                                               'changed': 0, 'unchanged': 0})
+            self.assertEqual(snapshot.sync()['unchanged'], 3)
+            self.assertEqual(len(list(snapshot.consume('monitor'))), 3)
+            domains[1] = {'status': 'expired', 'name': 'b.hu'}
+            del domains[2]
+            domains.append({'name': 'd.hu', 'status': 'active'})
+            server.body = json.dumps({'domains': domains})
+            self.assertEqual(snapshot.sync(), {'added': 1, 'removed': 1,
+                                               'changed': 1, 'unchanged': 1})
+            snapshot.close()
+            snapshot = sync.DomainListSync(api.ActionHandler(qh), path)
+            changes = [(change.kind, change.name, change.record['status'])
+                       for change in snapshot.consume('monitor')]
+            self.assertEqual(sorted(changes),
+                             [('added', 'd.hu', 'active'),
+                              ('changed', 'b.hu', 'expired'),
+                              ('removed', 'c.hu', 'active')])
+            self.assertEqual(list(snapshot.consume('monitor')), [])
+            self.assertEqual([record['name'] for record
+                              in snapshot.snapshot()],
+                             ['a.hu', 'b.hu', 'd.hu'])
+            snapshot.close()
+        finally:
+            server.stop()
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/python
+
+import unittest
+import api, testing, validate
+
+class ValidatingQueryHandlerTest(unittest.TestCase):
+    def test_validate_domain_name(self):
+        """
+        Test the IDNA, length and TLD rules.
+        """
+        tlds = validate.price_list_tlds({'prices': {u'hu': {}, u'co.hu': {},
+                                                    u'COM': {}}})
+        check = validate.validate_domain_name
+        self.assertEqual(check(' Example.HU. ', tlds), 'example.hu')
+        self.assertEqual(check(u'\xe1rv\xedzt\u0171r\u0151.hu', tlds),
+                         'xn--rvztr-wqa0gx3bwi.hu')
+        self.assertEqual(check('\xc3\xa1.co.hu', tlds), 'xn--1ca.co.hu')
+        self.assertEqual(check('a.b.c.example'), 'a.b.c.example')
+        for name in ['', 'hu', '-a.hu', 'a-.hu', 'a_b.hu', 'a..hu',
+                     'ab--c.hu', 'x' * 64 + '.hu', 'a.' * 126 + 'hu',
+                     'www.example.hu', 'example.org', '\xff.hu']:
+            self.assertRaises(validate.InvalidDomainName, check, name, tlds)
+
+    def test_filter(self):
+        """
+        Test, that invalid names and recently checked names are not sent,
+        with negative results cached longer.
+        """
+        qh = testing.MockQueryHandler('', '', '', '', '')
+        vh = validate.ValidatingQueryHandler(qh, tlds=lambda: set(['hu']),
+                                             ttl=10, negativettl=100)
+        now = [1000.0]
+        vh.clock = lambda: now[0]
+        ah = api.ActionHandler(vh)
+        qh.add_expectation('domain/search/free.hu', 'get', '', 200,
+                           '{"result": "available"}')
+        qh.add_expectation('domain/search/taken.hu', 'get', '', 200,
+                           '{"result": "registered"}')
+        qh.add_expectation('domain/search/xn--1ca.hu', 'get', '', 200,
+                           '{"result": "available"}')
+        qh.add_expectation('domain/search/free.hu', 'get', '', 200,
+                           '{"result": "registered"}')
+        for name in ['free.hu', 'taken.hu', 'FREE.hu', '\xc3\x81.HU']:
+            ah.get_domain_availability(name)
+        for name in ['bad_name.hu', 'x.com']:
+            self.assertRaises(validate.InvalidDomainName,
+                              ah.get_domain_availability, name)
+        now[0] += 50
+        self.assertEqual(ah.get_domain_availability('taken.hu'),
+                         {'result': 'registered'})
+        self.assertEqual(ah.get_domain_availability('free.hu'),
+                         {'result': 'registered'})
+        self.assertEqual(len(qh.expectations), 0)
+        self.assertEqual(vh.stats(), {'hits': 2, 'misses': 4,
+                                      'rejected': 2, 'size': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+
+import json, collections
+import api
+
+class MockQueryHandler(api.QueryHandler):
+    """
+    This is the mock query handler used for unit testing.
+    To make it work, you have to feed it "expectations". The queries
+    are then matched against these expectations. The result attached to
+    them is returned as a result.
+    """
+    def __init__(self, endpoint, apiversion, apikey, username, password):
+        """
+        Initialize the handler with an empty queue of expectations.
+        """
+        api.QueryHandler.__init__(self, endpoint, apiversion, apikey,
+                                  username, password)
+        self.expectations = collections.deque()
+
+    def add_expectation(self, expected_url, expected_query_type,
+                        expected_body, response_code, response_body):
+        """
+        Queue an expectation.
+        """
+        self.expectations.append({'expected_url':expected_url,
+                                  'expected_query_type':expected_query_type,
+                                  'expected_body':expected_body,
+                                  'response_code':response_code,
+                                  'response_body':response_body})
+
+    def get_expectation(self):
+        """
+        Fetch one expectation off the beginning of the expectations queue.
+        """
+        if not self.expectations:
+            raise ExpectationFailed('Unexpected query')
+        return self.expectations.popleft()
+
+    def check_expectation(self, url, query_type, body):
+        """
+        Check a given request against the next expectation in the list.
+        """
+        exp = self.get_expectation()
+        if exp['expected_url'] != url:
+            raise ExpectationFailed('Expected URL ' + exp['expected_url'] +
+                                    ' , got ' + url)
+        if exp['expected_query_type'] != query_type:
+            raise ExpectationFailed('Expected ' + exp['expected_query_type'] +
+                                    ' query, got ' + query_type + ' query')
+        if exp['expected_body'] != body:
+            raise ExpectationFailed('Expectation body mismatch. Expected '
+                                    'body: ' + str(exp['expected_body']) +
+                                    ' actual body: ' + str(body))
+        return {'code': exp['response_code'], 'body': exp['response_body']}
+
+    def get(self, url):
+        """
+        Perform a mock HTTP GET query and parse the results as a JSON string.
+        """
+        result = self.check_expectation(url, 'get', '')
+        if result['code'] != 200:
+            raise api.response_error(result)
+        return json.loads(result['body'])
+
+    def delete(self, url):
+        """
+        Perform a mock HTTP DELETE query and parse the results as a JSON
+        string.
+        """
+        result = self.check_expectation(url, 'delete', '')
+        if result['code'] != 200:
+            raise api.response_error(result)
+        return json.loads(result['body'])
+
+    def post(self, url, data):
+        """
+        Perform a mock HTTP POST query and parse the results as a JSON
+        string.
+        """
+        result = self.check_expectation(url, 'post', data)
+        if result['code'] != 201:
+            raise api.response_error(result)
+        return json.loads(result['body'])
+
+    def put(self, url, data):
+        """
+        Perform a mock HTTP PUT query and parse the results as a JSON
+        string.
+        """
+        result = self.check_expectation(url, 'put', data)
+        if (result['code'] != 200 and result['code'] != 201 and
+            result['code'] != 204):
+            raise api.response_error(result)
+        return json.loads(result['body'])
+
+
+class ExpectationFailed(Exception):
+    """
+    This exception is used to indicate, that an expectation in MockQueryHandler
+    has not been matched.
+    """
+    def __init__(self, description):
+        """
+        Initialize exception with a description.
+        """
+        self.description = description
+        super(ExpectationFailed, self).__init__()
+    def __str__(self):
+        """
+        Return a meaningfull string representation of th exception.
+        """
+        return 'Expectation failed: ' + self.description
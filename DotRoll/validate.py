@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+import threading, time, re, urllib, collections
+import api
+
+LABEL = re.compile('^[a-z0-9]([a-z0-9-]*[a-z0-9])?$')
+
+class InvalidDomainName(api.QueryFailed):
+    """
+    This exception indicates, that a domain name has not been sent to the
+    service, because it is not valid or its TLD is not supported.
+    """
+
+
+def validate_domain_name(domainname, tlds=None):
+    """
+    Check a domain name against the IDNA and length rules and return it in
+    lower case ASCII form, with international labels Punycode encoded. If a
+    set of TLDs is given, the name must be a single label under one of them.
+    Raises InvalidDomainName, if the name is not valid.
+    """
+    name = domainname
+    if isinstance(name, str):
+        try:
+            name = name.decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidDomainName('Invalid UTF-8 in domain name: ' +
+                                    repr(domainname))
+    name = name.strip().lower()
+    if name.endswith('.'):
+        name = name[:-1]
+    try:
+        name = name.encode('idna')
+    except UnicodeError as error:
+        raise InvalidDomainName('Invalid domain name ' + repr(domainname) +
+                                ': ' + str(error))
+    if len(name) > 253:
+        raise InvalidDomainName('Domain name longer than 253 characters: ' +
+                                name)
+    labels = name.split('.')
+    for label in labels:
+        if not LABEL.match(label) or (label[2:4] == '--' and
+                                      not label.startswith('xn--')):
+            raise InvalidDomainName('Invalid label in domain name ' + name +
+                                    ': ' + repr(label))
+    if len(labels) < 2:
+        raise InvalidDomainName('Domain name without TLD: ' + name)
+    if tlds is not None and '.'.join(labels[1:]) not in tlds:
+        raise InvalidDomainName('Unsupported TLD in domain name ' + name)
+    return name
+
+
+def price_list_tlds(pricelist):
+    """
+    Return the set of TLDs of a domain price list, in lower case ASCII form.
+    """
+    return set(tld.lower().encode('idna') if isinstance(tld, unicode)
+               else tld.lower() for tld in pricelist['prices'])
+
+
+class ValidatingQueryHandler(api.WrappingQueryHandler):
+    """
+    This query handler filters domain availability queries before they are
+    sent: invalid domain names and names under unsupported TLDs fail with
+    InvalidDomainName, and recent results are answered from a cache bounded
+    to maxsize names. "available" results are cached for ttl seconds, other
+    results, which are unlikely to change soon, for negativettl seconds.
+    Cached results are shared between callers and must not be modified.
+    """
+    def __init__(self, queryhandler, checknames=True, tlds=None, ttl=60,
+                 negativettl=3600, maxsize=10000):
+        """
+        Initialize the handler. If checknames is set, domain names are
+        validated, and tlds is the set of supported TLDs, a function
+        returning it, which is called on first use, or None to allow any TLD.
+        A TTL of 0 disables caching the results.
+        """
+        api.WrappingQueryHandler.__init__(self, queryhandler)
+        self.checknames = checknames
+        self.tlds = tlds
+        self.ttl = ttl
+        self.negativettl = negativettl
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.tldlock = threading.Lock()
+        self.clock = time.time
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def get(self, url):
+        """
+        Perform a HTTP GET query, validating the domain name and serving the
+        result from the cache if possible for availability queries. The
+        normalized domain name is sent.
+        """
+        if not url.startswith('domain/search/'):
+            return self.queryhandler.get(url)
+        name = urllib.unquote(url[len('domain/search/'):])
+        if self.checknames:
+            try:
+                name = validate_domain_name(name, self.supported_tlds())
+            except InvalidDomainName:
+                with self.lock:
+                    self.rejected += 1
+                raise
+        else:
+            name = name.strip().lower()
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is not None and entry[0] > now:
+                self.entries[name] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = self.queryhandler.get('domain/search/' + self.encode(name))
+        if value.get('result') == 'available':
+            ttl = self.ttl
+        else:
+            ttl = self.negativettl
+        if ttl:
+            with self.lock:
+                self.entries[name] = (now + ttl, value)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return value
+
+    def supported_tlds(self):
+        """
+        Return the set of supported TLDs, calling the function given instead
+        of the set on first use.
+        """
+        if callable(self.tlds):
+            with self.tldlock:
+                if callable(self.tlds):
+                    self.tlds = self.tlds()
+        return self.tlds
+
+    def stats(self):
+        """
+        Return the filter counters as a dictionary.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'rejected': self.rejected, 'size': len(self.entries)}